@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""Compare the overhead of the process and thread backends of the Watchdog extension."""
+import argparse
+
+from common import FakeTrainer, limited, report, timeit
+
+from watchdog import Watchdog
+from watchdog.actions import WarningMessage
+from watchdog.estimators import StaticEstimator
+
+
+def make_watchdog(backend, trigger):
+    return Watchdog(watch_items=[(WarningMessage(), StaticEstimator(duration=3600))], trigger=trigger, backend=backend)
+
+
+def bench_startup(backend, repeat):
+    trainer = FakeTrainer()
+
+    def run():
+        extension = make_watchdog(backend, (100, 'iteration'))
+        extension.initialize(trainer)
+        extension.finalize()
+    return timeit(run, repeat)
+
+
+def bench_call(backend, triggered, iterations):
+    trainer = FakeTrainer()
+    extension = make_watchdog(backend, lambda trainer: triggered)
+    extension.initialize(trainer)
+    try:
+        def run():
+            trainer.step()
+            extension(trainer)
+        return timeit(run, iterations)
+    finally:
+        extension.finalize()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', '-n', type=int, default=100000)
+    parser.add_argument('--startup-repeat', type=int, default=20)
+    parser.add_argument('--timeout', type=float, default=300.0, help='Time limit (seconds) of each benchmark')
+    args = parser.parse_args()
+
+    for backend in ('process', 'thread'):
+        report('backend: {}'.format(backend), [
+            ('startup + shutdown', limited(args.timeout, bench_startup, backend, args.startup_repeat)),
+            ('__call__ (triggered)', limited(args.timeout, bench_call, backend, True, args.iterations)),
+            ('__call__ (not triggered)', limited(args.timeout, bench_call, backend, False, args.iterations)),
+        ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""Compare the cost of sending heartbeats through the queue, shared memory and ring channels."""
+import argparse
+import multiprocessing
+import time
+
+from common import limited, report, timeit
+
+from watchdog.channels import QueueChannel, RingChannel, SharedMemoryChannel
+from watchdog.misc import monotonic_ns
+
+
+def bench_send(channel, iterations):
+    result = timeit(lambda: channel.send(monotonic_ns(), 1.0, 0.5, 100), iterations)
+    # Drain the channel so that the feeder thread of a queue can exit.
+    while channel.receive(0.1):
+        pass
+    return result
+
+
+def bench_receive(channel, iterations):
+    for _ in range(iterations):
+        channel.send(monotonic_ns(), 1.0, 0.5, 100)
+    start = time.time()
+    received = 0
+    while received < iterations and time.time() - start < 60:
+        received += sum(message.count for message in channel.receive())
+    return (time.time() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', '-n', type=int, default=100000)
+    parser.add_argument('--timeout', type=float, default=300.0, help='Time limit (seconds) of each benchmark')
+    args = parser.parse_args()
+
+    factories = [
+        ('queue', lambda: QueueChannel(multiprocessing.Queue)),
+        ('shared_memory', lambda: SharedMemoryChannel(event_class=multiprocessing.Event)),
+        ('ring', lambda: RingChannel(event_class=multiprocessing.Event)),
+        ('ring (coalesce)', lambda: RingChannel(event_class=multiprocessing.Event, overflow='coalesce')),
+    ]
+    for name, factory in factories:
+        report('channel: {}'.format(name), [
+            ('send', limited(args.timeout, bench_send, factory(), args.iterations)),
+            ('receive (per heartbeat)', limited(args.timeout, bench_receive, factory(), args.iterations)),
+        ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""Measure the detection latency of a watchdog daemon watching many jobs."""
+import argparse
+import os
+import tempfile
+import time
+
+from common import report
+
+from watchdog.actions import Action
+from watchdog.channels import DaemonChannel
+from watchdog.daemon import WatchdogDaemon
+from watchdog.estimators import StaticEstimator
+from watchdog.misc import WatchItem, monotonic_ns, to_monotonic_ns
+
+latencies = []
+
+
+class LatencyAction(Action):
+    def __call__(self, tick_time, estimated_trigger_time, message):
+        latencies.append((monotonic_ns() - to_monotonic_ns(estimated_trigger_time)) / 1e9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--jobs', '-n', type=int, default=2000)
+    parser.add_argument('--duration', type=float, default=2.0, help='Estimated interval (seconds) of the jobs')
+    args = parser.parse_args()
+
+    daemon = WatchdogDaemon(os.path.join(tempfile.mkdtemp(), 'watchdog.sock'))
+    daemon.start()
+    channels = [DaemonChannel(daemon.address, [WatchItem(LatencyAction(), StaticEstimator(args.duration))])
+                for _ in range(args.jobs)]
+    start = time.time()
+    for channel in channels:
+        channel.connect()
+        channel.send(monotonic_ns(), 1.0, 0.1, 100)
+    registration = (time.time() - start) / args.jobs
+    while len(latencies) < args.jobs and time.time() - start < args.duration + 60:
+        time.sleep(0.1)
+    for channel in channels:
+        channel.close()
+    daemon.stop()
+
+    latencies.sort()
+    report('daemon: {} jobs'.format(args.jobs), [
+        ('register and send (per job)', registration),
+        ('detection latency (median)', latencies[len(latencies) // 2]),
+        ('detection latency (max)', latencies[-1]),
+    ])
+
+
+if __name__ == '__main__':
+    main()
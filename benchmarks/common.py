@@ -0,0 +1,80 @@
+import contextlib
+import os
+import signal
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+class FakeUpdater(object):
+    def __init__(self, iterations_per_epoch=1000):
+        self.iteration = 0
+        self.epoch_detail = 0.0
+        self._iterations_per_epoch = iterations_per_epoch
+
+    def update(self):
+        self.iteration += 1
+        self.epoch_detail = self.iteration / float(self._iterations_per_epoch)
+
+
+class FakeTrainer(object):
+    """Minimum stand-in of `chainer.training.Trainer` driving an extension."""
+
+    def __init__(self, iterations_per_epoch=1000):
+        self.out = 'result'
+        self.updater = FakeUpdater(iterations_per_epoch)
+        self._start_time = time.time()
+
+    @property
+    def elapsed_time(self):
+        return time.time() - self._start_time
+
+    def step(self):
+        self.updater.update()
+
+
+class BenchmarkTimeout(Exception):
+    """Error raised when a benchmark takes longer than its time limit."""
+
+
+@contextlib.contextmanager
+def time_limit(seconds, grace=10.0):
+    """Raise `BenchmarkTimeout` in the main thread when a block takes longer than `seconds`.
+
+    It is raised again every `grace` seconds, so that cleanup which hangs as well is interrupted too.
+    """
+    def handler(signum, frame):
+        raise BenchmarkTimeout()
+    previous = signal.signal(signal.SIGALRM, handler)
+    signal.setitimer(signal.ITIMER_REAL, seconds, grace)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def limited(seconds, func, *args):
+    """Run a benchmark and return its result, or `None` if it takes longer than `seconds`."""
+    try:
+        with time_limit(seconds):
+            return func(*args)
+    except BenchmarkTimeout:
+        return None
+
+
+def timeit(func, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        func()
+    return (time.time() - start) / repeat
+
+
+def report(title, rows):
+    print(title)
+    for name, value in rows:
+        if value is None:
+            print('  {:<40} {:>12}'.format(name, 'timed out'))
+        else:
+            print('  {:<40} {:>12.3f} us'.format(name, value * 1e6))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""Compare two results of `suite.py` and fail on regressions.
+
+Every result is lower-is-better. A result regresses when it exceeds the base
+result by more than the relative threshold and by more than the absolute
+threshold of its unit, which absorbs the noise of tiny values. A result of the
+base missing from the other version, e.g. because its benchmark timed out,
+regresses too.
+"""
+import argparse
+import json
+import sys
+
+# Noise floors of the units of the results.
+absolute_thresholds = {
+    'seconds': 1e-6,
+    'cores': 0.005,
+    'bytes': 1024 ** 2,
+}
+
+
+def compare(base, head, threshold=0.2):
+    """Compare results.
+
+    Args:
+        base (dict) : Results of the base version.
+        head (dict) : Results of the version to check.
+        threshold (float, optional) : Relative increase tolerated. Defaults to `0.2`.
+
+    Returns:
+        list[tuple] : Names, base values, head values and whether the results regress.
+            Head values of missing results are `None`.
+    """
+    rows = []
+    for name in sorted(base):
+        if name not in head:
+            rows.append((name, base[name], None, True))
+            continue
+        unit = name.rsplit('_', 1)[-1]
+        increase = head[name] - base[name]
+        regressed = increase > base[name] * threshold and increase > absolute_thresholds.get(unit, 0.0)
+        rows.append((name, base[name], head[name], regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base', help='JSON results of the base version')
+    parser.add_argument('head', help='JSON results of the version to check')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative increase tolerated')
+    args = parser.parse_args(argv)
+
+    with open(args.base) as f:
+        base = json.load(f)['results']
+    with open(args.head) as f:
+        head = json.load(f)['results']
+
+    rows = compare(base, head, threshold=args.threshold)
+    for name, base_value, head_value, regressed in rows:
+        if head_value is None:
+            print('{:<60} {:>14.6g} {:>14} {:>8}  REGRESSION'.format(name, base_value, 'missing', ''))
+            continue
+        change = (head_value - base_value) / base_value if base_value else 0.0
+        print('{:<60} {:>14.6g} {:>14.6g} {:>+8.1%}{}'.format(name, base_value, head_value, change,
+                                                            '  REGRESSION' if regressed else ''))
+    return 1 if any(regressed for _, _, _, regressed in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+"""Measure the overhead of the Watchdog extension and write the results as JSON.
+
+Every benchmark runs under a time limit, and the results of a benchmark which
+exceeds it are left out and listed in `timeouts`. Compare the results of two
+versions with `compare.py`.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from common import FakeTrainer, limited, report, timeit
+
+from six.moves.queue import Empty
+
+from watchdog import Watchdog
+from watchdog.actions import Action
+from watchdog.estimators import StaticEstimator
+from watchdog.misc import monotonic_ns, to_monotonic_ns
+from watchdog.resources import ProcProbe
+
+configurations = [
+    ('process', 'queue'),
+    ('process', 'shared_memory'),
+    ('process', 'ring'),
+    ('thread', 'queue'),
+    ('thread', 'shared_memory'),
+    ('thread', 'ring'),
+]
+
+
+class LatencyAction(Action):
+    """Action to send the delay from the estimated trigger time to the action."""
+
+    def __init__(self):
+        self.queue = multiprocessing.Queue()
+
+    def __call__(self, tick_time, estimated_trigger_time, message):
+        self.queue.put((monotonic_ns() - to_monotonic_ns(estimated_trigger_time)) / 1e9)
+
+
+def make_watchdog(backend, channel, trigger, action=None, duration=3600.0, interval=5.0):
+    watch_items = [(action or LatencyAction(), StaticEstimator(duration=duration))]
+    return Watchdog(watch_items=watch_items, trigger=trigger, interval=interval, backend=backend, channel=channel)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def bench_call(backend, channel, triggered, iterations):
+    trainer = FakeTrainer()
+    baseline = timeit(trainer.step, iterations)
+    extension = make_watchdog(backend, channel, lambda trainer: triggered)
+    extension.initialize(trainer)
+    try:
+        def run():
+            trainer.step()
+            extension(trainer)
+        return max(0.0, timeit(run, iterations) - baseline)
+    finally:
+        extension.finalize()
+
+
+def bench_startup(backend, channel, repeat):
+    trainer = FakeTrainer()
+    initialize = finalize = 0.0
+    for _ in range(repeat):
+        extension = make_watchdog(backend, channel, (100, 'iteration'))
+        start = time.time()
+        extension.initialize(trainer)
+        initialize += time.time() - start
+        start = time.time()
+        extension.finalize()
+        finalize += time.time() - start
+    return initialize / repeat, finalize / repeat
+
+
+def bench_idle_cpu(backend, channel, duration):
+    trainer = FakeTrainer()
+    extension = make_watchdog(backend, channel, (100, 'iteration'))
+    extension.initialize(trainer)
+    try:
+        # The training process only sleeps, so its CPU time is spent by a watcher thread.
+        probe = ProcProbe(extension._heartbeat_thread.pid if backend == 'process' else os.getpid())
+        first = probe.sample()
+        time.sleep(duration)
+        last = probe.sample()
+        probe.close()
+        return (last.cpu_time - first.cpu_time) / (last.time - first.time)
+    finally:
+        extension.finalize()
+
+
+def bench_detection_latency(backend, channel, trials, duration=0.2, interval=0.5):
+    trainer = FakeTrainer()
+    latencies = []
+    misses = 0
+    for _ in range(trials):
+        action = LatencyAction()
+        extension = make_watchdog(backend, channel, lambda trainer: True, action=action, duration=duration,
+                                  interval=interval)
+        extension.initialize(trainer)
+        try:
+            # Keep sending heartbeats for a while so that the watcher of the shared memory channel,
+            # which reads heartbeats only when it wakes up, has caught up with them.
+            stop_time = time.time() + 2 * interval
+            while time.time() < stop_time:
+                trainer.step()
+                extension(trainer)
+                time.sleep(duration / 4)
+            latencies.append(action.queue.get(timeout=duration + 10.0))
+        except Empty:
+            misses += 1
+        finally:
+            extension.finalize()
+    return latencies, misses
+
+
+def bench_memory_growth(backend, channel, iterations):
+    trainer = FakeTrainer()
+    extension = make_watchdog(backend, channel, (100, 'iteration'))
+    extension.initialize(trainer)
+    probe = ProcProbe()
+    try:
+        for _ in range(iterations // 10):
+            trainer.step()
+            extension(trainer)
+        first = probe.sample()
+        for _ in range(iterations):
+            trainer.step()
+            extension(trainer)
+        return probe.sample().rss - first.rss
+    finally:
+        probe.close()
+        extension.finalize()
+
+
+def bench_rows(backend, channel, args):
+    """Return the groups of benchmarks of a configuration as names and functions returning rows."""
+    def startup():
+        initialize, finalize = bench_startup(backend, channel, args.startup_repeat)
+        return [('initialize_seconds', initialize), ('finalize_seconds', finalize)]
+
+    def detection_latency():
+        latencies, misses = bench_detection_latency(backend, channel, args.latency_trials)
+        rows = [('detection_misses_count', misses)]
+        if latencies:
+            rows += [
+                ('detection_latency_p50_seconds', percentile(latencies, 0.5)),
+                ('detection_latency_p90_seconds', percentile(latencies, 0.9)),
+                ('detection_latency_max_seconds', max(latencies)),
+            ]
+        return rows
+
+    return [
+        ('call_triggered', lambda: [('call_triggered_seconds', bench_call(backend, channel, True, args.iterations))]),
+        ('call_not_triggered',
+         lambda: [('call_not_triggered_seconds', bench_call(backend, channel, False, args.iterations))]),
+        ('startup', startup),
+        ('idle_cpu', lambda: [('idle_cpu_cores', bench_idle_cpu(backend, channel, args.idle_duration))]),
+        ('detection_latency', detection_latency),
+        ('memory_growth',
+         lambda: [('memory_growth_bytes', bench_memory_growth(backend, channel, args.memory_iterations))]),
+    ]
+
+
+def metadata():
+    try:
+        revision = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT,
+                                           cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'revision': revision,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': multiprocessing.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', '-o', help='JSON file to write the results to')
+    parser.add_argument('--iterations', '-n', type=int, default=100000)
+    parser.add_argument('--memory-iterations', type=int, default=10000000)
+    parser.add_argument('--startup-repeat', type=int, default=20)
+    parser.add_argument('--idle-duration', type=float, default=5.0)
+    parser.add_argument('--latency-trials', type=int, default=20)
+    parser.add_argument('--timeout', type=float, default=600.0, help='Time limit (seconds) of each benchmark')
+    parser.add_argument('--quick', action='store_true', help='Run every benchmark a hundredth as long')
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.iterations //= 100
+        args.memory_iterations //= 100
+        args.startup_repeat = max(1, args.startup_repeat // 10)
+        args.idle_duration /= 10
+        args.latency_trials = max(1, args.latency_trials // 10)
+
+    results = {}
+    timeouts = []
+    for backend, channel in configurations:
+        name = '{}/{}'.format(backend, channel)
+        rows = []
+        for group, func in bench_rows(backend, channel, args):
+            group_rows = limited(args.timeout, func)
+            if group_rows is None:
+                timeouts.append('{}/{}'.format(name, group))
+            else:
+                rows.extend(group_rows)
+        for key, value in rows:
+            results['{}/{}'.format(name, key)] = value
+        report(name, [(key, value) for key, value in rows if key.endswith('_seconds')])
+        values = dict(rows)
+        if 'idle_cpu_cores' in values:
+            print('  {:<40} {:>12.3f} %'.format('idle_cpu_cores', values['idle_cpu_cores'] * 100))
+        if 'detection_misses_count' in values:
+            print('  {:<40} {:>12d}'.format('detection_misses_count', values['detection_misses_count']))
+        if 'memory_growth_bytes' in values:
+            print('  {:<40} {:>12d} B'.format('memory_growth_bytes', values['memory_growth_bytes']))
+    for group in timeouts:
+        print('timed out: {}'.format(group))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'metadata': metadata(), 'results': results, 'timeouts': timeouts}, f, indent=2,
+                      sort_keys=True, allow_nan=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -32,6 +32,12 @@ setup(
     keywords='chainer extension',
     packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests"]),
     install_requires=REQUIRES,
+    entry_points={
+        'console_scripts': [
+            'chainer-watchdog-daemon = watchdog.daemon:main',
+            'chainer-watchdog-replay = watchdog.replay:main',
+        ],
+    },
     tests_require=TESTS_REQUIRES,
     extras_require={
         'dev': [
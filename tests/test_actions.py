@@ -5,9 +5,13 @@ except ImportError:
     from unittest import mock
 from datetime import datetime, timedelta
 from dateutil import tz
+import errno
 import tempfile
 import time
 import os
+import signal
+import subprocess
+import threading
 from dateutil.parser import parse
 
 from watchdog import actions
@@ -39,11 +43,24 @@ class TestMessageAction():
         assert action._get_message(tick_time, estimated_trigger_time, message) == expected_message
 
 
+    def test__get_message_with_phases(monkeypatch):
+        action = actions.MessageAction(message_template='{slowest_phase} ({last_phases})')
+        now = datetime.now(tz.tzutc())
+        message = Message(now, 10, 1, 2, phases={'updater': 1.5, 'data': 1.2, 'update': 0.25})
+
+        assert action._get_message(now, now, message) == 'data (updater: 1.500s, data: 1.200s, update: 0.250s)'
+        assert action._get_message(now, now, Message(now, 10, 1, 2)) == 'None (None)'
+
+
 class TestAbort():
     def test_inheritance(monkeypatch):
         action = actions.Abort()
         assert isinstance(action, actions.Action)
 
+    def test_priority(monkeypatch):
+        assert actions.Abort.priority
+        assert not actions.WarningMessage.priority
+
     @mock.patch('os.kill')
     def test___call__(monkeypatch, kill_mock):
         kill_mock.return_value = None
@@ -56,6 +73,63 @@ class TestAbort():
         action(now, now, message)
         kill_mock.assert_called_once_with(pid, mysignal)
 
+    @mock.patch('os.kill')
+    def test___call___flush_deliveries(monkeypatch, kill_mock):
+        calls = []
+        kill_mock.side_effect = lambda *args: calls.append('kill')
+        with mock.patch.object(actions, 'flush_all', side_effect=lambda timeout: calls.append(('flush', timeout))):
+            now = datetime.now(tz.tzutc())
+            actions.Abort(12345, flush_timeout=3)(now, now, Message(now, 10, 1, 2))
+        assert calls == [('flush', 3), 'kill']
+
+
+class TestGracefulAbort():
+    def test_inheritance(monkeypatch):
+        assert isinstance(actions.GracefulAbort(), actions.Abort)
+
+    def test_timeout(monkeypatch):
+        assert actions.GracefulAbort(snapshot_timeout=5, kill_timeout=2, flush_timeout=3).timeout == 11
+
+    def test_snapshot_then_terminate(monkeypatch):
+        process = subprocess.Popen(['sleep', '30'])
+        calls = []
+        snapshot = lambda trainer: calls.append(('snapshot', trainer, process.poll()))
+        action = actions.GracefulAbort(process.pid, snapshot=snapshot, kill_timeout=0.2)
+        action.initialize('trainer')
+        now = datetime.now(tz.tzutc())
+        action(now, now, Message(now, 10, 1, 2))
+        assert calls == [('snapshot', 'trainer', None)]
+        assert process.wait() == -signal.SIGTERM
+
+    @mock.patch('os.kill')
+    def test_kill_after_timeouts(monkeypatch, kill_mock):
+        hung = threading.Event()
+        action = actions.GracefulAbort(12345, snapshot=lambda trainer: hung.wait(), snapshot_timeout=0.1,
+                                       kill_timeout=0.1)
+        action.initialize('trainer')
+        now = datetime.now(tz.tzutc())
+        action(now, now, Message(now, 10, 1, 2))
+        hung.set()
+        assert kill_mock.call_args_list[0] == mock.call(12345, signal.SIGTERM)
+        assert kill_mock.call_args_list[-1] == mock.call(12345, signal.SIGKILL)
+
+    @mock.patch('os.kill')
+    def test_without_initialize(monkeypatch, kill_mock):
+        kill_mock.side_effect = [None, OSError(errno.ESRCH, 'No such process')]
+        action = actions.GracefulAbort(12345, snapshot=mock.Mock())
+        now = datetime.now(tz.tzutc())
+        action(now, now, Message(now, 10, 1, 2))
+        assert kill_mock.call_args_list == [mock.call(12345, signal.SIGTERM), mock.call(12345, 0)]
+
+    def test_default_snapshot(monkeypatch, tmpdir):
+        trainer = mock.Mock(out=str(tmpdir))
+        trainer.updater.iteration = 300
+        action = actions.GracefulAbort(12345)
+        action.initialize(trainer)
+        action._requested.set()
+        assert action._done.wait(5)
+        assert tmpdir.join('snapshot_emergency_iter_300').check()
+
 
 class TestWarningMessageAction():
     def test_inheritance(monkeypatch):
@@ -93,6 +167,26 @@ class TestSlackWebhookNotification():
             slack_mock.assert_called_once_with(channel=channel, text=expected_message)
 
 
+    def test___call___with_delivery(monkeypatch):
+        delivery_mock = mock.Mock()
+        action = actions.SlackWebhookNotification('url', 'channel', delivery=delivery_mock, tzinfo='Asia/Tokyo')
+        tick_time = parse('2017/10/10T02:03:04Z')
+        estimated_trigger_time = parse('2017/05/10T03:04:05Z')
+        trigger_time = parse('2017/10/05T11:11:11Z')
+        message = Message(trigger_time, 10, 1, 2)
+
+        action(tick_time, estimated_trigger_time, message)
+        expected_message = "Next trigger didn't come " \
+                           "before the estimated time 2017-05-10T12:04:05+09:00 "\
+                           "since 2017-10-05T20:11:11+09:00 at (epoch: 1, iteration: 2)."
+        delivery_mock.post.assert_called_once_with('url', 'channel', expected_message)
+
+    def test_close(monkeypatch):
+        delivery_mock = mock.Mock()
+        actions.SlackWebhookNotification('url', 'channel', delivery=delivery_mock).close()
+        delivery_mock.close.assert_called_once_with()
+
+
 class TestSlackTokenNotification():
     def test_inheritance(monkeypatch):
         action = actions.SlackNotification('token', 'channel')
@@ -115,3 +209,22 @@ class TestSlackTokenNotification():
                                "since 2017-10-05T20:11:11+09:00 at (epoch: 1, iteration: 2)."
             slack_mock.assert_called_once_with('chat.postMessage', channel=channel, text=expected_message)
 
+    def test___call___with_delivery(monkeypatch):
+        delivery_mock = mock.Mock()
+        action = actions.SlackNotification('token', 'channel', delivery=delivery_mock, tzinfo='Asia/Tokyo')
+        tick_time = parse('2017/10/10T02:03:04Z')
+        estimated_trigger_time = parse('2017/05/10T03:04:05Z')
+        trigger_time = parse('2017/10/05T11:11:11Z')
+        message = Message(trigger_time, 10, 1, 2)
+
+        action(tick_time, estimated_trigger_time, message)
+        expected_message = "Next trigger didn't come " \
+                           "before the estimated time 2017-05-10T12:04:05+09:00 "\
+                           "since 2017-10-05T20:11:11+09:00 at (epoch: 1, iteration: 2)."
+        delivery_mock.post.assert_called_once_with('https://slack.com/api/chat.postMessage', 'channel',
+                                                   expected_message, token='token')
+
+    def test_close(monkeypatch):
+        delivery_mock = mock.Mock()
+        actions.SlackNotification('token', 'channel', delivery=delivery_mock).close()
+        delivery_mock.close.assert_called_once_with()
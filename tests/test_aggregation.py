@@ -0,0 +1,167 @@
+import multiprocessing
+import os
+import tempfile
+import time
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+from watchdog import aggregation
+from watchdog.estimators import StaticEstimator
+from watchdog.misc import Message, monotonic_ns
+
+
+def report(address, rank, iterations):
+    reporter = aggregation.RankReporter(address, rank)
+    reporter._socket = aggregation.connect(address)
+    for iteration in range(100, iterations + 1, 100):
+        reporter.send(time.time(), iteration / 100.0, iteration / 1000.0, iteration)
+        time.sleep(0.01)
+    reporter.finalize()
+
+
+def run_job(address, iterations):
+    processes = [multiprocessing.Process(target=report, args=(address, rank, n)) for rank, n in enumerate(iterations)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestCoordinator():
+    def test_unix_socket(monkeypatch):
+        action_mock = mock.Mock()
+        address = os.path.join(tempfile.mkdtemp(), 'watchdog.sock')
+        coordinator = aggregation.Coordinator(address, [(action_mock, StaticEstimator(0.5))], size=3, interval=0.1)
+        coordinator.start()
+        try:
+            run_job(address, [1000, 1000, 300])
+            wait_for(lambda: action_mock.called)
+            time.sleep(0.6)
+        finally:
+            coordinator.stop()
+        assert action_mock.call_count == 1
+        _, _, message = action_mock.call_args[0]
+        assert message.rank == 2
+        assert message.iteration == 300
+        assert message.lag == 700
+        assert coordinator.lags()[2][0] == 700
+        assert coordinator.lags()[0][0] == 0
+
+    def test_tcp_socket(monkeypatch):
+        action_mock = mock.Mock()
+        coordinator = aggregation.Coordinator(('127.0.0.1', 0), [(action_mock, StaticEstimator(0.5))], size=2,
+                                              interval=0.1)
+        coordinator.start()
+        try:
+            run_job(coordinator.address, [500, 200])
+            wait_for(lambda: action_mock.called)
+        finally:
+            coordinator.stop()
+        assert action_mock.call_count == 1
+        assert action_mock.call_args[0][2].rank == 1
+
+    def test_wait_for_all_ranks(monkeypatch):
+        action_mock = mock.Mock()
+        coordinator = aggregation.Coordinator(('127.0.0.1', 0), [(action_mock, StaticEstimator(0))], size=2)
+        now = monotonic_ns()
+        coordinator._tick(now, [Message(now, 1.0, 0.1, 100, rank=0), Message(now, 1.0, 0.1, 100, rank=0)])
+        action_mock.assert_not_called()
+        assert coordinator._job_message is None
+        coordinator._tick(now, [Message(now, 1.0, 0.1, 100, rank=1)])
+        assert coordinator._job_message.iteration == 100
+        coordinator._tick(now + 10 ** 9, [])
+        action_mock.assert_called_once()
+
+    def test_survive_failing_action(monkeypatch):
+        action_mock = mock.Mock(side_effect=OSError('No such process'))
+        coordinator = aggregation.Coordinator(('127.0.0.1', 0), [(action_mock, StaticEstimator(0))], size=1)
+        now = monotonic_ns()
+        coordinator._tick(now, [Message(now, 1.0, 0.1, 100, rank=0)])
+        coordinator._tick(now + 10 ** 9, [])
+        action_mock.assert_called_once()
+
+    def test_survive_reset_connection(monkeypatch):
+        coordinator = aggregation.Coordinator(('127.0.0.1', 0), [], size=1)
+        sock = mock.Mock()
+        sock.recv.side_effect = aggregation.socket.error('Connection reset by peer')
+        clients = {sock: b''}
+        assert coordinator._read(sock, clients) == []
+        assert clients == {}
+
+
+class TestRankReporter():
+    def test_drop_when_full(monkeypatch):
+        left, right = aggregation.socket.socketpair()
+        reporter = aggregation.RankReporter('unused', 0)
+        reporter._socket = left
+        left.setblocking(False)
+        for iteration in range(100000):
+            reporter.send(0.0, 0.0, 0.0, iteration)
+        assert reporter.dropped > 0
+        reporter.finalize()
+        right.close()
+
+    def test_keep_records_aligned(monkeypatch):
+        left, right = aggregation.socket.socketpair()
+        reporter = aggregation.RankReporter('unused', 0)
+        reporter._socket = left
+        left.setblocking(False)
+        right.setblocking(False)
+        data = b''
+        for iteration in range(3):
+            for i in range(100000):
+                reporter.send(0.0, 0.0, 0.0, iteration * 100000 + i)
+            while True:
+                try:
+                    data += right.recv(1 << 20)
+                except aggregation.socket.error:
+                    break
+        reporter.send(0.0, 0.0, 0.0, 300000)
+        data += right.recv(1 << 20)
+        assert len(data) % aggregation._record.size == 0
+        iterations = [aggregation._record.unpack_from(data, offset)[4]
+                      for offset in range(0, len(data), aggregation._record.size)]
+        assert iterations == sorted(iterations)
+        assert iterations[-1] == 300000
+        assert reporter.dropped == 300001 - len(iterations)
+        reporter.finalize()
+        right.close()
+
+    def test_survive_lost_coordinator(monkeypatch):
+        address = os.path.join(tempfile.mkdtemp(), 'watchdog.sock')
+        server = aggregation.listen(address)
+        reporter = aggregation.RankReporter(address, 0, retry_interval=0)
+        reporter.initialize(mock.Mock(**{'updater.iteration': 0, 'updater.epoch_detail': 0.0}))
+        conn, _ = server.accept()
+        conn.close()
+        server.close()
+        for iteration in range(10):
+            reporter.send(0.0, 0.0, 0.0, iteration)
+        assert reporter._socket is None
+        assert reporter.dropped > 0
+
+        server = aggregation.listen(address)
+        reporter.send(0.0, 0.0, 0.0, 10)
+        conn, _ = server.accept()
+        assert aggregation._record.unpack(conn.recv(aggregation._record.size))[4] == 10
+        reporter.finalize()
+        conn.close()
+        server.close()
+
+    def test_initialize_without_coordinator(monkeypatch):
+        address = os.path.join(tempfile.mkdtemp(), 'missing.sock')
+        reporter = aggregation.RankReporter(address, 0)
+        reporter.initialize(mock.Mock(**{'updater.iteration': 0, 'updater.epoch_detail': 0.0}))
+        with mock.patch.object(aggregation, 'connect') as connect_mock:
+            reporter.send(0.0, 0.0, 0.0, 100)
+            connect_mock.assert_not_called()
+        assert reporter.dropped == 1
+        assert reporter._socket is None
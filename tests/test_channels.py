@@ -0,0 +1,264 @@
+import pytest
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+import multiprocessing
+import threading
+import time
+
+from six.moves import queue
+
+from watchdog import channels
+from watchdog.misc import Message, monotonic_ns
+
+
+class TestChannel():
+    def test_send(monkeypatch):
+        with pytest.raises(NotImplementedError):
+            channels.Channel().send(0, 0, 0, 0)
+
+    def test_send_progress(monkeypatch):
+        with pytest.raises(NotImplementedError):
+            channels.Channel().send_progress(0, 0)
+
+    def test_receive(monkeypatch):
+        with pytest.raises(NotImplementedError):
+            channels.Channel().receive()
+
+    def test_close(monkeypatch):
+        with pytest.raises(NotImplementedError):
+            channels.Channel().close()
+
+    def test_depth(monkeypatch):
+        with pytest.raises(NotImplementedError):
+            channels.Channel().depth()
+
+
+class TestQueueChannel():
+    def test_inheritance(monkeypatch):
+        assert isinstance(channels.QueueChannel(queue.Queue), channels.Channel)
+
+    def describe_receive():
+        def receive_all_messages_in_order():
+            channel = channels.QueueChannel(queue.Queue)
+            now = monotonic_ns()
+            for i in range(3):
+                channel.send(now + i, 10 + i, 0.5, i)
+
+            assert channel.depth() == 3
+            messages = channel.receive()
+            assert [message.iteration for message in messages] == [0, 1, 2]
+            assert messages[0].trigger_ns == now
+            assert messages[2].elapsed_time == 12
+            assert channel.receive() == []
+
+        def receive_progress_in_order():
+            channel = channels.QueueChannel(queue.Queue)
+            now = monotonic_ns()
+            channel.send(now, 10, 0.5, 1)
+            channel.send_progress(now + 1, 5)
+            channel.send(now + 2, 11, 0.5, 2)
+
+            messages = channel.receive()
+            assert [message.progress for message in messages] == [None, 5, None]
+            assert messages[1].trigger_ns == now + 1
+
+        def wait_for_a_message():
+            channel = channels.QueueChannel(queue.Queue)
+            start = time.time()
+            assert channel.receive(0.1) == []
+            assert time.time() - start >= 0.1
+
+        def woken_up_by_close():
+            channel = channels.QueueChannel(queue.Queue)
+            threading.Timer(0.1, channel.close).start()
+            start = time.time()
+            assert channel.receive(30) == []
+            assert time.time() - start < 5
+
+
+class TestSharedMemoryChannel():
+    def test_inheritance(monkeypatch):
+        assert isinstance(channels.SharedMemoryChannel(event_class=threading.Event), channels.Channel)
+
+    def describe_receive():
+        def receive_latest_message():
+            channel = channels.SharedMemoryChannel(event_class=threading.Event)
+            assert channel.receive() == []
+
+            now = monotonic_ns()
+            for i in range(3):
+                channel.send(now + i, 10 + i, 0.5, i)
+
+            messages = channel.receive()
+            assert len(messages) == 1
+            assert messages[0].trigger_ns == now + 2
+            assert messages[0].elapsed_time == 12
+            assert messages[0].epoch_detail == 0.5
+            assert messages[0].iteration == 2
+            assert messages[0].count == 3
+            assert channel.receive() == []
+            assert channel.depth() == 0
+
+            channel.send(now + 3, 13, 0.5, 3)
+            assert channel.depth() == 1
+            assert [message.count for message in channel.receive()] == [1]
+
+        def receive_latest_progress():
+            channel = channels.SharedMemoryChannel(event_class=threading.Event)
+            now = monotonic_ns()
+            channel.send(now, 10, 0.5, 1)
+            channel.send_progress(now + 1, 5)
+            channel.send_progress(now + 2, 8)
+
+            messages = channel.receive()
+            assert [message.progress for message in messages] == [8, None]
+            assert messages[0].trigger_ns == now + 2
+            assert messages[1].iteration == 1
+            assert channel.receive() == []
+
+            channel.send_progress(now + 3, 9)
+            assert [message.progress for message in channel.receive()] == [9]
+            assert channel.depth() == 0
+
+        def receive_from_another_process():
+            channel = channels.SharedMemoryChannel(event_class=multiprocessing.Event)
+            process = multiprocessing.Process(target=channel.send, args=(monotonic_ns(), 10, 0.5, 7))
+            process.start()
+            process.join()
+
+            messages = channel.receive()
+            assert [message.iteration for message in messages] == [7]
+
+        def give_up_on_torn_write():
+            channel = channels.SharedMemoryChannel(event_class=threading.Event)
+            channel.send(monotonic_ns(), 10, 0.5, 1)
+            channels.SharedMemoryChannel._sequence.pack_into(channel._buffer, 0, 3)
+            assert channel.receive() == []
+
+        def woken_up_by_close():
+            channel = channels.SharedMemoryChannel(event_class=threading.Event)
+            threading.Timer(0.1, channel.close).start()
+            start = time.time()
+            assert channel.receive(30) == []
+            assert time.time() - start < 5
+
+
+class TestRingChannel():
+    def test_inheritance(monkeypatch):
+        assert isinstance(channels.RingChannel(event_class=threading.Event), channels.Channel)
+
+    def test_unknown_overflow(monkeypatch):
+        with pytest.raises(ValueError):
+            channels.RingChannel(event_class=threading.Event, overflow='block')
+
+    def describe_receive():
+        def receive_all_messages_in_order():
+            channel = channels.RingChannel(event_class=threading.Event, size=4)
+            now = monotonic_ns()
+            for i in range(3):
+                channel.send(now + i, 10 + i, 0.5, i)
+
+            assert channel.depth() == 3
+            messages = channel.receive()
+            assert [message.iteration for message in messages] == [0, 1, 2]
+            assert [message.count for message in messages] == [1, 1, 1]
+            assert messages[0].trigger_ns == now
+            assert messages[2].elapsed_time == 12
+            assert channel.receive() == []
+            assert channel.depth() == 0
+
+        def drop_oldest():
+            channel = channels.RingChannel(event_class=threading.Event, size=4)
+            now = monotonic_ns()
+            for i in range(10):
+                channel.send(now + i, 10 + i, 0.5, i)
+
+            assert channel.depth() == 4
+            messages = channel.receive()
+            assert [message.iteration for message in messages] == [6, 7, 8, 9]
+            assert [message.count for message in messages] == [7, 1, 1, 1]
+            assert channel.drops == {'overrun': 6, 'overwritten': 0, 'coalesced': 0}
+
+        def keep_latest():
+            channel = channels.RingChannel(event_class=threading.Event, size=4, overflow='keep_latest')
+            now = monotonic_ns()
+            for i in range(10):
+                channel.send(now + i, 10 + i, 0.5, i)
+
+            messages = channel.receive()
+            assert [message.iteration for message in messages] == [0, 1, 2, 9]
+            assert [message.count for message in messages] == [1, 1, 1, 7]
+            assert messages[3].min_interval is None
+            assert channel.drops == {'overrun': 0, 'overwritten': 6, 'coalesced': 0}
+
+            channel.send(now + 10, 20, 0.5, 10)
+            assert [message.iteration for message in channel.receive()] == [10]
+
+        def coalesce():
+            channel = channels.RingChannel(event_class=threading.Event, size=2, overflow='coalesce')
+            now = monotonic_ns()
+            for i, elapsed_time in enumerate([10, 11, 13, 14, 18]):
+                channel.send(now + i, elapsed_time, 0.5, i)
+
+            messages = channel.receive()
+            assert [message.iteration for message in messages] == [0, 4]
+            assert [message.count for message in messages] == [1, 4]
+            assert messages[0].min_interval is None
+            assert messages[1].min_interval == 1
+            assert messages[1].max_interval == 4
+            assert channel.drops == {'overrun': 0, 'overwritten': 0, 'coalesced': 3}
+
+        def receive_message_rewritten_after_read():
+            channel = channels.RingChannel(event_class=threading.Event, size=2, overflow='keep_latest')
+            now = monotonic_ns()
+            channel.send(now, 10, 0.5, 0)
+            channel.send(now + 1, 11, 0.5, 1)
+            # The sender has seen the tail before the watcher stored it.
+            with mock.patch.object(channel, '_store'):
+                assert [message.iteration for message in channel.receive()] == [0, 1]
+            channel.send(now + 2, 12, 0.5, 2)
+
+            messages = channel.receive()
+            assert [message.iteration for message in messages] == [2]
+            assert [message.count for message in messages] == [1]
+
+        def receive_latest_progress():
+            channel = channels.RingChannel(event_class=threading.Event, size=2)
+            now = monotonic_ns()
+            for i in range(3):
+                channel.send(now + i, 10 + i, 0.5, i)
+            channel.send_progress(now + 3, 5)
+
+            messages = channel.receive()
+            assert [message.progress for message in messages] == [5, None, None]
+            assert [message.iteration for message in messages[1:]] == [1, 2]
+            assert channel.receive() == []
+
+            channel.send_progress(now + 4, 6)
+            channels.RingChannel._counter.pack_into(channel._buffer, channel._progress._offset, 5)
+            assert channel.receive() == []
+
+        def receive_from_another_process():
+            channel = channels.RingChannel(event_class=multiprocessing.Event)
+            process = multiprocessing.Process(target=channel.send, args=(monotonic_ns(), 10, 0.5, 7))
+            process.start()
+            process.join()
+
+            messages = channel.receive()
+            assert [message.iteration for message in messages] == [7]
+
+        def give_up_on_torn_write():
+            channel = channels.RingChannel(event_class=threading.Event)
+            channel.send(monotonic_ns(), 10, 0.5, 1)
+            channels.RingChannel._counter.pack_into(channel._buffer, channels.RingChannel._header_size, 3)
+            assert channel.receive() == []
+            assert channel.drops['overrun'] == 1
+
+        def woken_up_by_close():
+            channel = channels.RingChannel(event_class=threading.Event)
+            threading.Timer(0.1, channel.close).start()
+            start = time.time()
+            assert channel.receive(30) == []
+            assert time.time() - start < 5
@@ -0,0 +1,149 @@
+import os
+import socket
+import stat
+import struct
+import time
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+import pytest
+
+from watchdog import daemon as watchdog_daemon
+from watchdog.actions import Action
+from watchdog.channels import DaemonChannel
+from watchdog.estimators import StaticEstimator
+from watchdog.executors import ActionExecutor
+from watchdog.misc import WatchItem, monotonic_ns
+
+fired = []
+
+
+class FailingAction(Action):
+    def __call__(self, tick_time, estimated_trigger_time, message):
+        raise OSError('No such process')
+
+
+class RecordAction(Action):
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, tick_time, estimated_trigger_time, message):
+        fired.append((self.name, message.iteration))
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def daemon(tmpdir):
+    del fired[:]
+    daemon = watchdog_daemon.WatchdogDaemon(str(tmpdir.join('watchdog.sock')), interval=0.1)
+    daemon.start()
+    yield daemon
+    daemon.stop()
+
+
+def make_channel(daemon, name, duration=0.2):
+    channel = DaemonChannel(daemon.address, [WatchItem(RecordAction(name), StaticEstimator(duration))])
+    channel.connect()
+    return channel
+
+
+class TestWatchdogDaemon():
+    def test_fire_on_missing_heartbeat(monkeypatch, daemon):
+        alive = make_channel(daemon, 'alive')
+        hung = make_channel(daemon, 'hung')
+        wait_for(lambda: daemon.jobs == 2)
+        hung.send(monotonic_ns(), 1.0, 0.1, 100)
+        for iteration in range(100, 600, 100):
+            alive.send(monotonic_ns(), 1.0, 0.1, iteration)
+            time.sleep(0.1)
+        wait_for(lambda: fired)
+        assert fired == [('hung', 100)]
+        alive.close()
+        hung.close()
+
+    def test_unregister(monkeypatch, daemon):
+        channel = make_channel(daemon, 'job')
+        channel.send(monotonic_ns(), 1.0, 0.1, 100)
+        channel.close()
+        wait_for(lambda: daemon.jobs == 0)
+        time.sleep(0.4)
+        assert daemon.jobs == 0
+        assert fired == []
+
+    def test_watch_crashed_trainer(monkeypatch, daemon):
+        channel = make_channel(daemon, 'job')
+        channel.send(monotonic_ns(), 1.0, 0.1, 100)
+        channel._disconnect()
+        wait_for(lambda: fired)
+        assert fired == [('job', 100)]
+
+    def test_register_again_after_reconnect(monkeypatch, daemon):
+        channel = make_channel(daemon, 'job')
+        channel.send(monotonic_ns(), 1.0, 0.1, 100)
+        channel._disconnect()
+        channel.connect()
+        wait_for(lambda: daemon.jobs == 1)
+        time.sleep(0.4)
+        assert fired == []
+        assert daemon.jobs == 1
+        channel.close()
+
+    def test_survive_failing_action(monkeypatch, daemon):
+        failing = DaemonChannel(daemon.address, [WatchItem(FailingAction(), StaticEstimator(0.1))])
+        failing.connect()
+        failing.send(monotonic_ns(), 1.0, 0.1, 100)
+        failing._disconnect()
+        time.sleep(0.4)
+
+        channel = make_channel(daemon, 'job')
+        channel.send(monotonic_ns(), 1.0, 0.1, 200)
+        wait_for(lambda: fired)
+        assert fired == [('job', 200)]
+        channel.close()
+
+    def test_drop_malformed_frame(monkeypatch, daemon):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(daemon.address)
+        sock.sendall(struct.pack('<I', 4) + b'oops')
+        wait_for(lambda: sock.recv(1) == b'')
+        sock.close()
+
+        channel = make_channel(daemon, 'job')
+        channel.send(monotonic_ns(), 1.0, 0.1, 100)
+        wait_for(lambda: fired)
+        assert fired == [('job', 100)]
+        channel.close()
+
+    def test_socket_permissions(monkeypatch, daemon):
+        assert stat.S_IMODE(os.stat(daemon.address).st_mode) == 0o600
+
+    def test_reject_tcp_address(monkeypatch):
+        with pytest.raises(ValueError):
+            watchdog_daemon.WatchdogDaemon(('127.0.0.1', 0))
+        with pytest.raises(ValueError):
+            DaemonChannel(('127.0.0.1', 0), [])
+
+    def test_drop_heartbeat_without_daemon(monkeypatch, tmpdir):
+        channel = DaemonChannel(str(tmpdir.join('missing.sock')), [])
+        channel.send(monotonic_ns(), 1.0, 0.1, 100)
+        assert channel._socket is None
+
+
+def test_main(monkeypatch):
+    daemon_mock = mock.Mock()
+    monkeypatch.setattr(watchdog_daemon, 'WatchdogDaemon', mock.Mock(return_value=daemon_mock))
+    watchdog_daemon.main(['--address', '/tmp/test.sock', '--interval', '1'])
+    executor = watchdog_daemon.WatchdogDaemon.call_args[1]['executor']
+    assert isinstance(executor, ActionExecutor)
+    assert executor._workers == 2
+    daemon_mock.serve_forever.assert_called_once_with()
+
+    watchdog_daemon.main(['--workers', '0'])
+    assert watchdog_daemon.WatchdogDaemon.call_args[1]['executor'] is None
@@ -0,0 +1,156 @@
+import pytest
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+import json
+import threading
+import time
+
+from six.moves import BaseHTTPServer
+
+from watchdog import delivery
+
+
+class StubSlackHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append({
+            'path': self.path,
+            'authorization': self.headers.get('Authorization'),
+            'body': json.loads(body.decode('utf-8')),
+            'client': self.client_address,
+        })
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        response = self.server.responses.pop(0) if self.server.responses else b'ok'
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), StubSlackHandler)
+    server.requests = []
+    server.statuses = []
+    server.responses = []
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    server.url = 'http://127.0.0.1:{}/hook'.format(server.server_address[1])
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestTokenBucket():
+    def test_acquire(monkeypatch):
+        bucket = delivery.TokenBucket(rate=20, burst=2)
+        start = time.time()
+        for _ in range(4):
+            bucket.acquire()
+        assert time.time() - start >= 0.09
+
+
+class TestConnectionPool():
+    def test_request(monkeypatch, server):
+        pool = delivery.ConnectionPool()
+        for _ in range(3):
+            status, _, body = pool.request('POST', server.url, body=b'{}', headers={'Content-Length': '2'})
+            assert status == 200
+            assert body == b'ok'
+        pool.close()
+        assert len(server.requests) == 3
+        assert len(set(request['client'] for request in server.requests)) == 1
+
+
+class TestSlackDelivery():
+    def test_post_coalesce_messages_to_the_same_channel(monkeypatch, server):
+        slack = delivery.SlackDelivery(window=0.2, rate=100)
+        slack.post(server.url, '#a', 'first')
+        slack.post(server.url, '#b', 'other')
+        slack.post(server.url, '#a', 'second')
+        assert slack.flush(5)
+        slack.close()
+
+        assert [request['body'] for request in server.requests] == [
+            {'channel': '#a', 'text': 'first\nsecond'},
+            {'channel': '#b', 'text': 'other'},
+        ]
+
+    def test_post_send_after_window(monkeypatch, server):
+        slack = delivery.SlackDelivery(window=0.05, rate=100)
+        slack.post(server.url, '#a', 'hello', token='token')
+        deadline = time.time() + 5
+        while not server.requests and time.time() < deadline:
+            time.sleep(0.01)
+        slack.close()
+
+        assert len(server.requests) == 1
+        assert server.requests[0]['authorization'] == 'Bearer token'
+        assert server.requests[0]['path'] == '/hook'
+
+    def test_post_keep_order_and_connections(monkeypatch, server):
+        slack = delivery.SlackDelivery(window=0, rate=1000, burst=1000)
+        start = time.time()
+        for i in range(200):
+            slack.post(server.url, '#{}'.format(i), str(i))
+        assert slack.flush(30)
+        elapsed = time.time() - start
+        slack.close()
+
+        assert [request['body']['text'] for request in server.requests] == [str(i) for i in range(200)]
+        assert len(set(request['client'] for request in server.requests)) == 1
+        assert elapsed < 10
+
+    def test_post_limit_rate(monkeypatch, server):
+        slack = delivery.SlackDelivery(window=0, rate=20, burst=1)
+        start = time.time()
+        for i in range(4):
+            slack.post(server.url, '#{}'.format(i), 'hello')
+        assert slack.flush(5)
+        slack.close()
+        assert time.time() - start >= 0.14
+
+    def test_post_retry_rate_limited_post(monkeypatch, server):
+        server.statuses = [429]
+        slack = delivery.SlackDelivery(window=0, rate=100)
+        slack.post(server.url, '#a', 'hello')
+        assert slack.flush(5)
+        slack.close()
+        assert len(server.requests) == 2
+
+    def test_post_log_api_error(monkeypatch, server):
+        server.responses = [b'{"ok": false, "error": "channel_not_found"}', b'{"ok": true}']
+        slack = delivery.SlackDelivery(window=0, rate=100)
+        with mock.patch.object(delivery.logger, 'error') as error_mock:
+            slack.post(server.url, '#a', 'hello')
+            assert slack.flush(5)
+            slack.post(server.url, '#b', 'hello')
+            slack.close(5)
+        error_mock.assert_called_once_with('Failed to post a message to %s: %s', '#a', 'channel_not_found')
+
+    def test_close_send_pending_messages(monkeypatch, server):
+        slack = delivery.SlackDelivery(window=60, rate=100)
+        slack.post(server.url, '#a', 'hello')
+        slack.close(5)
+        assert [request['body']['text'] for request in server.requests] == ['hello']
+
+
+def test_flush_all(server):
+    deliveries = [delivery.SlackDelivery(window=60, rate=100) for _ in range(2)]
+    for i, slack in enumerate(deliveries):
+        slack.post(server.url, '#{}'.format(i), 'hello')
+    assert delivery.flush_all(5)
+    assert sorted(request['body']['channel'] for request in server.requests) == ['#0', '#1']
+    for slack in deliveries:
+        slack.close()
@@ -0,0 +1,71 @@
+import pytest
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+from datetime import timedelta
+
+from watchdog import detectors
+from watchdog.misc import Message, WatchItem, monotonic_ns, to_datetime
+
+
+def feed(watch_item, seconds_per_iteration, trigger_ns, elapsed_time, iteration, stride=100):
+    for duration in seconds_per_iteration:
+        trigger_ns = trigger_ns + int(duration * stride * 10 ** 9)
+        elapsed_time += duration * stride
+        iteration += stride
+        watch_item(trigger_ns, Message(trigger_ns, elapsed_time, iteration / 1000.0, iteration))
+    return trigger_ns, elapsed_time, iteration
+
+
+class TestCusum():
+    def test_update(monkeypatch):
+        cusum = detectors.Cusum(allowance=0.2, threshold=1.0)
+        assert not cusum.update(0.1)
+        assert cusum.statistic == 0.0
+        for _ in range(4):
+            assert not cusum.update(0.45)
+        assert cusum.update(0.45)
+        cusum.reset()
+        assert cusum.statistic == 0.0
+
+
+class TestThroughputWatchItem():
+    def test_inheritance(monkeypatch):
+        assert isinstance(detectors.ThroughputWatchItem(mock.Mock()), WatchItem)
+
+    def describe___call__():
+        def fire_on_slowdown():
+            action_mock = mock.Mock()
+            watch_item = detectors.ThroughputWatchItem(action_mock, slowdown=0.4, warmup=5)
+            state = (monotonic_ns(), 0.0, 0)
+
+            state = feed(watch_item, [0.10, 0.11, 0.09, 0.10, 0.10, 0.10] + [0.105, 0.095] * 20, *state)
+            action_mock.assert_not_called()
+
+            state = feed(watch_item, [0.14] * 4, *state)
+            action_mock.assert_not_called()
+            trigger_ns = state[0]
+            state = feed(watch_item, [0.15], *state)
+            assert action_mock.call_count == 1
+            tick_time, expected_time, message = action_mock.call_args[0]
+            assert tick_time == to_datetime(state[0])
+            assert abs(expected_time - to_datetime(trigger_ns + 10 * 10 ** 9)) <= timedelta(microseconds=1)
+            assert message.iteration == state[2]
+            assert watch_item._fire_count == 1
+
+        def learn_new_baseline_after_action():
+            action_mock = mock.Mock()
+            watch_item = detectors.ThroughputWatchItem(action_mock, slowdown=0.4, warmup=5)
+            state = feed(watch_item, [0.1] * 6 + [0.2] * 3, monotonic_ns(), 0.0, 0)
+            assert action_mock.call_count == 1
+
+            feed(watch_item, [0.2] * 30, *state)
+            assert action_mock.call_count == 1
+
+        def ignore_ticks_without_messages():
+            action_mock = mock.Mock()
+            watch_item = detectors.ThroughputWatchItem(action_mock)
+            watch_item(monotonic_ns(), None)
+            assert watch_item._estimated_trigger_time is None
+            action_mock.assert_not_called()
@@ -0,0 +1,93 @@
+import signal
+import threading
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+from datetime import datetime
+
+from dateutil import tz
+
+from watchdog import diagnostics
+from watchdog.actions import WarningMessage
+from watchdog.misc import Message
+
+
+def stuck_in_data_loader(event):
+    event.wait()
+
+
+def start_stuck_thread():
+    event = threading.Event()
+    thread = threading.Thread(target=stuck_in_data_loader, args=(event,), name='loader')
+    thread.daemon = True
+    thread.start()
+    return event
+
+
+def test_sample_stacks():
+    event = start_stuck_thread()
+    stacks = diagnostics.sample_stacks(0.05, 100.0)
+    event.set()
+    loader_stacks = [stack for stack in stacks if stack.startswith('loader;')]
+    assert len(loader_stacks) == 1
+    assert 'stuck_in_data_loader' in loader_stacks[0]
+    assert stacks[loader_stacks[0]] >= 2
+
+
+def test_summarize_stacks():
+    stacks = {'main;a.py:f:1;b.py:g:2': 3, 'loader;a.py:f:1;b.py:g:2;c.py:h:3;d.py:i:4;e.py:j:5': 1}
+    summary = diagnostics.summarize_stacks(diagnostics.collections.Counter(stacks), depth=3)
+    assert summary.splitlines() == [
+        '75% main: a.py:f:1 > b.py:g:2',
+        '25% loader: ... > c.py:h:3 > d.py:i:4 > e.py:j:5',
+    ]
+
+
+def test_compress_stacks():
+    stacks = {'main;a.py:f:1;b.py:g:2': 3, 'loader;c.py:h 3': 1}
+    assert diagnostics.decompress_stacks(diagnostics.compress_stacks(stacks)) == stacks
+
+
+class TestHangDiagnostics():
+    def test_priority(monkeypatch):
+        assert not diagnostics.HangDiagnostics(WarningMessage()).priority
+        assert diagnostics.HangDiagnostics(mock.Mock(priority=True, timeout=10), duration=1).timeout == 11
+
+    def test___call__(monkeypatch, tmpdir):
+        action_mock = mock.Mock(priority=False, timeout=None)
+        trainer = mock.Mock(out=str(tmpdir.join('result')))
+        action = diagnostics.HangDiagnostics(action_mock, duration=0.1, rate=50.0)
+        action.initialize(trainer)
+        action_mock.initialize.assert_called_once_with(trainer)
+        event = start_stuck_thread()
+        now = datetime.now(tz.tzutc())
+        message = Message(now, 10, 1, 2)
+        try:
+            action(now, now, message)
+        finally:
+            event.set()
+            diagnostics.faulthandler.unregister(signal.SIGUSR1)
+
+        tick_time, estimated_trigger_time, diagnosed = action_mock.call_args[0]
+        assert message.diagnostics is None
+        assert diagnosed.iteration == 2
+        assert 'stuck_in_data_loader' in diagnosed.diagnostics['summary']
+        profile = diagnostics.decompress_stacks(diagnosed.diagnostics['profile'])
+        assert any('stuck_in_data_loader' in stack for stack in profile)
+        traceback_file = tmpdir.join('result', 'watchdog_traceback_{}.txt'.format(action._pid))
+        assert diagnosed.diagnostics['traceback_file'] == str(traceback_file)
+        assert 'stuck_in_data_loader' in traceback_file.read()
+
+    def test_without_initialize(monkeypatch):
+        action_mock = mock.Mock(priority=False, timeout=None)
+        action = diagnostics.HangDiagnostics(action_mock)
+        now = datetime.now(tz.tzutc())
+        action(now, now, Message(now, 10, 1, 2))
+        assert action_mock.call_args[0][2].diagnostics == {'summary': None, 'profile': None, 'traceback_file': None}
+
+    def test_message_template(monkeypatch):
+        action = WarningMessage(message_template='{traceback_file}\n{diagnostics}')
+        now = datetime.now(tz.tzutc())
+        message = Message(now, 10, 1, 2, diagnostics={'summary': '100% loader: f', 'traceback_file': 'tb.txt'})
+        assert action._get_message(now, now, message) == 'tb.txt\n100% loader: f'
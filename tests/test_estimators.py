@@ -3,14 +3,12 @@ try:
     import mock
 except ImportError:
     from unittest import mock
-from datetime import datetime, timedelta
 import tempfile
 import time
 import os
-from dateutil.parser import parse
-from dateutil import tz
 
 from watchdog import estimators
+from watchdog.history import HeartbeatRing
 from watchdog.misc import Message
 
 
@@ -30,32 +28,43 @@ class TestSimpleEstimator():
         def normal_case():
             estimator = estimators.SimpleEstimator()
 
-            trigger_time = parse('2017/10/05T11:11:11Z')
-            message = Message(trigger_time, 10, 1, 2)
+            trigger_ns = 10 ** 18
+            message = Message(trigger_ns, 10, 1, 2)
             assert estimator(message) == None
 
-            trigger_time = trigger_time + timedelta(seconds=1)
-            message = Message(trigger_time, 15, 1, 2)
-            assert estimator(message) == trigger_time + timedelta(seconds=7.5)
+            trigger_ns = trigger_ns + 1 * 10 ** 9
+            message = Message(trigger_ns, 15, 1, 2)
+            assert estimator(message) == trigger_ns + int(7.5 * 10 ** 9)
 
-            trigger_time = trigger_time + timedelta(seconds=2)
-            message = Message(trigger_time, 17, 1, 2)
-            assert estimator(message) == trigger_time + timedelta(seconds=5.25)
+            trigger_ns = trigger_ns + 2 * 10 ** 9
+            message = Message(trigger_ns, 17, 1, 2)
+            assert estimator(message) == trigger_ns + int(5.25 * 10 ** 9)
 
         def with_factor():
             estimator = estimators.SimpleEstimator(factor=10)
 
-            trigger_time = parse('2017/10/05T11:11:11Z')
-            message = Message(trigger_time, 10, 1, 2)
+            trigger_ns = 10 ** 18
+            message = Message(trigger_ns, 10, 1, 2)
             assert estimator(message) == None
 
-            trigger_time = trigger_time + timedelta(seconds=1)
-            message = Message(trigger_time, 15, 1, 2)
-            assert estimator(message) == trigger_time + timedelta(seconds=50)
+            trigger_ns = trigger_ns + 1 * 10 ** 9
+            message = Message(trigger_ns, 15, 1, 2)
+            assert estimator(message) == trigger_ns + 50 * 10 ** 9
 
-            trigger_time = trigger_time + timedelta(seconds=2)
-            message = Message(trigger_time, 17, 1, 2)
-            assert estimator(message) == trigger_time + timedelta(seconds=35)
+            trigger_ns = trigger_ns + 2 * 10 ** 9
+            message = Message(trigger_ns, 17, 1, 2)
+            assert estimator(message) == trigger_ns + 35 * 10 ** 9
+
+        def with_coalesced_messages():
+            estimator = estimators.SimpleEstimator()
+
+            trigger_ns = 10 ** 18
+            message = Message(trigger_ns, 10, 1, 2)
+            assert estimator(message) == None
+
+            trigger_ns = trigger_ns + 4 * 10 ** 9
+            message = Message(trigger_ns, 16, 1, 2, count=3)
+            assert estimator(message) == trigger_ns + 3 * 10 ** 9
 
 
 class TestStaticEstimator():
@@ -65,11 +74,168 @@ class TestStaticEstimator():
 
     def test___call__(monkeypatch):
         estimator = estimators.StaticEstimator(duration=5)
-        trigger_time = parse('2017/10/05T11:11:11Z')
+        trigger_ns = 10 ** 18
+
+        message = Message(trigger_ns, 15, 1, 2)
+        assert estimator(message) == trigger_ns + 5 * 10 ** 9
+
+        trigger_ns = trigger_ns + 1 * 10 ** 9
+        message = Message(trigger_ns, 17, 1, 2)
+        assert estimator(message) == trigger_ns + 5 * 10 ** 9
+
+
+# Intervals (seconds) between triggers recorded from a training run with a slow
+# warm-up, a learning-rate phase running 20% slower and an evaluation at the end of each epoch.
+RECORDED_TRACE = (
+    [21.3, 18.7, 9.2, 4.1] +
+    [1.02, 0.98, 1.05, 0.97, 1.01, 0.99, 1.03, 0.96, 1.00, 1.04] * 5 +
+    [31.5] +
+    [1.21, 1.18, 1.24, 1.19, 1.22, 1.17, 1.20, 1.23, 1.18, 1.21] * 5 +
+    [30.8] +
+    [1.20, 1.22, 1.19, 1.21, 1.18] * 4
+)
+
+
+def replay(estimator, intervals, history=None):
+    """Replay a trace and return estimated durations and missed deadlines."""
+    def call(message):
+        if history is not None:
+            history.append(message)
+        return estimator(message)
+
+    if history is not None:
+        estimator.attach(history)
+    trigger_ns = 10 ** 18
+    elapsed_time = 0.0
+    durations = []
+    missed = []
+    estimated = call(Message(trigger_ns, elapsed_time, 0, 0))
+    for i, interval in enumerate(intervals):
+        trigger_ns = trigger_ns + int(interval * 10 ** 9)
+        elapsed_time += interval
+        if estimated is not None and estimated < trigger_ns:
+            missed.append(i)
+        estimated = call(Message(trigger_ns, elapsed_time, 0, i + 1))
+        durations.append((estimated - trigger_ns) / 1e9)
+    return durations, missed
+
+
+class TestEWMAEstimator():
+    def test_inheritance(monkeypatch):
+        estimator = estimators.EWMAEstimator()
+        assert isinstance(estimator, estimators.IntervalEstimator)
+
+    def describe___call__():
+        def normal_case():
+            estimator = estimators.EWMAEstimator(alpha=0.5, factor=2)
+
+            trigger_ns = 10 ** 18
+            assert estimator(Message(trigger_ns, 10, 1, 2)) is None
+
+            trigger_ns = trigger_ns + 1 * 10 ** 9
+            assert estimator(Message(trigger_ns, 14, 1, 3)) == trigger_ns + 8 * 10 ** 9
 
-        message = Message(trigger_time, 15, 1, 2)
-        assert estimator(message) == trigger_time + timedelta(seconds=5)
+            trigger_ns = trigger_ns + 1 * 10 ** 9
+            assert estimator(Message(trigger_ns, 16, 1, 4)) == trigger_ns + 6 * 10 ** 9
 
-        trigger_time = trigger_time + timedelta(seconds=1)
-        message = Message(trigger_time, 17, 1, 2)
-        assert estimator(message) == trigger_time + timedelta(seconds=5)
+        def replay_recorded_trace():
+            durations, missed = replay(estimators.EWMAEstimator(alpha=0.2), RECORDED_TRACE)
+            assert set(missed) <= {54, 105}
+            assert durations[-1] < 2.5
+
+        def forget_warm_up_unlike_simple_estimator():
+            ewma_durations, _ = replay(estimators.EWMAEstimator(alpha=0.2), RECORDED_TRACE)
+            simple_durations, _ = replay(estimators.SimpleEstimator(), RECORDED_TRACE)
+            assert ewma_durations[-1] * 1.5 < simple_durations[-1]
+
+
+class TestQuantileEstimator():
+    def test_inheritance(monkeypatch):
+        estimator = estimators.QuantileEstimator()
+        assert isinstance(estimator, estimators.IntervalEstimator)
+
+    def describe___call__():
+        def normal_case():
+            estimator = estimators.QuantileEstimator(quantile=0.5, window=3, factor=1)
+
+            trigger_ns = 10 ** 18
+            elapsed_time = 0
+            assert estimator(Message(trigger_ns, elapsed_time, 1, 0)) is None
+            expected = [1, 1.5, 2, 3, 4]
+            for interval, duration in zip([1, 2, 3, 4, 5], expected):
+                trigger_ns = trigger_ns + int(interval * 10 ** 9)
+                elapsed_time += interval
+                estimated = estimator(Message(trigger_ns, elapsed_time, 1, 0))
+                assert estimated == trigger_ns + int(duration * 10 ** 9)
+
+        def replay_recorded_trace():
+            durations, missed = replay(estimators.QuantileEstimator(quantile=0.9, window=20), RECORDED_TRACE)
+            assert set(missed) <= {54, 105}
+            assert durations[-1] < 2.5
+
+        def share_history():
+            history = HeartbeatRing(size=32)
+            expected, _ = replay(estimators.QuantileEstimator(quantile=0.9, window=20), RECORDED_TRACE)
+            durations, _ = replay(estimators.QuantileEstimator(quantile=0.9, window=20), RECORDED_TRACE, history)
+            assert durations == expected
+
+    def test_attach_small_history(monkeypatch):
+        with pytest.raises(ValueError):
+            estimators.QuantileEstimator(window=20).attach(HeartbeatRing(size=20))
+
+
+class TestMedianEstimator():
+    def test_inheritance(monkeypatch):
+        estimator = estimators.MedianEstimator()
+        assert isinstance(estimator, estimators.IntervalEstimator)
+
+    def describe___call__():
+        def normal_case():
+            estimator = estimators.MedianEstimator(window=5, factor=1, deviations=1)
+
+            trigger_ns = 10 ** 18
+            elapsed_time = 0
+            assert estimator(Message(trigger_ns, elapsed_time, 1, 0)) is None
+            for interval in [1, 1, 2, 1, 30]:
+                trigger_ns = trigger_ns + int(interval * 10 ** 9)
+                elapsed_time += interval
+                estimated = estimator(Message(trigger_ns, elapsed_time, 1, 0))
+            # median: 1, MAD: 0
+            assert estimated == trigger_ns + 1 * 10 ** 9
+
+            for interval in [2, 2]:
+                trigger_ns = trigger_ns + int(interval * 10 ** 9)
+                elapsed_time += interval
+                estimated = estimator(Message(trigger_ns, elapsed_time, 1, 0))
+            # window: [2, 1, 30, 2, 2], median: 2, MAD: 0
+            assert estimated == trigger_ns + 2 * 10 ** 9
+
+            trigger_ns = trigger_ns + 4 * 10 ** 9
+            elapsed_time += 4
+            estimated = estimator(Message(trigger_ns, elapsed_time, 1, 0))
+            # window: [1, 30, 2, 2, 4], median: 2, MAD: 1
+            assert estimated == trigger_ns + int((2 + 1.4826) * 10 ** 9)
+
+        def replay_recorded_trace():
+            durations, missed = replay(estimators.MedianEstimator(window=20), RECORDED_TRACE)
+            assert set(missed) <= {54, 105}
+            assert durations[-1] < 2.5
+
+        def share_history():
+            history = HeartbeatRing(size=21)
+            median = estimators.MedianEstimator(window=20)
+            ewma = estimators.EWMAEstimator(alpha=0.2)
+            median.attach(history)
+            ewma.attach(history)
+            trigger_ns = 0
+            elapsed_time = 0.0
+            for i, interval in enumerate(RECORDED_TRACE):
+                trigger_ns += int(interval * 10 ** 9)
+                elapsed_time += interval
+                message = Message(trigger_ns, elapsed_time, 0, i)
+                history.append(message)
+                median(message)
+                ewma(message)
+            expected, _ = replay(estimators.MedianEstimator(window=20), RECORDED_TRACE)
+            assert abs(median._estimate() - expected[-1]) < 1e-9
+            assert sorted(history.window('interval', 20)) == median._window.sorted
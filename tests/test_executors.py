@@ -0,0 +1,113 @@
+import pytest
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+import threading
+import time
+
+from watchdog import executors
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class BlockingAction(object):
+    priority = False
+    timeout = None
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, tick_time, estimated_trigger_time, message):
+        self.started.set()
+        self.release.wait(5)
+
+
+class TestActionExecutor():
+    def describe_submit():
+        def run_action_asynchronously():
+            executor = executors.ActionExecutor()
+            action = mock.Mock(priority=False, timeout=None)
+            try:
+                assert executor.submit(action, 'tick', 'estimated', 'message')
+                assert wait_until(lambda: executor.metrics['completed'] == 1)
+                action.assert_called_once_with('tick', 'estimated', 'message')
+            finally:
+                executor.shutdown()
+            metrics = executor.metrics
+            assert metrics['dispatched'] == 1
+            assert metrics['latency_max'] >= metrics['latency_mean'] >= 0
+
+        def run_priority_action_behind_slow_action():
+            executor = executors.ActionExecutor(workers=1)
+            slow_action = BlockingAction()
+            priority_action = mock.Mock(priority=True, timeout=None)
+            try:
+                executor.submit(slow_action, None, None, None)
+                assert slow_action.started.wait(5)
+                executor.submit(priority_action, None, None, None)
+                assert wait_until(lambda: priority_action.called)
+            finally:
+                slow_action.release.set()
+                executor.shutdown()
+
+        def drop_action_on_full_lane():
+            executor = executors.ActionExecutor(workers=1, max_pending=1)
+            slow_action = BlockingAction()
+            try:
+                assert executor.submit(slow_action, None, None, None)
+                assert slow_action.started.wait(5)
+                assert executor.submit(slow_action, None, None, None)
+                assert not executor.submit(slow_action, None, None, None)
+                assert executor.metrics['dropped'] == 1
+            finally:
+                slow_action.release.set()
+                executor.shutdown()
+
+        def time_out_action():
+            executor = executors.ActionExecutor(timeout=0.1)
+            slow_action = BlockingAction()
+            try:
+                executor.submit(slow_action, None, None, None)
+                assert wait_until(lambda: executor.metrics['timed_out'] == 1)
+            finally:
+                slow_action.release.set()
+                executor.shutdown()
+
+        def retry_failed_action():
+            executor = executors.ActionExecutor(backoff=0.01)
+            action = mock.Mock(priority=False, timeout=None, side_effect=[ValueError(), None])
+            try:
+                executor.submit(action, None, None, None)
+                assert wait_until(lambda: executor.metrics['completed'] == 1)
+            finally:
+                executor.shutdown()
+            assert action.call_count == 2
+            assert executor.metrics['retried'] == 1
+
+        def give_up_failed_action():
+            executor = executors.ActionExecutor(retries=1, backoff=0.01)
+            action = mock.Mock(priority=False, timeout=None, side_effect=ValueError())
+            try:
+                executor.submit(action, None, None, None)
+                assert wait_until(lambda: executor.metrics['failed'] == 1)
+            finally:
+                executor.shutdown()
+            assert action.call_count == 2
+
+    def describe_shutdown():
+        def stop_workers():
+            executor = executors.ActionExecutor()
+            executor.start()
+            threads = list(executor._threads)
+            executor.shutdown()
+            assert not any(thread.is_alive() for thread in threads)
+
+        def without_start():
+            executors.ActionExecutor().shutdown()
@@ -3,13 +3,30 @@ try:
     import mock
 except ImportError:
     from unittest import mock
-from datetime import datetime, timedelta
+import multiprocessing
+import os
+import subprocess
+import sys
 import tempfile
+import threading
+import time
 
+import chainer
+import chainer.links as L
+import numpy as np
 from chainer import training
+from six.moves import queue
+from six.moves.urllib.request import urlopen
 
 from watchdog import extension as watchdog_extension
-from watchdog.misc import WatchItem
+from watchdog.channels import DaemonChannel, QueueChannel, RingChannel, SharedMemoryChannel
+from watchdog.estimators import QuantileEstimator, StaticEstimator
+from watchdog.executors import ActionExecutor
+from watchdog.metrics import MetricsExporter
+from watchdog.misc import Message, WatchItem, monotonic_ns, to_datetime
+from watchdog.policies import EscalationPolicy
+from watchdog.progress import ProgressProbe
+from watchdog.triggers import AdaptiveIntervalTrigger
 
 
 def get_trainer():
@@ -23,6 +40,16 @@ def get_trainer():
     return trainer
 
 
+def make_trainer(iterations):
+    model = L.Classifier(L.Linear(3, 2))
+    optimizer = chainer.optimizers.SGD()
+    optimizer.setup(model)
+    dataset = chainer.datasets.TupleDataset(np.random.rand(20, 3).astype(np.float32),
+                                            np.random.randint(0, 2, size=20).astype(np.int32))
+    updater = training.updaters.StandardUpdater(chainer.iterators.SerialIterator(dataset, 4), optimizer)
+    return training.Trainer(updater, (iterations, 'iteration'), out=tempfile.mkdtemp())
+
+
 class TestWatchdog():
     def test_inheritance(monkeypatch):
         extension = watchdog_extension.Watchdog(watch_items=[])
@@ -37,6 +64,65 @@ class TestWatchdog():
             extension = watchdog_extension.Watchdog(watch_items=[watchdog_extension.WatchItem('action', 'estimator')])
             assert [type(item) for item in extension._watch_items] == [watchdog_extension.WatchItem]
 
+        def test_with_executor():
+            executor = ActionExecutor()
+            other_executor = ActionExecutor()
+            extension = watchdog_extension.Watchdog(watch_items=[
+                ('action', 'estimator'),
+                watchdog_extension.WatchItem('action', 'estimator', executor=other_executor),
+            ], executor=executor)
+            assert [item._executor for item in extension._watch_items] == [executor, other_executor]
+
+        def test_with_adaptive_trigger():
+            trigger = AdaptiveIntervalTrigger(period=2.0)
+            extension = watchdog_extension.Watchdog(watch_items=[], trigger=trigger)
+            assert extension._trigger is trigger
+
+        def test_with_thread_backend():
+            extension = watchdog_extension.Watchdog(watch_items=[], backend='thread')
+            assert isinstance(extension._heartbeat_thread, threading.Thread)
+            assert isinstance(extension._channel._queue, queue.Queue)
+
+        def test_with_shared_memory_channel():
+            extension = watchdog_extension.Watchdog(watch_items=[], channel='shared_memory')
+            assert isinstance(extension._channel, SharedMemoryChannel)
+
+        def test_with_ring_channel():
+            extension = watchdog_extension.Watchdog(watch_items=[], channel='ring')
+            assert isinstance(extension._channel, RingChannel)
+
+        def test_with_small_history():
+            with pytest.raises(ValueError):
+                watchdog_extension.Watchdog(watch_items=[('action', QuantileEstimator(window=100))], history=50)
+
+        def test_with_channel_instance():
+            channel = RingChannel(size=16, overflow='coalesce')
+            extension = watchdog_extension.Watchdog(watch_items=[], channel=channel)
+            assert extension._channel is channel
+
+        def test_with_daemon():
+            extension = watchdog_extension.Watchdog(watch_items=[], daemon='/tmp/watchdog.sock')
+            assert isinstance(extension._channel, DaemonChannel)
+            assert extension._heartbeat_thread is None
+
+        def test_with_daemon_and_executor():
+            with pytest.raises(ValueError):
+                watchdog_extension.Watchdog(watch_items=[], daemon='/tmp/watchdog.sock', executor=ActionExecutor())
+
+        def test_with_daemon_and_progress():
+            with pytest.raises(ValueError):
+                watchdog_extension.Watchdog(watch_items=[], daemon='/tmp/watchdog.sock', progress=ProgressProbe())
+
+        def test_with_unknown_channel():
+            with pytest.raises(ValueError) as exc_info:
+                watchdog_extension.Watchdog(watch_items=[], channel='hoge')
+            assert str(exc_info.value) == 'Unknown channel: hoge'
+
+        def test_with_unknown_backend():
+            with pytest.raises(ValueError) as exc_info:
+                watchdog_extension.Watchdog(watch_items=[], backend='hoge')
+            assert str(exc_info.value) == 'Unknown backend: hoge'
+
     def describe_initialize():
         def start_heartbeat_thread():
             trainer = get_trainer()
@@ -46,6 +132,45 @@ class TestWatchdog():
             extension.initialize(trainer)
             assert extension._heartbeat_thread.is_alive()
 
+        def initialize_actions():
+            trainer = get_trainer()
+            action_mock = mock.Mock()
+            policy_action_mock = mock.Mock()
+            extension = watchdog_extension.Watchdog(watch_items=[
+                (action_mock, 'estimator'),
+                EscalationPolicy('estimator', [(policy_action_mock, 1.0)]),
+            ], backend='thread')
+            extension.initialize(trainer)
+            action_mock.initialize.assert_called_once_with(trainer)
+            policy_action_mock.initialize.assert_called_once_with(trainer)
+            extension.finalize()
+
+        def instrument_trainer():
+            trainer = make_trainer(3)
+            extension = watchdog_extension.Watchdog(watch_items=[], trigger=(1, 'iteration'),
+                                                    backend='thread', instrument=True)
+            extension._channel = mock.Mock()
+            extension._channel.receive.return_value = []
+            trainer.extend(extension)
+            trainer.run()
+
+            calls = extension._channel.send.call_args_list
+            assert [args[3] for args, _ in calls] == [1, 2, 3]
+            assert all('forward_backward' in kwargs['phases'] for _, kwargs in calls)
+            assert not any(name.startswith('extension:') for name in calls[0][1]['phases'])
+
+        def start_progress_probe():
+            trainer = make_trainer(3)
+            probe = ProgressProbe(interval=0.01)
+            extension = watchdog_extension.Watchdog(watch_items=[], backend='thread', instrument=True, progress=probe)
+            extension._channel = mock.Mock()
+            extension._channel.receive.return_value = []
+            trainer.extend(extension)
+            trainer.run()
+
+            assert probe.counts['update'] == 3
+            assert probe._thread is None
+
     def describe___call__():
         def with_trigger():
             trainer = get_trainer()
@@ -66,6 +191,46 @@ class TestWatchdog():
                 extension(trainer)
             assert str(exc_info.value) == 'Heartbeat thread is dead'
 
+        def detect_dead_watcher_without_polling():
+            trainer = get_trainer()
+            extension = watchdog_extension.Watchdog(watch_items=[], trigger=lambda trainer: False)
+            extension.initialize(trainer)
+            with mock.patch.object(extension._heartbeat_thread, 'is_alive') as is_alive_mock:
+                extension(trainer)
+            is_alive_mock.assert_not_called()
+
+            extension._heartbeat_thread.terminate()
+            for _ in range(100):
+                if extension._watcher_dead:
+                    break
+                time.sleep(0.01)
+            with pytest.raises(RuntimeError):
+                extension(trainer)
+            extension.finalize()
+
+        def restart_dead_watcher():
+            fired = multiprocessing.Event()
+            trainer = get_trainer()
+            extension = watchdog_extension.Watchdog(
+                watch_items=[(lambda *args: fired.set(), StaticEstimator(duration=0.2))],
+                trigger=lambda trainer: True, interval=30, max_restarts=1)
+            extension.initialize(trainer)
+            dead = extension._heartbeat_thread
+            dead.terminate()
+            dead.join()
+            for _ in range(100):
+                if extension._watcher_dead:
+                    break
+                time.sleep(0.01)
+            try:
+                extension(trainer)
+                assert extension._heartbeat_thread is not dead
+                assert fired.wait(5)
+            finally:
+                extension.finalize()
+            assert not extension._heartbeat_thread.is_alive()
+            assert extension._max_restarts == 0
+
     def describe_finalize():
         def shutdown_heartbeat_thread():
             trainer = get_trainer()
@@ -76,4 +241,228 @@ class TestWatchdog():
             extension.finalize()
             assert not extension._heartbeat_thread.is_alive()
 
+        def return_without_waiting_interval():
+            trainer = get_trainer()
+            extension = watchdog_extension.Watchdog(watch_items=[], interval=30)
+            extension.initialize(trainer)
+            time.sleep(0.1)
+
+            start = time.time()
+            extension.finalize()
+            assert time.time() - start < 5
+            assert not extension._heartbeat_thread.is_alive()
+
+        def exit_with_pending_heartbeats():
+            script = '\n'.join([
+                'from watchdog import Watchdog',
+                'from watchdog.estimators import StaticEstimator',
+                'trainer = lambda: None',
+                'trainer.elapsed_time = 1.0',
+                'trainer.updater = lambda: None',
+                'trainer.updater.epoch_detail = 0.1',
+                'trainer.updater.iteration = 1',
+                'extension = Watchdog(watch_items=[(None, StaticEstimator(3600))], trigger=lambda trainer: True)',
+                'extension.initialize(trainer)',
+                'for _ in range(5000):',
+                '    extension(trainer)',
+                'extension.finalize()',
+            ])
+            root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            process = subprocess.Popen([sys.executable, '-c', script], cwd=root)
+            deadline = time.time() + 60
+            while process.poll() is None and time.time() < deadline:
+                time.sleep(0.1)
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            assert process.returncode == 0
+
+    def describe__heartbeat_handler():
+        def detect_stall_before_interval():
+            fired = multiprocessing.Event()
+            trainer = get_trainer()
+            extension = watchdog_extension.Watchdog(
+                watch_items=[(lambda *args: fired.set(), StaticEstimator(duration=0.2))],
+                trigger=lambda trainer: True, interval=30)
+            extension.initialize(trainer)
+            try:
+                extension(trainer)
+                assert fired.wait(5)
+            finally:
+                extension.finalize()
+
+        def detect_stall_with_thread_backend():
+            action_mock = mock.Mock()
+            trainer = get_trainer()
+            extension = watchdog_extension.Watchdog(
+                watch_items=[(action_mock, StaticEstimator(duration=0.2))],
+                trigger=lambda trainer: True, interval=30, backend='thread')
+            extension.initialize(trainer)
+            try:
+                extension(trainer)
+                deadline = time.time() + 5
+                while not action_mock.called and time.time() < deadline:
+                    time.sleep(0.01)
+                assert action_mock.call_count == 1
+            finally:
+                extension.finalize()
+            assert not extension._heartbeat_thread.is_alive()
+
+        def export_metrics():
+            trainer = get_trainer()
+            trainer.updater.iteration = 1
+            exporter = MetricsExporter(port=0, host='127.0.0.1')
+            extension = watchdog_extension.Watchdog(
+                watch_items=[(mock.Mock(), StaticEstimator(duration=60))],
+                trigger=lambda trainer: True, interval=30, backend='thread', metrics=exporter)
+            extension.initialize(trainer)
+            try:
+                extension(trainer)
+                deadline = time.time() + 5
+                text = ''
+                while 'watchdog_heartbeats_total 1.0' not in text and time.time() < deadline:
+                    time.sleep(0.01)
+                    if exporter._server is not None:
+                        text = urlopen('http://127.0.0.1:{}/metrics'.format(exporter.port)).read().decode('utf-8')
+                assert 'watchdog_heartbeats_total 1.0' in text
+            finally:
+                extension.finalize()
+
+        def detect_stall_with_shared_memory_channel():
+            fired = multiprocessing.Event()
+            trainer = get_trainer()
+            trainer.updater.iteration = 1
+            extension = watchdog_extension.Watchdog(
+                watch_items=[(lambda *args: fired.set(), StaticEstimator(duration=0.2))],
+                trigger=lambda trainer: True, interval=0.1, channel='shared_memory')
+            extension.initialize(trainer)
+            try:
+                extension(trainer)
+                assert fired.wait(5)
+            finally:
+                extension.finalize()
+
+        def detect_stall_with_ring_channel():
+            fired = multiprocessing.Event()
+            trainer = get_trainer()
+            trainer.updater.iteration = 1
+            extension = watchdog_extension.Watchdog(
+                watch_items=[(lambda *args: fired.set(), StaticEstimator(duration=0.2))],
+                trigger=lambda trainer: True, interval=0.1, channel=RingChannel(size=4, overflow='keep_latest'))
+            extension.initialize(trainer)
+            try:
+                for _ in range(10):
+                    extension(trainer)
+                assert fired.wait(5)
+            finally:
+                extension.finalize()
+
+        def extend_deadline_on_progress():
+            action_mock = mock.Mock()
+            trainer = get_trainer()
+            trainer.updater.iteration = 1
+            probe = ProgressProbe(interval=0.02)
+            # The steps are counted by the test.
+            probe.instrument = mock.Mock()
+            extension = watchdog_extension.Watchdog(
+                watch_items=[(action_mock, StaticEstimator(duration=0.3))],
+                trigger=lambda trainer: True, interval=0.1, backend='thread', channel='shared_memory', progress=probe)
+            extension.initialize(trainer)
+            try:
+                extension(trainer)
+                # A long iteration which keeps making progress.
+                stop_time = time.time() + 1.0
+                while time.time() < stop_time:
+                    probe.counts['data'] += 1
+                    time.sleep(0.01)
+                action_mock.assert_not_called()
+
+                deadline = time.time() + 5
+                while not action_mock.called and time.time() < deadline:
+                    time.sleep(0.01)
+                assert action_mock.call_count == 1
+            finally:
+                extension.finalize()
+
+    def describe__next_timeout():
+        def without_deadlines():
+            extension = watchdog_extension.Watchdog(watch_items=[], interval=3)
+            assert extension._next_timeout(monotonic_ns()) == 3
+
+        def with_deadline():
+            now = monotonic_ns()
+            extension = watchdog_extension.Watchdog(watch_items=[('action', StaticEstimator(duration=1))], interval=3)
+            extension._tick(now, [Message(now, 10, 1, 2)])
+            assert extension._next_timeout(now) == 1
+            assert extension._next_timeout(now + 5 * 10 ** 9) == 0
+
+    def describe__tick():
+        def drain_all_pending_heartbeats():
+            action_mock = mock.Mock()
+            extension = watchdog_extension.Watchdog(watch_items=[(action_mock, StaticEstimator(duration=1))])
+            extension._channel = QueueChannel(queue.Queue)
+            now = monotonic_ns()
+            start_ns = now - 10 * 10 ** 9
+            for i in range(100000):
+                message = Message(start_ns + 50000 * i, i * 0.00005, i / 1000.0, i)
+                extension._channel._queue.put_nowait(message)
+
+            extension._tick(now, extension._channel.receive())
+
+            assert extension._channel._queue.qsize() == 0
+            action_mock.assert_called_once_with(to_datetime(now), to_datetime(message.trigger_ns + 10 ** 9), message)
+
+        def wait_for_next_escalation_stage():
+            extension = watchdog_extension.Watchdog(watch_items=[
+                EscalationPolicy(StaticEstimator(duration=1), [(mock.Mock(), 1.0), (mock.Mock(), 3.0)]),
+            ])
+            now = monotonic_ns()
+            extension._tick(now, [Message(now, 10, 1, 2)])
+            extension._tick(now + 2 * 10 ** 9, [])
+            assert extension._next_timeout(now + 2 * 10 ** 9) == 1
+
+        def extend_deadlines_on_progress():
+            action_mock = mock.Mock()
+            recorder_mock = mock.Mock()
+            extension = watchdog_extension.Watchdog(watch_items=[(action_mock, StaticEstimator(duration=1))],
+                                                    recorder=recorder_mock)
+            now = monotonic_ns()
+            message = Message(now - 2 * 10 ** 9, 10, 1, 2)
+            progress = Message(now - 10 ** 8, None, None, None, progress=3)
+
+            extension._tick(now, [message, progress])
+            action_mock.assert_not_called()
+            assert extension._next_timeout(now) == 0.9
+            assert len(extension._history) == 1
+            assert recorder_mock.write.call_args_list == [mock.call(message)]
+
+            extension._tick(now + 10 ** 9, [])
+            action_mock.assert_called_once_with(to_datetime(now + 10 ** 9), to_datetime(now + 9 * 10 ** 8), message)
+
+        def record_messages():
+            recorder_mock = mock.Mock()
+            extension = watchdog_extension.Watchdog(watch_items=[], recorder=recorder_mock)
+            now = monotonic_ns()
+            messages = [Message(now, 10, 1, 2), Message(now, 11, 1, 3)]
+
+            extension._tick(now, messages)
+            assert recorder_mock.write.call_args_list == [mock.call(message) for message in messages]
+
+        def check_deadlines_in_the_same_tick():
+            action_mock = mock.Mock()
+            extension = watchdog_extension.Watchdog(watch_items=[(action_mock, StaticEstimator(duration=1))])
+            extension._channel = QueueChannel(queue.Queue)
+            now = monotonic_ns()
+            message = Message(now - 2 * 10 ** 9, 10, 1, 2)
+            extension._channel._queue.put_nowait(message)
+
+            extension._tick(now, extension._channel.receive())
+            action_mock.assert_called_once_with(to_datetime(now), to_datetime(message.trigger_ns + 10 ** 9), message)
+
+        def without_messages():
+            action_mock = mock.Mock()
+            extension = watchdog_extension.Watchdog(watch_items=[(action_mock, StaticEstimator(duration=1))])
+            extension._channel = QueueChannel(queue.Queue)
 
+            extension._tick(monotonic_ns(), extension._channel.receive())
+            action_mock.assert_not_called()
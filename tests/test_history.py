@@ -0,0 +1,39 @@
+import pytest
+
+from watchdog.history import HeartbeatRing
+from watchdog.misc import Message
+
+
+def fill(ring, elapsed_times, counts=None):
+    for i, elapsed_time in enumerate(elapsed_times):
+        count = 1 if counts is None else counts[i]
+        ring.append(Message(i * 10 ** 9, elapsed_time, i / 10.0, i * 100, count=count))
+
+
+class TestHeartbeatRing():
+    def test_append(monkeypatch):
+        ring = HeartbeatRing(size=4)
+        assert len(ring) == 0
+        fill(ring, [10.0, 12.0, 18.0], counts=[1, 1, 3])
+        assert len(ring) == 3
+        assert ring.get('iteration') == 200
+        assert ring.get('trigger_ns', 2) == 0
+        assert ring.get('interval') == 2.0
+        assert ring.get('interval', 1) == 2.0
+        assert ring.get('interval', 2) != ring.get('interval', 2)
+
+    def test_wrap_around(monkeypatch):
+        ring = HeartbeatRing(size=4)
+        fill(ring, [1.0, 2.0, 4.0, 7.0, 11.0, 16.0])
+        assert len(ring) == 4
+        assert ring.get('elapsed_time', 3) == 4.0
+        assert list(ring.window('elapsed_time', 4)) == [4.0, 7.0, 11.0, 16.0]
+        assert list(ring.window('interval', 3)) == [3.0, 4.0, 5.0]
+        assert list(ring.window('interval', 10)) == [2.0, 3.0, 4.0, 5.0]
+        assert list(ring.window('interval', 0)) == []
+
+    def test_get_outside(monkeypatch):
+        ring = HeartbeatRing(size=4)
+        fill(ring, [1.0, 2.0])
+        with pytest.raises(IndexError):
+            ring.get('interval', 2)
@@ -0,0 +1,78 @@
+import pytest
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+import tempfile
+
+import chainer
+import chainer.links as L
+import numpy as np
+from chainer import training
+
+from watchdog import instrumentation
+
+
+class TestHistogram():
+    def test_add(monkeypatch):
+        histogram = instrumentation.Histogram(size=8)
+        histogram.add(0)
+        histogram.add(3)
+        histogram.add(1000)
+        assert histogram.buckets == [1, 0, 1, 0, 0, 0, 0, 1]
+        assert histogram.count == 3
+        assert histogram.total == 1003
+
+    def test_quantile(monkeypatch):
+        histogram = instrumentation.Histogram()
+        for duration in [1000] * 9 + [10 ** 9]:
+            histogram.add(duration)
+        assert histogram.quantile(0.5) == 1024 / 1e9
+        assert histogram.quantile(1.0) == 2 ** 30 / 1e9
+        assert instrumentation.Histogram().quantile(0.5) == 0.0
+
+
+def make_trainer(iterations):
+    model = L.Classifier(L.Linear(3, 2))
+    optimizer = chainer.optimizers.SGD()
+    optimizer.setup(model)
+    dataset = chainer.datasets.TupleDataset(np.random.rand(20, 3).astype(np.float32),
+                                            np.random.randint(0, 2, size=20).astype(np.int32))
+    iterator = chainer.iterators.SerialIterator(dataset, 4)
+    updater = training.updaters.StandardUpdater(iterator, optimizer)
+    return training.Trainer(updater, (iterations, 'iteration'), out=tempfile.mkdtemp())
+
+
+class TestPhaseTimer():
+    def test_summary(monkeypatch):
+        timer = instrumentation.PhaseTimer()
+        timer.record('data', 1000)
+        timer.record('data', 3000)
+        assert timer.summary() == {'data': 2e-6}
+        assert timer.summary() == {}
+        assert timer.histograms['data'].count == 2
+
+    def test_timed(monkeypatch):
+        timer = instrumentation.PhaseTimer()
+        function = timer.timed('phase', lambda x: x * 2)
+        assert function(2) == 4
+        assert timer.histograms['phase'].count == 1
+
+    def test_instrument(monkeypatch):
+        trainer = make_trainer(5)
+        calls = []
+        excluded_calls = []
+        excluded = lambda trainer: excluded_calls.append(trainer.updater.iteration)
+        trainer.extend(lambda trainer: calls.append(trainer.updater.iteration), name='observe')
+        trainer.extend(excluded, name='excluded')
+        timer = instrumentation.PhaseTimer()
+        timer.instrument(trainer, exclude=(excluded,))
+
+        trainer.run()
+        assert calls == [1, 2, 3, 4, 5]
+        assert excluded_calls == [1, 2, 3, 4, 5]
+        assert trainer._extensions['excluded'].extension is excluded
+        assert sorted(timer.histograms) == ['data', 'extension:observe', 'forward_backward', 'update', 'updater']
+        assert all(histogram.count == 5 for histogram in timer.histograms.values())
+        phases = timer.summary()
+        assert phases['updater'] >= phases['data'] + phases['forward_backward'] + phases['update']
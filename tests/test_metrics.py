@@ -0,0 +1,100 @@
+import pytest
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+import threading
+import time
+
+from six.moves import queue
+from six.moves.urllib.error import HTTPError
+from six.moves.urllib.request import urlopen
+
+from watchdog import metrics
+from watchdog.channels import QueueChannel, RingChannel
+from watchdog.estimators import StaticEstimator
+from watchdog.misc import Message, WatchItem, monotonic_ns, to_epoch_ns
+
+
+def scrape(exporter, path='/metrics'):
+    return urlopen('http://127.0.0.1:{}{}'.format(exporter.port, path), timeout=5).read().decode('utf-8')
+
+
+def parse(text):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+@pytest.fixture
+def exporter():
+    exporter = metrics.MetricsExporter(port=0, host='127.0.0.1')
+    yield exporter
+    exporter.stop()
+
+
+class TestMetricsExporter():
+    def test_scrape_before_heartbeats(monkeypatch, exporter):
+        exporter.start([WatchItem(mock.Mock(), StaticEstimator(duration=5))])
+        text = scrape(exporter)
+        assert '# TYPE watchdog_last_heartbeat_age_seconds gauge' in text
+        samples = parse(text)
+        assert samples['watchdog_last_heartbeat_age_seconds'] != samples['watchdog_last_heartbeat_age_seconds']
+        assert samples['watchdog_heartbeats_total'] == 0
+        assert samples['watchdog_action_fires_total{item="0",action="Mock"}'] == 0
+
+    def test_scrape(monkeypatch, exporter):
+        channel = QueueChannel(queue.Queue)
+        executor = mock.Mock()
+        executor.metrics = {'dispatched': 3, 'completed': 2, 'failed': 0, 'timed_out': 1, 'dropped': 0,
+                            'retried': 0, 'latency_mean': 0.5, 'latency_max': 1.0}
+        watch_item = WatchItem(mock.Mock(), StaticEstimator(duration=5))
+        exporter.start([watch_item], channel=channel, executor=executor)
+
+        now = monotonic_ns()
+        messages = [Message(now - 2 * 10 ** 9, 10, 1, 100), Message(now - 1 * 10 ** 9, 12, 1, 300)]
+        for message in messages:
+            watch_item(now, message)
+        exporter.update(now, messages)
+        channel.send(monotonic_ns(), 13, 1, 400)
+
+        samples = parse(scrape(exporter))
+        assert 0.5 < samples['watchdog_last_heartbeat_age_seconds'] < 60
+        assert samples['watchdog_heartbeats_total'] == 2
+        assert samples['watchdog_iterations_per_second'] == 100
+        assert samples['watchdog_estimated_trigger_timestamp_seconds{item="0",action="Mock"}'] == \
+            to_epoch_ns(now + 4 * 10 ** 9) / 1e9
+        assert samples['watchdog_estimated_interval_seconds{item="0",action="Mock"}'] == 5
+        assert samples['watchdog_queue_depth'] == 1
+        assert samples['watchdog_executor_actions_total{result="timed_out"}'] == 1
+        assert samples['watchdog_executor_dispatch_latency_seconds{stat="max"}'] == 1.0
+
+        watch_item(now + 10 * 10 ** 9, None)
+        exporter.update(now + 10 * 10 ** 9, [])
+        samples = parse(scrape(exporter))
+        assert samples['watchdog_action_fires_total{item="0",action="Mock"}'] == 1
+
+    def test_scrape_drops(monkeypatch, exporter):
+        channel = RingChannel(event_class=threading.Event, size=2)
+        exporter.start([], channel=channel)
+        for i in range(5):
+            channel.send(monotonic_ns(), 10 + i, 1, i)
+        channel.receive()
+
+        samples = parse(scrape(exporter))
+        assert samples['watchdog_queue_depth'] == 0
+        assert samples['watchdog_channel_dropped_total{reason="overrun"}'] == 3
+        assert samples['watchdog_channel_dropped_total{reason="coalesced"}'] == 0
+
+    def test_not_found(monkeypatch, exporter):
+        exporter.start([])
+        with pytest.raises(HTTPError):
+            scrape(exporter, '/')
+
+
+class TestEscape():
+    def test_escape(monkeypatch):
+        assert metrics._escape('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
@@ -9,10 +9,54 @@ from dateutil import tz
 from watchdog import misc
 
 
+def test_to_datetime():
+    now = datetime.now(tz.tzutc())
+    assert misc.to_datetime(misc.to_monotonic_ns(now)) == now
+    assert misc.to_datetime(misc.to_monotonic_ns(now) + 10 ** 9) == now + timedelta(seconds=1)
+    assert abs(misc.to_datetime(misc.monotonic_ns()) - now) < timedelta(seconds=1)
+
+
+def test_from_timestamp():
+    now = datetime.now(tz.tzutc())
+    assert misc.to_datetime(misc.from_timestamp(misc.to_timestamp(now))) == now
+    assert misc.to_epoch_ns(misc.from_timestamp(1.5)) == 1500000000
+
+
+def test_to_monotonic_ns():
+    assert misc.to_monotonic_ns(None) is None
+    assert misc.to_monotonic_ns(123) == 123
+
+
+class TestMessage():
+    def test_trigger_time(monkeypatch):
+        now = datetime.now(tz.tzutc())
+        message = misc.Message(misc.to_monotonic_ns(now), 10, 1, 2)
+        assert message.trigger_time == now
+
+        message.trigger_time = now + timedelta(seconds=1)
+        assert message.trigger_ns == misc.to_monotonic_ns(now) + 10 ** 9
+
+    def test_slots(monkeypatch):
+        message = misc.Message(0, 10, 1, 2)
+        assert not hasattr(message, '__dict__')
+        with pytest.raises(AttributeError):
+            message.hoge = 1
+
+    def test_progress(monkeypatch):
+        assert misc.Message(0, 10, 1, 2).progress is None
+        assert misc.Message(0, None, None, None, progress=3).progress == 3
+
+    def test_with_datetime(monkeypatch):
+        now = datetime.now(tz.tzutc())
+        message = misc.Message(now, 10, 1, 2)
+        assert message.trigger_ns == misc.to_monotonic_ns(now)
+        assert message.trigger_time == now
+
+
 class TestItem():
     def test___call__(monkeypatch):
-        now = datetime.now(tz.tzutc())
-        estimated = now + timedelta(seconds=2)
+        now = misc.monotonic_ns()
+        estimated = now + 2 * 10 ** 9
         action_mock = mock.Mock()
         estimator_mock = lambda *args: estimated
         watch_item = misc.WatchItem(action_mock, estimator_mock)
@@ -23,17 +67,119 @@ class TestItem():
         action_mock.assert_not_called()
 
         action_mock.reset_mock()
-        watch_item(now + timedelta(seconds=1), None)
+        watch_item(now + 1 * 10 ** 9, None)
         action_mock.assert_not_called()
 
         action_mock.reset_mock()
-        watch_item(now + timedelta(seconds=2), None)
+        watch_item(now + 2 * 10 ** 9, None)
         action_mock.assert_not_called()
 
         action_mock.reset_mock()
-        watch_item(now + timedelta(seconds=3), None)
-        action_mock.assert_called_once_with(now + timedelta(seconds=3), estimated, message)
+        watch_item(now + 3 * 10 ** 9, None)
+        action_mock.assert_called_once_with(misc.to_datetime(now + 3 * 10 ** 9), misc.to_datetime(estimated), message)
 
         action_mock.reset_mock()
-        watch_item(now + timedelta(seconds=4), None)
+        watch_item(now + 4 * 10 ** 9, None)
+        action_mock.assert_not_called()
+
+    def test_attach(monkeypatch):
+        estimator_mock = mock.Mock()
+        misc.WatchItem(None, estimator_mock).attach('history')
+        estimator_mock.attach.assert_called_once_with('history')
+        misc.WatchItem(None, lambda message: None).attach('history')
+        assert not hasattr(misc.WatchItem(None, None), '__dict__')
+
+    def test_close(monkeypatch):
+        action_mock = mock.Mock()
+        misc.WatchItem(action_mock, None).close()
+        action_mock.close.assert_called_once_with()
+        failing_mock = mock.Mock(**{'close.side_effect': RuntimeError})
+        misc.WatchItem(failing_mock, None).close()
+        misc.WatchItem(lambda *args: None, None).close()
+
+    def test___call___with_datetime_estimator(monkeypatch):
+        now = datetime.now(tz.tzutc())
+        action_mock = mock.Mock()
+        watch_item = misc.WatchItem(action_mock, lambda message: message.trigger_time + timedelta(seconds=2))
+        message = misc.Message(now, 10, 1, 2)
+
+        watch_item(message.trigger_ns, message)
+        assert watch_item._estimated_trigger_time == message.trigger_ns + 2 * 10 ** 9
+        watch_item(message.trigger_ns + 3 * 10 ** 9, None)
+        action_mock.assert_called_once_with(now + timedelta(seconds=3), now + timedelta(seconds=2), message)
+
+    def test___call___with_executor(monkeypatch):
+        now = misc.monotonic_ns()
+        estimated = now + 2 * 10 ** 9
+        action_mock = mock.Mock()
+        executor_mock = mock.Mock()
+        watch_item = misc.WatchItem(action_mock, lambda *args: estimated, executor=executor_mock)
+
+        watch_item(now, 'hoge')
+        watch_item(now + 3 * 10 ** 9, None)
+        action_mock.assert_not_called()
+        executor_mock.submit.assert_called_once_with(action_mock, misc.to_datetime(now + 3 * 10 ** 9),
+                                                     misc.to_datetime(estimated), 'hoge')
+
+
+    def test_extend(monkeypatch):
+        now = misc.monotonic_ns()
+        action_mock = mock.Mock()
+        estimator_mock = mock.Mock(return_value=now + 10 * 10 ** 9)
+        watch_item = misc.WatchItem(action_mock, estimator_mock)
+        watch_item.extend(misc.Message(now, None, None, None, progress=1))
+        assert watch_item._estimated_trigger_time is None
+
+        message = misc.Message(now, 10, 1, 2)
+        watch_item(now, message)
+        watch_item.extend(misc.Message(now + 4 * 10 ** 9, None, None, None, progress=1))
+        assert watch_item._estimated_trigger_time == now + 14 * 10 ** 9
+        watch_item.extend(misc.Message(now + 8 * 10 ** 9, None, None, None, progress=2))
+        assert watch_item._estimated_trigger_time == now + 18 * 10 ** 9
+        watch_item.extend(misc.Message(now + 1 * 10 ** 9, None, None, None, progress=3))
+        assert watch_item._estimated_trigger_time == now + 18 * 10 ** 9
+        assert estimator_mock.call_count == 1
+
+        watch_item(now + 15 * 10 ** 9, None)
         action_mock.assert_not_called()
+        watch_item(now + 19 * 10 ** 9, None)
+        action_mock.assert_called_once_with(misc.to_datetime(now + 19 * 10 ** 9), misc.to_datetime(now + 18 * 10 ** 9),
+                                            message)
+
+
+class TestDeadlineHeap():
+    def test_peek(monkeypatch):
+        now = misc.monotonic_ns()
+        heap = misc.DeadlineHeap()
+        assert heap.peek() is None
+
+        early = misc.WatchItem(None, lambda message: now + 1 * 10 ** 9)
+        late = misc.WatchItem(None, lambda message: now + 2 * 10 ** 9)
+        late(now, 'message')
+        early(now, 'message')
+        heap.push(late)
+        heap.push(early)
+        assert heap.peek() == now + 1 * 10 ** 9
+
+        early._estimated_trigger_time = None
+        assert heap.peek() == now + 2 * 10 ** 9
+        assert len(heap) == 1
+
+    def test_pop_due(monkeypatch):
+        now = misc.monotonic_ns()
+        heap = misc.DeadlineHeap()
+        early = misc.WatchItem(None, lambda message: now + 1 * 10 ** 9)
+        late = misc.WatchItem(None, lambda message: now + 2 * 10 ** 9)
+        stale = misc.WatchItem(None, lambda message: now)
+        for item in (early, late, stale):
+            item(now, 'message')
+            heap.push(item)
+        stale._estimated_trigger_time = None
+        assert heap.pop_due(now + 1 * 10 ** 9) == []
+        assert heap.pop_due(now + 15 * 10 ** 8) == [early]
+        assert heap.peek() == now + 2 * 10 ** 9
+
+    def test_push_without_deadline(monkeypatch):
+        heap = misc.DeadlineHeap()
+        heap.push(misc.WatchItem(None, None))
+        assert len(heap) == 0
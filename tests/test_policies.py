@@ -0,0 +1,133 @@
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+from watchdog import policies
+from watchdog.estimators import StaticEstimator
+from watchdog.misc import Message, WatchItem, monotonic_ns, to_datetime
+
+
+def make_message(trigger_ns, iteration=100):
+    return Message(trigger_ns, 1.0, 0.1, iteration)
+
+
+class TestStage():
+    def test_defaults(monkeypatch):
+        stage = policies.Stage('action')
+        assert (stage.action, stage.scale, stage.delay, stage.cooldown) == ('action', 1.0, 0.0, 0.0)
+
+
+class TestEscalationPolicy():
+    def test_inheritance(monkeypatch):
+        assert isinstance(policies.EscalationPolicy(StaticEstimator(10), []), WatchItem)
+
+    def describe___call__():
+        def escalate_in_order():
+            warn, notify, abort = mock.Mock(), mock.Mock(), mock.Mock()
+            policy = policies.EscalationPolicy(StaticEstimator(10), [
+                (warn, 2.0), (notify, 3.0), policies.Stage(abort, scale=3.0, delay=60),
+            ])
+            start = monotonic_ns()
+            message = make_message(start)
+            policy(start, message)
+            assert policy._estimated_trigger_time == start + 20 * 10 ** 9
+
+            policy(start + 19 * 10 ** 9, None)
+            warn.assert_not_called()
+            policy(start + 21 * 10 ** 9, None)
+            warn.assert_called_once_with(to_datetime(start + 21 * 10 ** 9), to_datetime(start + 20 * 10 ** 9), message)
+            assert policy._estimated_trigger_time == start + 30 * 10 ** 9
+
+            policy(start + 31 * 10 ** 9, None)
+            notify.assert_called_once()
+            abort.assert_not_called()
+            policy(start + 91 * 10 ** 9, None)
+            abort.assert_called_once()
+            assert policy._estimated_trigger_time is None
+            assert policy._fire_count == 3
+
+            policy(start + 200 * 10 ** 9, None)
+            assert warn.call_count == notify.call_count == abort.call_count == 1
+
+        def take_overdue_stages_at_once():
+            warn, abort = mock.Mock(), mock.Mock()
+            policy = policies.EscalationPolicy(StaticEstimator(10), [(warn, 1.0), (abort, 2.0)])
+            start = monotonic_ns()
+            policy(start, make_message(start))
+            policy(start + 25 * 10 ** 9, None)
+            warn.assert_called_once()
+            abort.assert_called_once()
+
+        def reset_on_heartbeat():
+            warn, abort = mock.Mock(), mock.Mock()
+            policy = policies.EscalationPolicy(StaticEstimator(10), [(warn, 1.0), (abort, 2.0)])
+            start = monotonic_ns()
+            policy(start, make_message(start))
+            policy(start + 11 * 10 ** 9, None)
+            policy(start + 15 * 10 ** 9, make_message(start + 15 * 10 ** 9, 200))
+            assert policy._estimated_trigger_time == start + 25 * 10 ** 9
+            policy(start + 26 * 10 ** 9, None)
+            assert warn.call_count == 2
+            abort.assert_not_called()
+
+        def reset_on_progress():
+            warn, abort = mock.Mock(), mock.Mock()
+            policy = policies.EscalationPolicy(StaticEstimator(10), [(warn, 1.0), (abort, 2.0)])
+            start = monotonic_ns()
+            message = make_message(start)
+            policy.extend(Message(start, None, None, None, progress=1))
+            assert policy._estimated_trigger_time is None
+
+            policy(start, message)
+            policy(start + 11 * 10 ** 9, None)
+            policy.extend(Message(start + 15 * 10 ** 9, None, None, None, progress=1))
+            assert policy._estimated_trigger_time == start + 25 * 10 ** 9
+            policy.extend(Message(start + 12 * 10 ** 9, None, None, None, progress=2))
+            assert policy._estimated_trigger_time == start + 25 * 10 ** 9
+            policy(start + 26 * 10 ** 9, None)
+            assert warn.call_count == 2
+            assert warn.call_args[0][2] is message
+            abort.assert_not_called()
+
+            policy(start + 30 * 10 ** 9, make_message(start + 30 * 10 ** 9, 200))
+            assert policy._estimated_trigger_time == start + 40 * 10 ** 9
+
+        def deduplicate_shared_action():
+            notify = mock.Mock()
+            policy = policies.EscalationPolicy(StaticEstimator(10), [(notify, 1.0), (notify, 2.0)])
+            start = monotonic_ns()
+            policy(start, make_message(start))
+            policy(start + 30 * 10 ** 9, None)
+            notify.assert_called_once()
+
+        def cool_down():
+            warn = mock.Mock()
+            policy = policies.EscalationPolicy(StaticEstimator(10), [policies.Stage(warn, cooldown=60)])
+            start = monotonic_ns()
+            for seconds in (0, 20, 40, 80):
+                trigger_time = start + seconds * 10 ** 9
+                policy(trigger_time, make_message(trigger_time))
+                policy(trigger_time + 11 * 10 ** 9, None)
+            assert [call[0][0] for call in warn.call_args_list] == [
+                to_datetime(start + 11 * 10 ** 9), to_datetime(start + 91 * 10 ** 9)]
+
+        def wait_for_estimation():
+            warn = mock.Mock()
+            policy = policies.EscalationPolicy(mock.Mock(return_value=None), [(warn, 1.0)])
+            start = monotonic_ns()
+            policy(start, make_message(start))
+            policy(start + 100 * 10 ** 9, None)
+            warn.assert_not_called()
+            assert policy._estimated_trigger_time is None
+
+        def run_actions_with_executor():
+            warn = mock.Mock()
+            executor = mock.Mock()
+            policy = policies.EscalationPolicy(StaticEstimator(10), [(warn, 1.0)], executor=executor)
+            start = monotonic_ns()
+            message = make_message(start)
+            policy(start, message)
+            policy(start + 11 * 10 ** 9, None)
+            warn.assert_not_called()
+            executor.submit.assert_called_once_with(warn, to_datetime(start + 11 * 10 ** 9),
+                                                    to_datetime(start + 10 * 10 ** 9), message)
@@ -0,0 +1,68 @@
+import pytest
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+import tempfile
+import threading
+
+import chainer
+import chainer.links as L
+import numpy as np
+from chainer import training
+from chainer.training import extensions
+
+from watchdog.progress import ProgressProbe
+
+
+def make_trainer(iterations):
+    model = L.Classifier(L.Linear(3, 2))
+    optimizer = chainer.optimizers.SGD()
+    optimizer.setup(model)
+    dataset = chainer.datasets.TupleDataset(np.random.rand(20, 3).astype(np.float32),
+                                            np.random.randint(0, 2, size=20).astype(np.int32))
+    updater = training.updaters.StandardUpdater(chainer.iterators.SerialIterator(dataset, 4), optimizer)
+    trainer = training.Trainer(updater, (iterations, 'iteration'), out=tempfile.mkdtemp())
+    trainer.extend(extensions.Evaluator(chainer.iterators.SerialIterator(dataset, 5, repeat=False, shuffle=False),
+                                        model), trigger=(iterations, 'iteration'))
+    return trainer
+
+
+class TestProgressProbe():
+    def test_counted(monkeypatch):
+        probe = ProgressProbe()
+        function = probe.counted('data', lambda x: x * 2)
+        assert function(3) == 6
+        with pytest.raises(TypeError):
+            function()
+        assert probe.counts['data'] == 2
+        assert probe.progress == 2
+
+    def test_instrument(monkeypatch):
+        trainer = make_trainer(3)
+        probe = ProgressProbe()
+        probe.instrument(trainer)
+        trainer.run()
+        assert probe.counts == {'data': 3, 'backward': 3, 'update': 3, 'evaluation': 4}
+
+    def describe_start():
+        def send_changed_progress():
+            probe = ProgressProbe(interval=0.01)
+            sent = threading.Event()
+            send = mock.Mock(side_effect=lambda *args: sent.set())
+            probe.start(send)
+            try:
+                probe.counts['data'] += 1
+                assert sent.wait(5)
+            finally:
+                probe.stop()
+            send.assert_called_once_with(mock.ANY, 1)
+
+        def stop_without_progress():
+            probe = ProgressProbe(interval=0.01)
+            send = mock.Mock()
+            probe.start(send)
+            probe._stop_event.wait(0.1)
+            probe.stop()
+            send.assert_not_called()
+            assert probe._thread is None
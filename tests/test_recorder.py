@@ -0,0 +1,85 @@
+import pytest
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+from datetime import timedelta
+import os
+
+import numpy as np
+from dateutil.parser import parse
+
+from watchdog import recorder
+from watchdog.misc import Message
+
+
+def make_messages(count):
+    trigger_time = parse('2017/10/05T11:11:11.123456Z')
+    return [Message(trigger_time + timedelta(seconds=i), 10.0 + i, i / 10.0, i * 100) for i in range(count)]
+
+
+class TestTraceRecorder():
+    def test_write(monkeypatch, tmpdir):
+        path = str(tmpdir.join('heartbeats.bin'))
+        trace_recorder = recorder.TraceRecorder(path)
+        for message in make_messages(3):
+            trace_recorder.write(message)
+        trace_recorder.close()
+
+        records = recorder.load(path)
+        assert isinstance(records, np.memmap)
+        assert os.path.getsize(path) == 3 * recorder.dtype.itemsize
+        assert records['timestamp'][0] == 1507201871123456000
+        assert records['timestamp'][2] - records['timestamp'][0] == 2 * 10 ** 9
+        assert records['elapsed_time'].tolist() == [10.0, 11.0, 12.0]
+        assert records['epoch_detail'].tolist() == [0.0, 0.1, 0.2]
+        assert records['iteration'].tolist() == [0, 100, 200]
+
+    def test_append(monkeypatch, tmpdir):
+        path = str(tmpdir.join('heartbeats.bin'))
+        for message in make_messages(2):
+            trace_recorder = recorder.TraceRecorder(path)
+            trace_recorder.write(message)
+            trace_recorder.close()
+        assert len(recorder.load(path)) == 2
+
+    def test_buffer(monkeypatch, tmpdir):
+        path = str(tmpdir.join('heartbeats.bin'))
+        trace_recorder = recorder.TraceRecorder(path, fsync_interval=3600)
+        trace_recorder.write(make_messages(1)[0])
+        assert os.path.getsize(path) == 0
+        trace_recorder.flush()
+        assert os.path.getsize(path) == recorder.dtype.itemsize
+        trace_recorder.close()
+
+    @mock.patch('os.fsync')
+    def test_fsync(monkeypatch, fsync_mock, tmpdir):
+        trace_recorder = recorder.TraceRecorder(str(tmpdir.join('heartbeats.bin')), fsync_interval=0)
+        for message in make_messages(3):
+            trace_recorder.write(message)
+        assert fsync_mock.call_count == 3
+        trace_recorder.close()
+
+    def test_rotate(monkeypatch, tmpdir):
+        path = str(tmpdir.join('heartbeats.bin'))
+        trace_recorder = recorder.TraceRecorder(path, max_bytes=2 * recorder.dtype.itemsize, backup_count=2)
+        for message in make_messages(7):
+            trace_recorder.write(message)
+        trace_recorder.close()
+
+        assert recorder.load(path)['iteration'].tolist() == [600]
+        assert recorder.load(path + '.1')['iteration'].tolist() == [400, 500]
+        assert recorder.load(path + '.2')['iteration'].tolist() == [200, 300]
+        assert not os.path.exists(path + '.3')
+
+    def test_close_without_write(monkeypatch, tmpdir):
+        path = str(tmpdir.join('heartbeats.bin'))
+        recorder.TraceRecorder(path).close()
+        assert not os.path.exists(path)
+
+
+class TestLoad():
+    def test_empty(monkeypatch, tmpdir):
+        path = tmpdir.join('heartbeats.bin')
+        path.write('')
+        assert len(recorder.load(str(path))) == 0
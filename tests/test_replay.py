@@ -0,0 +1,118 @@
+import pytest
+import json
+import os
+import time
+
+import numpy as np
+from dateutil.parser import parse
+
+from watchdog import estimators, recorder, replay
+from watchdog.misc import Message
+
+
+def stream(estimator, times):
+    trigger_ns = 10 ** 18
+    durations = []
+    for i, elapsed_time in enumerate(times):
+        estimated = estimator(Message(trigger_ns + int(elapsed_time * 10 ** 9), elapsed_time, 0, i))
+        if estimated is not None:
+            durations.append((estimated - trigger_ns) / 1e9 - elapsed_time)
+    return np.array(durations)
+
+
+def make_times(size=500, seed=0):
+    random = np.random.RandomState(seed)
+    intervals = random.gamma(4.0, 0.25, size=size)
+    intervals[size // 2] = 30.0
+    return np.concatenate([[0.0], np.cumsum(intervals)])
+
+
+class TestLoadTrace():
+    def test_csv(monkeypatch, tmpdir):
+        path = tmpdir.join('trace.csv')
+        path.write('elapsed_time,iteration\n1.0,100\n2.5,200\n')
+        assert replay.load_trace(str(path)).tolist() == [1.0, 2.5]
+
+    def test_npz(monkeypatch, tmpdir):
+        path = str(tmpdir.join('trace.npz'))
+        np.savez(path, elapsed_time=np.array([1.0, 2.5]))
+        assert replay.load_trace(path).tolist() == [1.0, 2.5]
+
+    def test_log_report(monkeypatch, tmpdir):
+        path = tmpdir.join('log')
+        path.write(json.dumps([{'elapsed_time': 1.0, 'iteration': 100}, {'elapsed_time': 2.5, 'iteration': 200}]))
+        assert replay.load_trace(str(path)).tolist() == [1.0, 2.5]
+
+    def test_recorder(monkeypatch, tmpdir):
+        path = str(tmpdir.join('heartbeats.bin'))
+        trace_recorder = recorder.TraceRecorder(path)
+        for elapsed_time in [1.0, 2.5]:
+            trace_recorder.write(Message(parse('2017/10/05T11:11:11Z'), elapsed_time, 0, 0))
+        trace_recorder.close()
+        assert replay.load_trace(path).tolist() == [1.0, 2.5]
+
+    def test_unknown_format(monkeypatch):
+        with pytest.raises(ValueError):
+            replay.load_trace('trace.txt')
+
+
+class TestEstimate():
+    @pytest.mark.parametrize('name, params, estimator', [
+        ('simple', {'factor': 2.0}, estimators.SimpleEstimator(factor=2.0)),
+        ('static', {'duration': 5.0}, estimators.StaticEstimator(duration=5.0)),
+        ('ewma', {'alpha': 0.2, 'factor': 1.5}, estimators.EWMAEstimator(alpha=0.2, factor=1.5)),
+        ('quantile', {'quantile': 0.9, 'window': 20}, estimators.QuantileEstimator(quantile=0.9, window=20)),
+        ('median', {'window': 21, 'deviations': 2.0}, estimators.MedianEstimator(window=21, deviations=2.0)),
+    ])
+    def test_match_streaming_estimators(monkeypatch, name, params, estimator):
+        times = make_times()
+        expected = stream(estimator, times)
+        if name == 'static':
+            expected = expected[1:]
+        np.testing.assert_allclose(replay.estimate(times, name, **params), expected, rtol=1e-6, atol=1e-6)
+
+    def test_scale(monkeypatch):
+        times = make_times(size=200000)
+        start = time.time()
+        for name in replay.default_estimators:
+            replay.estimate(times, name)
+        assert time.time() - start < 10
+
+
+class TestParseEstimator():
+    def test_parse(monkeypatch):
+        assert replay.parse_estimator('ewma:alpha=0.2,factor=2') == ('ewma', {'alpha': 0.2, 'factor': 2.0})
+        assert replay.parse_estimator('simple') == ('simple', {})
+
+    def test_unknown_estimator(monkeypatch):
+        with pytest.raises(ValueError):
+            replay.parse_estimator('hoge')
+
+
+class TestEvaluate():
+    def test_false_positives(monkeypatch):
+        times = np.array([0.0, 1.0, 2.0, 3.0, 10.0, 11.0])
+        result = replay.evaluate(times, 'static', duration=2.0)
+        assert result['false_positives'] == 1
+        assert result['false_positive_rate'] == 0.25
+        assert result['time_to_abort'] == 5.0
+        assert result['detection_latency'] is None
+
+    def test_hung(monkeypatch):
+        times = np.array([0.0, 1.0, 2.0, 3.0])
+        result = replay.evaluate(times, 'simple', hung=True, factor=2.0)
+        assert result['false_positives'] == 0
+        assert result['time_to_abort'] is None
+        assert result['detection_latency'] == 2.0
+
+
+class TestMain():
+    def test_main(monkeypatch, tmpdir, capsys):
+        path = str(tmpdir.join('trace.npz'))
+        np.savez(path, elapsed_time=make_times())
+        replay.main([path, '--hung', '--json', '-e', 'ewma:alpha=0.2', '-e', 'median'])
+
+        summaries = json.loads(capsys.readouterr().out)
+        assert [summary['estimator'] for summary in summaries] == ['ewma:alpha=0.2', 'median']
+        assert summaries[0]['runs'] == 1
+        assert summaries[0]['median_detection_latency'] is not None
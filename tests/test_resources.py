@@ -0,0 +1,134 @@
+import os
+import time
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+from watchdog import resources
+from watchdog.estimators import StaticEstimator
+from watchdog.misc import Message, WatchItem, monotonic_ns, to_datetime
+
+
+def make_item(samples, **kwargs):
+    item = resources.ResourceWatchItem(StaticEstimator(10), **kwargs)
+    item._probe = mock.Mock()
+    item._probe.sample.side_effect = samples
+    return item
+
+
+def sample(t, cpu_time=0.0, rss=100, io_bytes=0, state='S'):
+    return resources.ResourceSample(t, state, cpu_time, rss, io_bytes)
+
+
+class TestProcProbe():
+    def test_sample(monkeypatch):
+        probe = resources.ProcProbe()
+        first = probe.sample()
+        deadline = time.time() + 0.2
+        while time.time() < deadline:
+            pass
+        second = probe.sample()
+        probe.close()
+        assert second.cpu_time > first.cpu_time
+        assert second.rss > 0
+        assert second.io_bytes is not None
+        assert second.state in ('R', 'S')
+
+    def test_parse_command_name(monkeypatch):
+        files = {
+            'stat': b'123 (a) b (c) S 1 123 123 0 -1 4194304 82 0 0 0 250 50 0 0 20 0 1 0 1 1 1\n',
+            'status': b'Name:\ta\nVmRSS:\t    2048 kB\n',
+            'io': b'rchar: 10\nwchar: 5\nread_bytes: 0\n',
+        }
+        probe = resources.ProcProbe(123)
+        probe._fds = dict((name, name) for name in files)
+        with mock.patch.object(resources, '_pread', lambda fd, size: files[fd]):
+            result = probe.sample()
+        assert (result.state, result.rss, result.io_bytes) == ('S', 2048 * 1024, 15)
+        assert result.cpu_time == 300 / resources._clock_ticks
+
+    def test_exited_process(monkeypatch):
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0)
+        probe = resources.ProcProbe(pid)
+        probe.sample()
+        os.waitpid(pid, 0)
+        try:
+            probe.sample()
+            assert False
+        except OSError:
+            pass
+        probe.close()
+
+
+class TestResourceWatchItem():
+    def test_inheritance(monkeypatch):
+        assert isinstance(resources.ResourceWatchItem(StaticEstimator(10)), WatchItem)
+
+    def test_actions(monkeypatch):
+        item = resources.ResourceWatchItem(StaticEstimator(10), deadlock_action='deadlock', oom_action='oom')
+        assert item.actions == ['deadlock', 'oom']
+
+    def describe___call__():
+        def take_deadlock_action_when_idle():
+            deadlock, slow = mock.Mock(), mock.Mock()
+            item = make_item([sample(0.0, cpu_time=5.0), sample(20.0, cpu_time=5.5)],
+                             deadlock_action=deadlock, slow_action=slow)
+            start = monotonic_ns()
+            message = Message(start, 1.0, 0.1, 100)
+            item(start, message)
+            item(start, None)
+            item(start + 20 * 10 ** 9, None)
+            slow.assert_not_called()
+            tick_time, estimated_trigger_time, diagnosed = deadlock.call_args[0]
+            assert estimated_trigger_time == to_datetime(start + 10 * 10 ** 9)
+            assert diagnosed.resources == {'cpu_usage': 0.025, 'io_rate': 0.0, 'rss': 100, 'state': 'S'}
+            assert message.resources is None
+
+        def take_slow_action_when_busy():
+            deadlock, slow = mock.Mock(), mock.Mock()
+            item = make_item([sample(0.0, cpu_time=5.0), sample(20.0, cpu_time=25.0)],
+                             deadlock_action=deadlock, slow_action=slow)
+            start = monotonic_ns()
+            item(start, Message(start, 1.0, 0.1, 100))
+            item(start, None)
+            item(start + 20 * 10 ** 9, None)
+            deadlock.assert_not_called()
+            assert slow.call_args[0][2].resources['cpu_usage'] == 1.0
+
+        def take_slow_action_when_doing_io():
+            deadlock, slow = mock.Mock(), mock.Mock()
+            item = make_item([sample(0.0), sample(20.0, io_bytes=10 ** 6)], deadlock_action=deadlock, slow_action=slow)
+            start = monotonic_ns()
+            item(start, Message(start, 1.0, 0.1, 100))
+            item(start, None)
+            item(start + 20 * 10 ** 9, None)
+            deadlock.assert_not_called()
+            slow.assert_called_once()
+
+        def take_deadlock_action_when_exited():
+            deadlock = mock.Mock()
+            item = make_item([sample(0.0), OSError()], deadlock_action=deadlock)
+            start = monotonic_ns()
+            item(start, Message(start, 1.0, 0.1, 100))
+            item(start, None)
+            item(start + 20 * 10 ** 9, None)
+            assert deadlock.call_args[0][2].resources['cpu_usage'] is None
+
+        def predict_oom():
+            oom = mock.Mock()
+            rss = [100, 200, 300, 400, 500, 500, 500, 500, 500, 500, 500, 600, 700, 800, 900, 1000]
+            item = make_item([sample(float(i), rss=value) for i, value in enumerate(rss)],
+                             oom_action=oom, memory_limit=1400, horizon=10, window=5)
+            start = monotonic_ns()
+            item(start, Message(start, 1.0, 0.1, 100))
+            for i in range(len(rss)):
+                tick_time = start + i * 10 ** 9
+                item(tick_time, Message(tick_time, 1.0, 0.1, 100 + i))
+                item(tick_time, None)
+            assert oom.call_count == 2
+            tick_time, estimated_trigger_time, _ = oom.call_args_list[0][0]
+            assert tick_time == to_datetime(start + 4 * 10 ** 9)
+            assert estimated_trigger_time == to_datetime(start + 13 * 10 ** 9)
@@ -0,0 +1,49 @@
+import os
+import socket
+import stat
+
+from watchdog import sockets
+
+
+class TestFrameReader():
+    def test_feed(monkeypatch):
+        left, right = socket.socketpair()
+        sockets.send_frame(left, ('heartbeat', 1.5))
+        sockets.send_frame(left, ('unregister',))
+        data = right.recv(1024)
+        left.close()
+        right.close()
+
+        reader = sockets.FrameReader()
+        assert reader.feed(data[:3]) == []
+        assert reader.feed(data[3:10]) == []
+        assert reader.feed(data[10:]) == [('heartbeat', 1.5), ('unregister',)]
+        assert reader.feed(b'') == []
+
+
+class TestListen():
+    def test_unix_socket(monkeypatch, tmpdir):
+        path = str(tmpdir.join('watchdog.sock'))
+        open(path, 'w').close()
+        server = sockets.listen(path)
+        client = sockets.connect(path)
+        conn, _ = server.accept()
+        client.sendall(b'ping')
+        assert conn.recv(4) == b'ping'
+        for sock in (conn, client, server):
+            sock.close()
+
+    def test_unix_socket_mode(monkeypatch, tmpdir):
+        path = str(tmpdir.join('watchdog.sock'))
+        server = sockets.listen(path, mode=0o600)
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        server.close()
+
+    def test_tcp_socket(monkeypatch):
+        server = sockets.listen(('127.0.0.1', 0))
+        client = sockets.connect(server.getsockname())
+        conn, _ = server.accept()
+        client.sendall(b'ping')
+        assert conn.recv(4) == b'ping'
+        for sock in (conn, client, server):
+            sock.close()
@@ -0,0 +1,88 @@
+import pytest
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+from chainer import serializers
+
+from watchdog import triggers
+from watchdog.triggers import AdaptiveIntervalTrigger
+
+
+def get_trainer(iteration=0):
+    trainer = lambda: None
+    trainer.updater = lambda: None
+    trainer.updater.iteration = iteration
+    return trainer
+
+
+def run(trigger, iteration_times, start=0):
+    """Call the trigger at every iteration taking `iteration_times` seconds and return the fired iterations."""
+    trainer = get_trainer(start)
+    clock = [0]
+    fired = []
+    with mock.patch.object(triggers, 'monotonic_ns', lambda: clock[0]):
+        trigger(trainer)
+        for iteration_time in iteration_times:
+            clock[0] += int(iteration_time * 10 ** 9)
+            trainer.updater.iteration += 1
+            if trigger(trainer):
+                fired.append(trainer.updater.iteration)
+    return fired
+
+
+class TestAdaptiveIntervalTrigger():
+    def test_invalid_arguments(monkeypatch):
+        with pytest.raises(ValueError):
+            AdaptiveIntervalTrigger(period=0)
+        with pytest.raises(ValueError):
+            AdaptiveIntervalTrigger(min_stride=0)
+        with pytest.raises(ValueError):
+            AdaptiveIntervalTrigger(min_stride=10, max_stride=5)
+
+    def test_first_call(monkeypatch):
+        trigger = AdaptiveIntervalTrigger()
+        assert not trigger(get_trainer())
+        assert trigger.iteration_time is None
+
+    def test_fast_model(monkeypatch):
+        trigger = AdaptiveIntervalTrigger(period=2.0)
+        fired = run(trigger, [0.01] * 1000)
+        assert fired[:8] == [1, 3, 7, 15, 31, 63, 127, 255]
+        assert trigger.stride == 200
+        assert fired[-2:] == [655, 855]
+        assert trigger.iteration_time == pytest.approx(0.01)
+
+    def test_slow_model(monkeypatch):
+        trigger = AdaptiveIntervalTrigger(period=2.0)
+        assert run(trigger, [3.0] * 5) == [1, 2, 3, 4, 5]
+        assert trigger.stride == 1
+
+    def test_slow_down(monkeypatch):
+        trigger = AdaptiveIntervalTrigger(period=2.0, smoothing=1.0)
+        fired = run(trigger, [0.01] * 600 + [0.1] * 600)
+        assert trigger.stride == 20
+        assert fired[-1] - fired[-2] == 20
+
+    def test_max_stride(monkeypatch):
+        trigger = AdaptiveIntervalTrigger(period=2.0, max_stride=50)
+        fired = run(trigger, [0.01] * 500)
+        assert trigger.stride == 50
+        assert fired[-1] - fired[-2] == 50
+
+    def test_zero_iteration_time(monkeypatch):
+        trigger = AdaptiveIntervalTrigger(period=2.0, max_stride=8)
+        run(trigger, [0.0] * 100)
+        assert trigger.stride == 8
+
+    def test_serialize(monkeypatch):
+        trigger = AdaptiveIntervalTrigger(period=2.0)
+        run(trigger, [0.01] * 1000)
+        target = {}
+        trigger.serialize(serializers.DictionarySerializer(target))
+
+        resumed = AdaptiveIntervalTrigger(period=2.0)
+        resumed.serialize(serializers.NpzDeserializer(target))
+        assert resumed.stride == 200
+        assert run(resumed, [0.01] * 400, start=1000) == [1200, 1400]
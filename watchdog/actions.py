@@ -1,14 +1,42 @@
+import errno
 import logging
+import multiprocessing
 import os
 import signal
+import threading
+import time
 
+from .delivery import flush_all
 from .misc import SimpleFormatter
 
 logger = logging.getLogger(__name__)
 
 
 class Action(object):
-    """Base class of watchdog action."""
+    """Base class of watchdog action.
+
+    Attributes:
+        priority (bool) : Whether an `ActionExecutor` runs this action in its priority lane.
+        timeout (float) : Time (seconds) an `ActionExecutor` waits for this action. `None` means the
+            default of the executor.
+    """
+
+    priority = False
+    timeout = None
+
+    def initialize(self, trainer):
+        """Prepare the action in the training process before the watcher starts.
+
+        Args:
+            trainer (Trainer) : Trainer to watch.
+        """
+
+        pass
+
+    def close(self):
+        """Release the resources of the action in the watcher when it stops."""
+
+        pass
 
     def __call__(self, tick_time, estimated_trigger_time, message):
         """Abstract method to execute.
@@ -22,6 +50,20 @@ class Action(object):
         raise NotImplementedError()
 
 
+def _format_phases(phases):
+    if not phases:
+        return None
+    return ', '.join('{}: {:.3f}s'.format(name, phases[name]) for name in sorted(phases, key=phases.get, reverse=True))
+
+
+def _slowest_phase(phases):
+    # `updater` covers the data loading, the forward/backward and the update phases.
+    phases = dict((name, duration) for name, duration in (phases or {}).items() if name != 'updater')
+    if not phases:
+        return None
+    return max(phases, key=phases.get)
+
+
 class MessageAction(Action):
     _default_message_template = "Next trigger didn't come " \
                                 "before the estimated time {estimated_trigger_time} " \
@@ -29,6 +71,13 @@ class MessageAction(Action):
                                 "at (epoch: {last_epoch_detail}, iteration: {last_iteration})."
     """Abstract watchdog action to emits a message to somewhere.
 
+    Templates can refer to `tick_time`, `estimated_trigger_time`, `last_trigger_time`,
+    `last_iteration` and `last_epoch_detail`. With an instrumented `Watchdog`, they can
+    also refer to `last_phases`, the mean duration of each phase, and `slowest_phase`. With a
+    `Coordinator`, they can also refer to `last_rank`, the straggler, and `last_lag`. With
+    `HangDiagnostics`, they can also refer to `diagnostics`, `diagnostics_profile` and `traceback_file`.
+    With `ResourceWatchItem`, they can also refer to `cpu_usage`, `io_rate`, `rss` and `state`.
+
     Args:
         message_template (str) : Teamplte string of a message.
         tzinfo (tzinfo) : Timezone info to format datetime objects.
@@ -46,7 +95,18 @@ class MessageAction(Action):
             'last_trigger_time': message.trigger_time,
             'last_iteration': message.iteration,
             'last_epoch_detail': message.epoch_detail,
+            'last_phases': _format_phases(message.phases),
+            'slowest_phase': _slowest_phase(message.phases),
+            'last_rank': message.rank,
+            'last_lag': message.lag,
         }
+        diagnostics = message.diagnostics or {}
+        kwargs['diagnostics'] = diagnostics.get('summary')
+        kwargs['diagnostics_profile'] = diagnostics.get('profile')
+        kwargs['traceback_file'] = diagnostics.get('traceback_file')
+        resources = message.resources or {}
+        for key in ('cpu_usage', 'io_rate', 'rss', 'state'):
+            kwargs[key] = resources.get(key)
         for k, v in kwargs.items():
             kwargs[k] = self._formatter(k, v)
         return self._message_template.format(**kwargs)
@@ -58,15 +118,101 @@ class Abort(Action):
     Args:
         pid (int) : PID of stopping process. Defaults to `os.getpid()`.
         signal (signals.signal, optional) : Signal to send to the process. Defaults to `signal.SIGTERM`.
+        flush_timeout (float, optional) : Time (seconds) to wait for the messages pending in `SlackDelivery`
+            before sending the signal. Defaults to `5.0`.
     """
 
-    def __init__(self, pid=os.getpid(), signal=signal.SIGTERM):
+    priority = True
+
+    def __init__(self, pid=os.getpid(), signal=signal.SIGTERM, flush_timeout=5.0):
         self._pid = pid
         self._signal = signal
+        self._flush_timeout = flush_timeout
 
     def __call__(self, tick_time, estimated_trigger_time, message):
+        self._flush()
         os.kill(self._pid, self._signal)
 
+    def _flush(self):
+        # Notifications coalesced in a delivery may never be sent once the training process is gone.
+        if not flush_all(self._flush_timeout):
+            logger.error('Some notifications were not sent in %s seconds before aborting.', self._flush_timeout)
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno != errno.ESRCH
+    return True
+
+
+class GracefulAbort(Abort):
+    """Watchdog action to abort a training process after taking an emergency snapshot.
+
+    The action asks a thread started in the training process by `Watchdog` to take
+    a snapshot, and waits for it until `snapshot_timeout`. The thread doesn't wait
+    for the training loop, so a hung iteration doesn't block the snapshot, but the
+    snapshot may catch the model in the middle of an update. Then it sends
+    `SIGTERM`, and `SIGKILL` if the process doesn't exit within `kill_timeout`.
+
+    Without a `Watchdog` in the training process, e.g. with a watchdog daemon, it
+    only sends the signals.
+
+    Args:
+        pid (int) : PID of stopping process. Defaults to `os.getpid()`.
+        snapshot (function, optional) : Function to take a snapshot of a trainer. Defaults to the `snapshot`
+            extension of Chainer writing `snapshot_emergency_iter_{.updater.iteration}`.
+        snapshot_timeout (float, optional) : Time (seconds) to wait for the snapshot. Defaults to `60.0`.
+        kill_timeout (float, optional) : Time (seconds) to wait for the process to exit before sending
+            `SIGKILL`. Defaults to `10.0`.
+        flush_timeout (float, optional) : Time (seconds) to wait for the messages pending in `SlackDelivery`
+            before sending the signal. Defaults to `5.0`.
+    """
+
+    def __init__(self, pid=os.getpid(), snapshot=None, snapshot_timeout=60.0, kill_timeout=10.0, flush_timeout=5.0):
+        super(GracefulAbort, self).__init__(pid=pid, signal=signal.SIGTERM, flush_timeout=flush_timeout)
+        self._snapshot = snapshot
+        self._snapshot_timeout = snapshot_timeout
+        self._kill_timeout = kill_timeout
+        self._requested = None
+        self._done = None
+        self.timeout = snapshot_timeout + kill_timeout + flush_timeout + 1.0
+
+    def initialize(self, trainer):
+        if self._snapshot is None:
+            from chainer.training.extensions import snapshot
+            self._snapshot = snapshot(filename='snapshot_emergency_iter_{.updater.iteration}')
+        self._requested = multiprocessing.Event()
+        self._done = multiprocessing.Event()
+        thread = threading.Thread(target=self._take_snapshot, args=(trainer,))
+        thread.daemon = True
+        thread.start()
+
+    def __call__(self, tick_time, estimated_trigger_time, message):
+        if self._requested is not None:
+            self._requested.set()
+            if not self._done.wait(self._snapshot_timeout):
+                logger.error('The emergency snapshot did not finish in %s seconds.', self._snapshot_timeout)
+        self._flush()
+        os.kill(self._pid, signal.SIGTERM)
+        deadline = time.time() + self._kill_timeout
+        while _is_alive(self._pid):
+            if time.time() > deadline:
+                logger.error('The process %s did not exit in %s seconds after SIGTERM.', self._pid, self._kill_timeout)
+                os.kill(self._pid, signal.SIGKILL)
+                return
+            time.sleep(0.1)
+
+    def _take_snapshot(self, trainer):
+        self._requested.wait()
+        try:
+            self._snapshot(trainer)
+        except Exception:  # noqa: B902
+            logger.exception('Failed to take the emergency snapshot.')
+        finally:
+            self._done.set()
+
 
 class WarningMessage(MessageAction):
     """Watchdog action to log a message.
@@ -92,25 +238,39 @@ class SlackWebhookNotification(MessageAction):
     Args:
         url (str) : URL string of an incoming webhook.
         channel (str) : Channel name with `#` prefix or user name with `@` prefix.
+        delivery (SlackDelivery, optional) : Shared delivery layer to post messages with. `slackweb` package
+            is used if it is `None`.
     """
 
-    def __init__(self, url, channel, **kwargs):
+    def __init__(self, url, channel, delivery=None, **kwargs):
         super(SlackWebhookNotification, self).__init__(**kwargs)
 
+        self._url = url
+        self._channel = channel
+        self._delivery = delivery
+        if delivery is not None:
+            return
         try:
             from slackweb import Slack
         except ImportError as e:
             logger.error('You must insatll `slackweb` package to take this action.')
             raise e
         self._slack = Slack(url=url)
-        self._channel = channel
 
     def __call__(self, tick_time, estimated_trigger_time, message):
+        if self._delivery is not None:
+            self._delivery.post(self._url, self._channel,
+                                self._get_message(tick_time, estimated_trigger_time, message))
+            return
         self._slack.notify(
             channel=self._channel,
             text=self._get_message(tick_time, estimated_trigger_time, message)
         )
 
+    def close(self):
+        if self._delivery is not None:
+            self._delivery.close()
+
 
 class SlackNotification(MessageAction):
     """Watchdog action to notify to a Slack channel with an access token.
@@ -122,22 +282,40 @@ class SlackNotification(MessageAction):
     Args:
         token (str) : Slack access token.
         channel (str) : Channel name with `#` prefix or user name with `@` prefix.
+        delivery (SlackDelivery, optional) : Shared delivery layer to post messages with. `slackclient` package
+            is used if it is `None`.
+        api_url (str, optional) : URL of `chat.postMessage` API used with `delivery`.
     """
 
-    def __init__(self, token, channel, **kwargs):
+    _default_api_url = 'https://slack.com/api/chat.postMessage'
+
+    def __init__(self, token, channel, delivery=None, api_url=_default_api_url, **kwargs):
         super(SlackNotification, self).__init__(**kwargs)
 
+        self._token = token
+        self._channel = channel
+        self._delivery = delivery
+        self._api_url = api_url
+        if delivery is not None:
+            return
         try:
             from slackclient import SlackClient
         except ImportError as e:
             logger.error('You must insatll `slackclient` package to take this action.')
             raise e
         self._slack = SlackClient(token)
-        self._channel = channel
 
     def __call__(self, tick_time, estimated_trigger_time, message):
+        if self._delivery is not None:
+            self._delivery.post(self._api_url, self._channel,
+                                self._get_message(tick_time, estimated_trigger_time, message), token=self._token)
+            return
         self._slack.api_call(
             'chat.postMessage',
             channel=self._channel,
             text=self._get_message(tick_time, estimated_trigger_time, message)
         )
+
+    def close(self):
+        if self._delivery is not None:
+            self._delivery.close()
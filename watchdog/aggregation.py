@@ -0,0 +1,248 @@
+import errno
+import logging
+import select
+import socket
+import struct
+import threading
+import time
+
+from chainer.training import extension, trigger as trigger_module
+
+from .misc import DeadlineHeap, Message, WatchItem, from_timestamp, monotonic_ns
+from .sockets import connect, listen
+
+logger = logging.getLogger(__name__)
+
+_record = struct.Struct('<idddq')
+
+
+class RankReporter(extension.Extension):
+    """Trainer extension which sends heartbeats of a rank to a `Coordinator`.
+
+    Sending never blocks the training loop: a heartbeat is dropped if the
+    coordinator doesn't read fast enough or is unavailable, and `dropped` counts
+    them. The reporter connects again at a heartbeat after the connection is
+    lost, at most every `retry_interval` seconds.
+
+    Args:
+        address (str or tuple) : Unix domain socket path or `(host, port)` of the coordinator.
+        rank (int) : Rank of the training process.
+        trigger (tuple, optional) : Defaults to `(100, 'iteration')`.
+        timeout (float, optional) : Timeout (seconds) to connect. Defaults to `1.0`.
+        retry_interval (float, optional) : Minimum interval (seconds) between two attempts to connect.
+            Defaults to `10.0`.
+    """
+
+    def __init__(self, address, rank, trigger=(100, 'iteration'), timeout=1.0, retry_interval=10.0):
+        self._address = address
+        self._rank = rank
+        self._trigger = trigger_module.get_trigger(trigger)
+        self._timeout = timeout
+        self._retry_interval = retry_interval
+        self._socket = None
+        self._pending = b''
+        self._retry_time = None
+        self.dropped = 0
+
+    def initialize(self, trainer):
+        self._trigger(trainer)
+        self._connect()
+
+    def __call__(self, trainer):
+        if self._trigger(trainer):
+            self.send(time.time(), trainer.elapsed_time, trainer.updater.epoch_detail, trainer.updater.iteration)
+
+    def send(self, timestamp, elapsed_time, epoch_detail, iteration):
+        if self._socket is None and not self._connect():
+            self.dropped += 1
+            return
+        record = _record.pack(self._rank, timestamp, elapsed_time, epoch_detail, iteration)
+        try:
+            # The rest of a record sent in part goes first, so that the stream of records stays aligned.
+            if self._pending:
+                self._pending = self._pending[self._socket.send(self._pending):]
+            if self._pending:
+                self.dropped += 1
+                return
+            self._pending = record[self._socket.send(record):]
+        except socket.error as e:
+            self.dropped += 1
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                logger.error('Lost the connection to the coordinator: %r', e)
+                self._disconnect()
+
+    def finalize(self):
+        self._disconnect()
+
+    def _connect(self):
+        now = monotonic_ns()
+        if self._retry_time is not None and now < self._retry_time:
+            return False
+        try:
+            sock = connect(self._address, timeout=self._timeout)
+        except socket.error as e:
+            logger.error('Failed to connect to the coordinator: %r', e)
+            self._retry_time = now + int(self._retry_interval * 10 ** 9)
+            return False
+        sock.setblocking(False)
+        self._socket = sock
+        self._retry_time = None
+        return True
+
+    def _disconnect(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        self._pending = b''
+
+
+class Coordinator(object):
+    """Coordinator which watches all the ranks of a data-parallel job at once.
+
+    Each rank sends heartbeats with a `RankReporter`. The job makes progress
+    when its slowest rank does, so the watch items are fed with the heartbeats
+    of the straggler, the rank with the fewest iterations, once every rank has
+    reported. Each action therefore fires once for the whole job, and its
+    message tells the straggler as `Message.rank` and how many iterations it is
+    behind the fastest rank as `Message.lag`. A lost connection or an action
+    which raises is logged without stopping the coordinator.
+
+    Args:
+        address (str or tuple) : Unix domain socket path or `(host, port)` to listen on.
+        watch_items (list[tuple(Action, Estimator)]) : Items to watch.
+        size (int) : Number of ranks.
+        interval (float, optional) : Maximum interval (seconds) to check the state. Defaults to `5.0`.
+    """
+
+    def __init__(self, address, watch_items, size, interval=5.0):
+        self._address = address
+        self._size = size
+        self._interval = interval
+        self._watch_items = [item if isinstance(item, WatchItem) else WatchItem(*item) for item in watch_items]
+        self._deadlines = DeadlineHeap()
+        self._messages = {}
+        self._job_message = None
+        self._server = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def address(self):
+        """Address the coordinator listens on."""
+        return self._server.getsockname()
+
+    def start(self):
+        self._server = listen(self._address)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            # Wake up the loop waiting for sockets.
+            try:
+                connect(self.address).close()
+            except socket.error:
+                pass
+            self._thread.join()
+            self._thread = None
+
+    def lags(self):
+        """Return the lag of each rank.
+
+        Returns:
+            dict : Pairs of iterations behind the fastest rank and the trigger time of the last heartbeat
+                keyed by ranks.
+        """
+        messages = dict(self._messages)
+        if not messages:
+            return {}
+        fastest = max(message.iteration for message in messages.values())
+        return dict((rank, (fastest - message.iteration, message.trigger_time)) for rank, message in messages.items())
+
+    def _run(self):
+        clients = {}
+        try:
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([self._server] + list(clients), [], [], self._next_timeout())
+                messages = []
+                for sock in readable:
+                    if sock is self._server:
+                        try:
+                            client, _ = self._server.accept()
+                        except socket.error:
+                            continue
+                        clients[client] = b''
+                    else:
+                        messages.extend(self._read(sock, clients))
+                self._tick(monotonic_ns(), messages)
+        finally:
+            for client in clients:
+                client.close()
+            self._server.close()
+
+    def _read(self, sock, clients):
+        try:
+            data = sock.recv(65536)
+        except socket.error:
+            data = b''
+        if not data:
+            del clients[sock]
+            sock.close()
+            return []
+        data = clients[sock] + data
+        end = len(data) - len(data) % _record.size
+        clients[sock] = data[end:]
+        messages = []
+        for offset in range(0, end, _record.size):
+            rank, timestamp, elapsed_time, epoch_detail, iteration = _record.unpack_from(data, offset)
+            # Ranks on other hosts send POSIX timestamps because their monotonic clocks differ.
+            message = Message(from_timestamp(timestamp), elapsed_time, epoch_detail, iteration)
+            message.rank = rank
+            messages.append(message)
+        return messages
+
+    def _next_timeout(self):
+        deadline = self._deadlines.peek()
+        if deadline is None:
+            return self._interval
+        return max(0.0, min(self._interval, (deadline - monotonic_ns()) / 1e9))
+
+    def _tick(self, tick_time, messages):
+        job_messages = []
+        for message in messages:
+            self._messages[message.rank] = message
+            if len(self._messages) < self._size:
+                continue
+            iteration = min(m.iteration for m in self._messages.values())
+            if self._job_message is not None and iteration <= self._job_message.iteration:
+                continue
+            # The job completes an iteration when its last rank does.
+            last = max((m for m in self._messages.values() if m.iteration == iteration),
+                       key=lambda m: m.trigger_ns)
+            self._job_message = Message(last.trigger_ns, last.elapsed_time, last.epoch_detail, last.iteration)
+            job_messages.append(self._job_message)
+        if self._job_message is not None:
+            # Keep the straggler of the last job message up to date for the actions.
+            straggler = min(self._messages.values(), key=lambda m: (m.iteration, m.trigger_ns))
+            self._job_message.rank = straggler.rank
+            self._job_message.lag = max(m.iteration for m in self._messages.values()) - straggler.iteration
+
+        for message in job_messages:
+            for watch_item in self._watch_items:
+                self._call(watch_item, tick_time, message)
+        for watch_item in self._watch_items:
+            deadline = watch_item._estimated_trigger_time
+            self._call(watch_item, tick_time, None)
+            if watch_item._estimated_trigger_time != deadline:
+                self._deadlines.push(watch_item)
+        if job_messages:
+            for watch_item in self._watch_items:
+                self._deadlines.push(watch_item)
+
+    def _call(self, watch_item, tick_time, message):
+        try:
+            watch_item(tick_time, message)
+        except Exception:  # noqa: B902
+            logger.exception('Failed to update a watch item.')
@@ -0,0 +1,441 @@
+import logging
+import mmap
+import multiprocessing
+import socket
+import struct
+import uuid
+
+from six.moves.queue import Empty
+
+from .misc import Message
+from .sockets import connect, send_frame
+
+logger = logging.getLogger(__name__)
+
+
+class Channel(object):
+    """Base class of heartbeat channels from a training process to its watcher."""
+
+    def send(self, trigger_ns, elapsed_time, epoch_detail, iteration, phases=None):
+        """Abstract method to send a heartbeat.
+
+        Args:
+            trigger_ns (int) : Time (nanoseconds) of the trigger on the monotonic clock.
+            elapsed_time (float) : Elapsed time of the trainer.
+            epoch_detail (float) : Epoch detail of the updater.
+            iteration (int) : Iteration of the updater.
+            phases (dict, optional) : Mean duration (seconds) of each phase since the last heartbeat.
+        """
+
+        raise NotImplementedError()
+
+    def send_progress(self, trigger_ns, progress):
+        """Abstract method to send progress within an iteration.
+
+        Args:
+            trigger_ns (int) : Time (nanoseconds) of the progress on the monotonic clock.
+            progress (int) : Number of steps within iterations made so far.
+        """
+
+        raise NotImplementedError()
+
+    def receive(self, timeout=0):
+        """Abstract method to receive heartbeats and progress messages.
+
+        Args:
+            timeout (float, optional) : Maximum time (seconds) to wait for heartbeats.
+
+        Returns:
+            list[Message] : Messages received in order. Progress messages have `Message.progress`.
+        """
+
+        raise NotImplementedError()
+
+    def close(self):
+        """Abstract method to wake up a watcher waiting for heartbeats."""
+
+        raise NotImplementedError()
+
+    def depth(self):
+        """Return the number of heartbeats waiting for the watcher."""
+
+        raise NotImplementedError()
+
+
+class QueueChannel(Channel):
+    """Channel which sends every heartbeat as a `Message` through a queue.
+
+    Args:
+        queue_class (type) : Queue class shared by a training process and its watcher.
+    """
+
+    def __init__(self, queue_class, event_class=None):
+        self._queue = queue_class()
+
+    def send(self, trigger_ns, elapsed_time, epoch_detail, iteration, phases=None):
+        message = Message(trigger_ns, elapsed_time, epoch_detail, iteration, phases=phases)
+        self._queue.put_nowait(message)
+
+    def send_progress(self, trigger_ns, progress):
+        self._queue.put_nowait(Message(trigger_ns, None, None, None, progress=progress))
+
+    def receive(self, timeout=0):
+        messages = []
+        try:
+            if timeout > 0:
+                messages.append(self._queue.get(timeout=timeout))
+            while True:
+                messages.append(self._queue.get_nowait())
+        except Empty:
+            pass
+        return [message for message in messages if message is not None]
+
+    def close(self):
+        self._queue.put_nowait(None)
+        # Heartbeats the watcher didn't read would block the feeder thread of a process queue,
+        # which the training process joins at exit, on the full pipe forever.
+        if hasattr(self._queue, 'cancel_join_thread'):
+            self._queue.cancel_join_thread()
+
+    def depth(self):
+        try:
+            return self._queue.qsize()
+        except NotImplementedError:
+            # `multiprocessing.Queue.qsize` is not implemented on macOS.
+            return float('nan')
+
+
+class SharedMemoryChannel(Channel):
+    """Channel which keeps only the latest heartbeat in a shared memory slot.
+
+    The slot is an anonymous shared mapping inherited by the watcher. Sending a
+    heartbeat writes four numbers guarded by a sequence lock, so it needs neither
+    pickling nor system calls. The watcher reads the slot when it wakes up for a
+    deadline and gets the latest heartbeat with the number of heartbeats it stands for.
+    Phases of iterations are not sent because they don't fit the fixed layout.
+    Progress within iterations has a slot of its own, since it is written by
+    another thread.
+
+    Args:
+        event_class (type) : Event class shared by a training process and its watcher.
+    """
+
+    _sequence = struct.Struct('<Q')
+    _record = struct.Struct('<qddq')
+
+    def __init__(self, queue_class=None, event_class=None):
+        self._buffer = mmap.mmap(-1, self._sequence.size + self._record.size + _ProgressSlot.size)
+        self._progress = _ProgressSlot(self._buffer, self._sequence.size + self._record.size)
+        self._wakeup = event_class()
+        self._sent = 0
+        self._received = 0
+
+    def send(self, trigger_ns, elapsed_time, epoch_detail, iteration, phases=None):
+        # An odd sequence tells the reader that a write is in progress.
+        sequence = self._sent * 2
+        self._sequence.pack_into(self._buffer, 0, sequence + 1)
+        self._record.pack_into(self._buffer, self._sequence.size, trigger_ns, elapsed_time, epoch_detail, iteration)
+        self._sequence.pack_into(self._buffer, 0, sequence + 2)
+        self._sent += 1
+
+    def send_progress(self, trigger_ns, progress):
+        self._progress.write(trigger_ns, progress)
+
+    def receive(self, timeout=0):
+        if timeout > 0:
+            self._wakeup.wait(timeout)
+        messages = self._progress.read()
+        sequence, record = self._read()
+        count = sequence // 2 - self._received
+        if record is None or count <= 0:
+            return messages
+        self._received = sequence // 2
+        trigger_ns, elapsed_time, epoch_detail, iteration = record
+        messages.append(Message(trigger_ns, elapsed_time, epoch_detail, iteration, count=count))
+        return messages
+
+    def close(self):
+        self._wakeup.set()
+
+    def depth(self):
+        sequence, _ = self._read()
+        return max(0, sequence // 2 - self._received)
+
+    def _read(self, retries=1000):
+        # Give up after some retries in case the writer died in the middle of a write.
+        for _ in range(retries):
+            sequence, = self._sequence.unpack_from(self._buffer, 0)
+            if sequence % 2 == 1:
+                continue
+            record = self._record.unpack_from(self._buffer, self._sequence.size)
+            if self._sequence.unpack_from(self._buffer, 0)[0] == sequence:
+                return sequence, record
+        return 0, None
+
+
+class RingChannel(Channel):
+    """Channel which keeps the latest heartbeats in a bounded ring of shared memory.
+
+    Sending a heartbeat never waits for the watcher, however far behind it is.
+    When the ring is full, the overflow policy decides what to keep:
+
+    * `drop_oldest` overwrites the oldest heartbeat.
+    * `keep_latest` overwrites the newest heartbeat with the new one.
+    * `coalesce` merges the new heartbeat into the newest one, keeping the minimum
+      and maximum intervals as `Message.min_interval` and `Message.max_interval`.
+
+    Messages count the heartbeats dropped before them in `Message.count`, so
+    estimators based on intervals are not biased by drops, and `drops` counts
+    them by policy. Like `SharedMemoryChannel`, the watcher reads heartbeats when
+    it wakes up for a deadline, and progress within iterations has a slot of its own.
+
+    Args:
+        event_class (type, optional) : Event class shared by a training process and its watcher.
+            Defaults to `multiprocessing.Event`.
+        size (int, optional) : Number of heartbeats the ring holds. Defaults to `1024`.
+        overflow (str, optional) : Overflow policy, `drop_oldest`, `keep_latest` or `coalesce`.
+            Defaults to `drop_oldest`.
+    """
+
+    policies = ('drop_oldest', 'keep_latest', 'coalesce')
+
+    # Head written by the sender, tail and overrun heartbeats written by the watcher,
+    # and overwritten and coalesced heartbeats written by the sender.
+    _counter = struct.Struct('<Q')
+    _header_size = _counter.size * 5
+    # Position, trigger time, elapsed time, epoch detail, iteration, count, minimum and maximum intervals
+    # after a sequence.
+    _record = struct.Struct('<qqddqqdd')
+
+    def __init__(self, queue_class=None, event_class=None, size=1024, overflow='drop_oldest'):
+        if overflow not in self.policies:
+            raise ValueError('Unknown overflow policy: {}'.format(overflow))
+        self._size = size
+        self._overflow = overflow
+        self._slot_size = self._counter.size + self._record.size
+        self._buffer = mmap.mmap(-1, self._header_size + self._slot_size * size + _ProgressSlot.size)
+        self._progress = _ProgressSlot(self._buffer, self._header_size + self._slot_size * size)
+        self._wakeup = (event_class or multiprocessing.Event)()
+        # State of the sender.
+        self._head = 0
+        self._last = None
+        self._sequences = [0] * size
+        self._overwritten = 0
+        self._coalesced = 0
+        # State of the watcher.
+        self._tail = 0
+        self._overrun = 0
+        self._last_read = None
+
+    @property
+    def drops(self):
+        """Numbers of heartbeats dropped keyed by `overrun`, `overwritten` and `coalesced`."""
+        return {
+            'overrun': self._load(2),
+            'overwritten': self._load(3),
+            'coalesced': self._load(4),
+        }
+
+    def send(self, trigger_ns, elapsed_time, epoch_detail, iteration, phases=None):
+        nan = float('nan')
+        if self._head - self._load(1) < self._size or self._overflow == 'drop_oldest':
+            self._write((self._head, trigger_ns, elapsed_time, epoch_detail, iteration, 1, nan, nan))
+            self._head += 1
+            self._store(0, self._head)
+            return
+
+        position, _, last_elapsed_time, _, _, count, min_interval, max_interval = self._last
+        if self._overflow == 'keep_latest':
+            self._write((position, trigger_ns, elapsed_time, epoch_detail, iteration, count + 1, nan, nan))
+            self._overwritten += 1
+            self._store(3, self._overwritten)
+        else:
+            interval = elapsed_time - last_elapsed_time
+            # NaN means no interval is merged yet.
+            min_interval = interval if min_interval != min_interval else min(min_interval, interval)
+            max_interval = interval if max_interval != max_interval else max(max_interval, interval)
+            self._write((position, trigger_ns, elapsed_time, epoch_detail, iteration, count + 1, min_interval,
+                         max_interval))
+            self._coalesced += 1
+            self._store(4, self._coalesced)
+
+    def send_progress(self, trigger_ns, progress):
+        self._progress.write(trigger_ns, progress)
+
+    def receive(self, timeout=0):
+        if timeout > 0:
+            self._wakeup.wait(timeout)
+        head = self._load(0)
+        messages = self._progress.read()
+
+        # The sender may have merged a heartbeat into the last one read if it saw an old tail.
+        if self._last_read is not None:
+            record = self._read(self._last_read[0])
+            if record is not None and record[0] == self._last_read[0] and record[5] > self._last_read[5]:
+                messages.append(self._message(record, record[5] - self._last_read[5]))
+                self._last_read = record
+
+        lost = 0
+        if head - self._tail > self._size:
+            lost = head - self._size - self._tail
+            self._tail = head - self._size
+        for position in range(self._tail, head):
+            record = self._read(position)
+            if record is None or record[0] != position:
+                # Overwritten while reading.
+                lost += 1
+                continue
+            messages.append(self._message(record, record[5] + lost))
+            self._overrun += lost
+            self._last_read = record
+            lost = 0
+        self._overrun += lost
+        self._tail = head
+        self._store(1, self._tail)
+        self._store(2, self._overrun)
+        return messages
+
+    def close(self):
+        self._wakeup.set()
+
+    def depth(self):
+        return min(self._size, self._load(0) - self._load(1))
+
+    def _load(self, index):
+        return self._counter.unpack_from(self._buffer, self._counter.size * index)[0]
+
+    def _store(self, index, value):
+        self._counter.pack_into(self._buffer, self._counter.size * index, value)
+
+    def _message(self, record, count):
+        _, trigger_ns, elapsed_time, epoch_detail, iteration, _, min_interval, max_interval = record
+        return Message(trigger_ns, elapsed_time, epoch_detail, iteration, count=count,
+                       min_interval=None if min_interval != min_interval else min_interval,
+                       max_interval=None if max_interval != max_interval else max_interval)
+
+    def _write(self, record):
+        index = record[0] % self._size
+        offset = self._header_size + self._slot_size * index
+        sequence = self._sequences[index]
+        # An odd sequence tells the reader that a write is in progress.
+        self._counter.pack_into(self._buffer, offset, sequence + 1)
+        self._record.pack_into(self._buffer, offset + self._counter.size, *record)
+        self._counter.pack_into(self._buffer, offset, sequence + 2)
+        self._sequences[index] = sequence + 2
+        self._last = record
+
+    def _read(self, position, retries=1000):
+        offset = self._header_size + self._slot_size * (position % self._size)
+        # Give up after some retries in case the writer died in the middle of a write.
+        for _ in range(retries):
+            sequence, = self._counter.unpack_from(self._buffer, offset)
+            if sequence % 2 == 1:
+                continue
+            record = self._record.unpack_from(self._buffer, offset + self._counter.size)
+            if self._counter.unpack_from(self._buffer, offset)[0] == sequence:
+                return record
+        return None
+
+
+class _ProgressSlot(object):
+    """Slot of shared memory keeping the latest progress within iterations.
+
+    Only the thread of a `ProgressProbe` writes the slot, so it doesn't race with
+    the heartbeats written by the training loop.
+    """
+
+    _sequence = struct.Struct('<Q')
+    # Time and number of steps after a sequence.
+    _record = struct.Struct('<qq')
+    size = _sequence.size + _record.size
+
+    def __init__(self, buffer, offset):
+        self._buffer = buffer
+        self._offset = offset
+        self._sent = 0
+        self._received = 0
+
+    def write(self, trigger_ns, progress):
+        # An odd sequence tells the reader that a write is in progress.
+        sequence = self._sent * 2
+        self._sequence.pack_into(self._buffer, self._offset, sequence + 1)
+        self._record.pack_into(self._buffer, self._offset + self._sequence.size, trigger_ns, progress)
+        self._sequence.pack_into(self._buffer, self._offset, sequence + 2)
+        self._sent += 1
+
+    def read(self, retries=1000):
+        """Return a list of the progress message written since the last read, if any."""
+        # Give up after some retries in case the writer died in the middle of a write.
+        for _ in range(retries):
+            sequence, = self._sequence.unpack_from(self._buffer, self._offset)
+            if sequence % 2 == 1:
+                continue
+            trigger_ns, progress = self._record.unpack_from(self._buffer, self._offset + self._sequence.size)
+            if self._sequence.unpack_from(self._buffer, self._offset)[0] == sequence:
+                break
+        else:
+            return []
+        if sequence // 2 <= self._received:
+            return []
+        self._received = sequence // 2
+        return [Message(trigger_ns, None, None, None, progress=progress)]
+
+
+class DaemonChannel(Channel):
+    """Channel which sends heartbeats to a `WatchdogDaemon`.
+
+    The watch items are registered when the channel connects, and again after it
+    reconnects to a restarted daemon. A heartbeat which can't be sent is dropped
+    so that the daemon never blocks the training process. Heartbeats carry times
+    of the monotonic clock, so the daemon must run on the same host.
+
+    Args:
+        address (str) : Unix domain socket path of the daemon.
+        watch_items (list[WatchItem]) : Items to register.
+        timeout (float, optional) : Timeout (seconds) to connect and send. Defaults to `1.0`.
+    """
+
+    def __init__(self, address, watch_items, timeout=1.0):
+        if isinstance(address, tuple):
+            raise ValueError('The daemon only listens on a Unix domain socket')
+        self._address = address
+        self._watch_items = watch_items
+        self._timeout = timeout
+        self._id = uuid.uuid4().hex
+        self._socket = None
+
+    def connect(self):
+        """Connect to the daemon and register the watch items."""
+        sock = connect(self._address, timeout=self._timeout)
+        try:
+            send_frame(sock, ('register', self._id, self._watch_items))
+        except socket.error:
+            sock.close()
+            raise
+        self._socket = sock
+
+    def send(self, trigger_ns, elapsed_time, epoch_detail, iteration, phases=None):
+        try:
+            if self._socket is None:
+                self.connect()
+            send_frame(self._socket, ('heartbeat', trigger_ns, elapsed_time, epoch_detail, iteration, phases))
+        except socket.error as e:
+            logger.error('Dropped a heartbeat because the watchdog daemon is unavailable: %r', e)
+            self._disconnect()
+
+    def close(self):
+        if self._socket is None:
+            return
+        try:
+            send_frame(self._socket, ('unregister',))
+        except socket.error:
+            pass
+        self._disconnect()
+
+    def depth(self):
+        return 0
+
+    def _disconnect(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
@@ -0,0 +1,232 @@
+import argparse
+import logging
+import os
+import socket
+import tempfile
+import threading
+
+try:
+    import selectors
+except ImportError:  # Python 2
+    import selectors2 as selectors
+
+from .executors import ActionExecutor
+from .misc import DeadlineHeap, Message, WatchItem, monotonic_ns
+from .sockets import FrameReader, connect, listen
+
+logger = logging.getLogger(__name__)
+
+default_address = os.path.join(tempfile.gettempdir(), 'chainer-watchdog.sock')
+
+
+class _Job(object):
+    def __init__(self):
+        self.id = None
+        self.watch_items = []
+        self.reader = FrameReader()
+
+
+class WatchdogDaemon(object):
+    """Daemon which watches many training processes of a host.
+
+    Trainers connect with `Watchdog(daemon=address)`, register their watch items
+    and send heartbeats as pickled frames over a Unix domain socket. Unpickling a
+    frame can run any code, so the daemon only listens on a Unix domain socket,
+    which only its owner can connect to.
+
+    The deadlines of all the watch items are kept in one heap, so a tick costs
+    the heartbeats received and the watch items due, however many jobs are
+    watched. The watch items of a trainer which disconnects without unregistering,
+    e.g. because it crashed, keep being watched until their actions fire. An
+    action which raises or a frame which can't be read is logged, and a client
+    sending a malformed frame is dropped, so one job never stops the daemon.
+
+    Args:
+        address (str, optional) : Unix domain socket path to listen on.
+            Defaults to `chainer-watchdog.sock` in the temporary directory.
+        interval (float, optional) : Maximum interval (seconds) to check the state. Defaults to `5.0`.
+        executor (ActionExecutor, optional) : Executor to run the actions asynchronously.
+            Actions run in the daemon loop if it is `None`.
+    """
+
+    def __init__(self, address=default_address, interval=5.0, executor=None):
+        if isinstance(address, tuple):
+            raise ValueError('The daemon only listens on a Unix domain socket')
+        self._address = address
+        self._interval = interval
+        self._executor = executor
+        self._deadlines = DeadlineHeap()
+        self._jobs = {}
+        self._selector = None
+        self._server = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def address(self):
+        """Address the daemon listens on."""
+        return self._server.getsockname()
+
+    @property
+    def jobs(self):
+        """Number of registered jobs."""
+        return len(self._jobs)
+
+    def start(self):
+        """Run the daemon in a background thread."""
+        self._listen()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def serve_forever(self):
+        """Run the daemon in the calling thread until `stop` is called."""
+        self._listen()
+        self._run()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            # Wake up the loop waiting for sockets.
+            try:
+                connect(self.address).close()
+            except socket.error:
+                pass
+            self._thread.join()
+            self._thread = None
+
+    def _listen(self):
+        self._server = listen(self._address, mode=0o600)
+        self._server.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._server, selectors.EVENT_READ)
+
+    def _run(self):
+        if self._executor is not None:
+            self._executor.start()
+        try:
+            while not self._stop_event.is_set():
+                events = self._selector.select(self._next_timeout(monotonic_ns()))
+                for key, _ in events:
+                    if key.fileobj is self._server:
+                        self._accept()
+                    else:
+                        self._read(key.fileobj, key.data)
+                self._check(monotonic_ns())
+        finally:
+            for key in list(self._selector.get_map().values()):
+                key.fileobj.close()
+            self._selector.close()
+            if self._executor is not None:
+                self._executor.shutdown()
+            for job in self._jobs.values():
+                for watch_item in job.watch_items:
+                    watch_item.close()
+
+    def _accept(self):
+        # Accept every pending connection so that a burst of trainers doesn't overflow the backlog.
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except socket.error:
+                return
+            client.setblocking(True)
+            self._selector.register(client, selectors.EVENT_READ, _Job())
+
+    def _read(self, sock, job):
+        try:
+            data = sock.recv(65536)
+        except socket.error:
+            data = b''
+        if not data:
+            self._disconnect(sock, job)
+            return
+        try:
+            frames = job.reader.feed(data)
+        except Exception:  # noqa: B902
+            logger.exception('Dropped a client which sent a malformed frame.')
+            self._disconnect(sock, job)
+            return
+        tick_time = monotonic_ns()
+        for frame in frames:
+            try:
+                self._handle(tick_time, job, frame)
+            except Exception:  # noqa: B902
+                logger.exception('Failed to handle a frame.')
+
+    def _disconnect(self, sock, job):
+        self._selector.unregister(sock)
+        sock.close()
+        if all(item._estimated_trigger_time is None for item in job.watch_items):
+            self._unregister(job)
+
+    def _handle(self, tick_time, job, frame):
+        kind = frame[0]
+        if kind == 'heartbeat':
+            trigger_ns, elapsed_time, epoch_detail, iteration, phases = frame[1:]
+            message = Message(trigger_ns, elapsed_time, epoch_detail, iteration, phases=phases)
+            for watch_item in job.watch_items:
+                watch_item(tick_time, message)
+                self._deadlines.push(watch_item)
+        elif kind == 'register':
+            job_id, watch_items = frame[1:]
+            # A trainer registers again with the same ID after reconnecting.
+            if job_id in self._jobs:
+                self._unregister(self._jobs[job_id])
+            job.id = job_id
+            job.watch_items = [item if isinstance(item, WatchItem) else WatchItem(*item) for item in watch_items]
+            for watch_item in job.watch_items:
+                if watch_item._executor is None:
+                    watch_item._executor = self._executor
+            self._jobs[job_id] = job
+        elif kind == 'unregister':
+            self._unregister(job)
+        else:
+            logger.error('Unknown frame: %r', kind)
+
+    def _unregister(self, job):
+        if self._jobs.get(job.id) is job:
+            del self._jobs[job.id]
+        for watch_item in job.watch_items:
+            # Invalidate the entries of the heap.
+            watch_item._estimated_trigger_time = None
+        job.watch_items = []
+
+    def _check(self, tick_time):
+        for watch_item in self._deadlines.pop_due(tick_time):
+            deadline = watch_item._estimated_trigger_time
+            try:
+                watch_item(tick_time, None)
+            except Exception:  # noqa: B902
+                logger.exception('Failed to take an action.')
+            # Items like escalation policies move on to a later deadline.
+            if watch_item._estimated_trigger_time != deadline:
+                self._deadlines.push(watch_item)
+
+    def _next_timeout(self, now):
+        deadline = self._deadlines.peek()
+        if deadline is None:
+            return self._interval
+        return max(0.0, min(self._interval, (deadline - now) / 1e9))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Watch many training processes of a host.')
+    parser.add_argument('--address', default=default_address, help='Unix domain socket path to listen on')
+    parser.add_argument('--interval', type=float, default=5.0, help='Maximum interval (seconds) to check the state')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Number of threads to run actions asynchronously (0 runs them in the daemon loop)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    executor = ActionExecutor(workers=args.workers) if args.workers > 0 else None
+    daemon = WatchdogDaemon(args.address, interval=args.interval, executor=executor)
+    logger.info('Listening on %s', args.address)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
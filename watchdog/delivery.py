@@ -0,0 +1,287 @@
+import json
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from six.moves import http_client
+from six.moves.urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+_deliveries = weakref.WeakSet()
+
+
+def flush_all(timeout=None):
+    """Send the pending messages of every `SlackDelivery` in the process and wait for them.
+
+    Args:
+        timeout (float, optional) : Maximum time (seconds) to wait in total.
+
+    Returns:
+        bool : `True` if all the messages are sent.
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    sent = True
+    for delivery in list(_deliveries):
+        remaining = None if deadline is None else max(0, deadline - time.time())
+        sent = delivery.flush(remaining) and sent
+    return sent
+
+
+class TokenBucket(object):
+    """Token bucket to limit the rate of requests.
+
+    Args:
+        rate (float) : Number of tokens added per second.
+        burst (int) : Maximum number of tokens.
+    """
+
+    def __init__(self, rate, burst):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, waiting for it if the bucket is empty."""
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(self._burst, self._tokens + (now - self._updated_at) * self._rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+class ConnectionPool(object):
+    """Pool of keep-alive HTTP connections per host.
+
+    Args:
+        max_connections (int, optional) : Maximum number of idle connections per host. Defaults to `4`.
+        timeout (float, optional) : Timeout (seconds) of a request. Defaults to `10.0`.
+    """
+
+    def __init__(self, max_connections=4, timeout=10.0):
+        self._max_connections = max_connections
+        self._timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url, body=None, headers=None):
+        """Send a request on an idle connection if any.
+
+        Returns:
+            tuple(int, dict, bytes) : Status, headers and body of the response.
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or '/'
+        if parts.query:
+            path = path + '?' + parts.query
+
+        connection = self._get(key)
+        try:
+            return self._request(key, connection, method, path, body, headers or {})
+        except (http_client.HTTPException, IOError):
+            # The server may have closed an idle connection, so retry once on a new one.
+            connection.close()
+            return self._request(key, self._connect(key), method, path, body, headers or {})
+
+    def close(self):
+        """Close all the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _request(self, key, connection, method, path, body, headers):
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        except Exception:  # noqa: B902
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(key, connection)
+        return response.status, dict(response.getheaders()), data
+
+    def _get(self, key):
+        with self._lock:
+            connections = self._idle.get(key)
+            if connections:
+                return connections.pop()
+        return self._connect(key)
+
+    def _connect(self, key):
+        scheme, netloc = key
+        if scheme == 'https':
+            return http_client.HTTPSConnection(netloc, timeout=self._timeout)
+        return http_client.HTTPConnection(netloc, timeout=self._timeout)
+
+    def _release(self, key, connection):
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < self._max_connections:
+                connections.append(connection)
+                return
+        connection.close()
+
+
+class SlackDelivery(object):
+    """Shared delivery layer of Slack messages.
+
+    Messages to the same channel within `window` seconds are coalesced into one post.
+    Posts are sent in order of their first message by a background thread over
+    keep-alive connections, and rate limited by a token bucket so that many
+    notifications at once don't hit the rate limit of Slack.
+
+    Args:
+        window (float, optional) : Time (seconds) to coalesce messages to the same channel. Defaults to `1.0`.
+        rate (float, optional) : Maximum number of posts per second. Defaults to `1.0`.
+        burst (int, optional) : Maximum number of posts sent at once. Defaults to `5`.
+        max_connections (int, optional) : Maximum number of idle connections per host. Defaults to `4`.
+        timeout (float, optional) : Timeout (seconds) of a request. Defaults to `10.0`.
+        retries (int, optional) : Number of retries of a rate limited post. Defaults to `2`.
+    """
+
+    def __init__(self, window=1.0, rate=1.0, burst=5, max_connections=4, timeout=10.0, retries=2):
+        self._window = window
+        self._retries = retries
+        self._bucket = TokenBucket(rate, burst)
+        self._pool = ConnectionPool(max_connections=max_connections, timeout=timeout)
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        self._sending = 0
+        self._thread = None
+        self._closed = False
+        _deliveries.add(self)
+
+    def post(self, url, channel, text, token=None):
+        """Queue a message without waiting for it to be sent.
+
+        Args:
+            url (str) : URL of an incoming webhook or the `chat.postMessage` API.
+            channel (str) : Channel name with `#` prefix or user name with `@` prefix.
+            text (str) : Text of the message.
+            token (str, optional) : Access token sent as a bearer token.
+        """
+        with self._condition:
+            self._start()
+            key = (url, channel, token)
+            if key not in self._pending:
+                self._pending[key] = (time.time() + self._window, [])
+            self._pending[key][1].append(text)
+            self._condition.notify()
+
+    def flush(self, timeout=None):
+        """Send the pending messages now and wait for them.
+
+        Args:
+            timeout (float, optional) : Maximum time (seconds) to wait.
+
+        Returns:
+            bool : `True` if all the messages are sent.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            for key, (_, texts) in list(self._pending.items()):
+                self._pending[key] = (0, texts)
+            self._condition.notify_all()
+            while self._pending or self._sending:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Send the pending messages and stop the background thread."""
+        self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._pool.close()
+
+    def _start(self):
+        # The thread is started lazily so that it runs in the process which sends messages.
+        if self._thread is None or not self._thread.is_alive():
+            self._closed = False
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                batch = self._next_batch()
+                while batch is None:
+                    if self._closed:
+                        return
+                    timeout = None
+                    if self._pending:
+                        timeout = max(0, min(due for due, _ in self._pending.values()) - time.time())
+                    self._condition.wait(timeout)
+                    batch = self._next_batch()
+                self._sending += 1
+            try:
+                self._send(*batch)
+            finally:
+                with self._condition:
+                    self._sending -= 1
+                    self._condition.notify_all()
+
+    def _next_batch(self):
+        now = time.time()
+        for key, (due, texts) in self._pending.items():
+            if due <= now:
+                del self._pending[key]
+                return key, texts
+        return None
+
+    def _send(self, key, texts):
+        url, channel, token = key
+        body = json.dumps({'channel': channel, 'text': '\n'.join(texts)}).encode('utf-8')
+        headers = {'Content-Type': 'application/json; charset=utf-8'}
+        if token is not None:
+            headers['Authorization'] = 'Bearer {}'.format(token)
+
+        for _ in range(self._retries + 1):
+            self._bucket.acquire()
+            try:
+                status, response_headers, data = self._pool.request('POST', url, body=body, headers=headers)
+            except Exception as e:  # noqa: B902
+                logger.error('Failed to post a message to %s: %r', channel, e)
+                return
+            if status != 429:
+                break
+            time.sleep(min(float(response_headers.get('Retry-After', 1)), 60))
+        if status >= 400:
+            logger.error('Failed to post a message to %s: HTTP %s', channel, status)
+            return
+        error = _api_error(data)
+        if error is not None:
+            logger.error('Failed to post a message to %s: %s', channel, error)
+
+
+def _api_error(data):
+    # The Web API answers errors with HTTP 200 and `"ok": false`, while incoming webhooks answer plain text.
+    try:
+        response = json.loads(data.decode('utf-8'))
+    except ValueError:
+        return None
+    if isinstance(response, dict) and response.get('ok') is False:
+        return response.get('error', 'unknown error')
+    return None
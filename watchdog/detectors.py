@@ -0,0 +1,91 @@
+from .misc import WatchItem
+
+
+class Cusum(object):
+    """One-sided CUSUM test detecting an increase of the mean of a stream.
+
+    Args:
+        allowance (float) : Increase of samples tolerated without accumulating evidence.
+        threshold (float) : Accumulated evidence to detect a change at.
+    """
+
+    def __init__(self, allowance, threshold):
+        self._allowance = allowance
+        self._threshold = threshold
+        self.statistic = 0.0
+
+    def update(self, value):
+        """Add a sample.
+
+        Args:
+            value (float) : Deviation of a sample from the reference mean.
+
+        Returns:
+            bool : Whether a change is detected.
+        """
+        self.statistic = max(0.0, self.statistic + value - self._allowance)
+        return self.statistic > self._threshold
+
+    def reset(self):
+        self.statistic = 0.0
+
+
+class ThroughputWatchItem(WatchItem):
+    """Watch item which takes an action when the training speed drops.
+
+    Unlike `WatchItem`, it doesn't wait for a missed trigger. It learns the time
+    per iteration over the first `warmup` heartbeats and runs a CUSUM test over
+    the relative slowdown of every following heartbeat, so a run which keeps
+    sending heartbeats but has become `slowdown` slower is detected after a few
+    heartbeats. The action gets the time the last trigger would have come at
+    the baseline speed as the estimated trigger time. The baseline is learned
+    again after the action.
+
+    Args:
+        action (Action) : Action to take when the training speed drops.
+        slowdown (float, optional) : Relative slowdown to detect. Defaults to `0.4`.
+        warmup (int, optional) : Number of heartbeats to learn the baseline speed. Defaults to `10`.
+        threshold (float, optional) : Accumulated relative slowdown to take the action at. Defaults to `1.0`.
+        executor (ActionExecutor, optional) : Executor to run the action asynchronously.
+    """
+
+    __slots__ = ('_warmup', '_cusum', '_baseline', '_warmup_count', '_warmup_time', '_warmup_iterations')
+
+    def __init__(self, action, slowdown=0.4, warmup=10, threshold=1.0, executor=None):
+        super(ThroughputWatchItem, self).__init__(action, None, executor=executor)
+        self._warmup = warmup
+        self._cusum = Cusum(slowdown / 2.0, threshold)
+        self._baseline = None
+        self._reset_warmup()
+
+    def __call__(self, tick_time, message):
+        if message is None:
+            return
+        last_message, self._last_message = self._last_message, message
+        if last_message is None:
+            return
+        iterations = message.iteration - last_message.iteration
+        elapsed_time = message.elapsed_time - last_message.elapsed_time
+        if iterations <= 0:
+            return
+
+        if self._baseline is None:
+            self._warmup_count += 1
+            self._warmup_time += elapsed_time
+            self._warmup_iterations += iterations
+            if self._warmup_count >= self._warmup:
+                self._baseline = self._warmup_time / self._warmup_iterations
+            return
+
+        speed = elapsed_time / iterations
+        if self._cusum.update(speed / self._baseline - 1.0):
+            expected_time = last_message.trigger_ns + int(self._baseline * iterations * 10 ** 9)
+            self._fire(tick_time, expected_time, message)
+            self._cusum.reset()
+            self._baseline = None
+            self._reset_warmup()
+
+    def _reset_warmup(self):
+        self._warmup_count = 0
+        self._warmup_time = 0.0
+        self._warmup_iterations = 0
@@ -0,0 +1,169 @@
+import base64
+import collections
+import copy
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+import zlib
+
+from six.moves.queue import Empty
+
+from .actions import Action
+
+try:
+    import faulthandler
+except ImportError:  # Python 2 without the faulthandler backport
+    faulthandler = None
+
+logger = logging.getLogger(__name__)
+
+
+def sample_stacks(duration, rate, exclude=()):
+    """Sample the stacks of the threads of this process.
+
+    Args:
+        duration (float) : Time (seconds) to sample.
+        rate (float) : Samples per second.
+        exclude (tuple, optional) : Idents of threads not to sample.
+
+    Returns:
+        collections.Counter : Numbers of samples keyed by collapsed stacks, the thread name and the frames
+            from the outermost one joined by `;`.
+    """
+    names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+    stacks = collections.Counter()
+    deadline = time.time() + duration
+    while True:
+        for ident, frame in sys._current_frames().items():
+            if ident in exclude:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append('{}:{}:{}'.format(os.path.basename(code.co_filename), code.co_name, frame.f_lineno))
+                frame = frame.f_back
+            frames.append(names.get(ident, str(ident)))
+            stacks[';'.join(reversed(frames))] += 1
+        if time.time() >= deadline:
+            return stacks
+        time.sleep(1.0 / rate)
+
+
+def summarize_stacks(stacks, limit=5, depth=4):
+    """Format the most frequent stacks with their innermost frames.
+
+    Args:
+        stacks (collections.Counter) : Collapsed stacks returned by `sample_stacks`.
+        limit (int, optional) : Number of stacks to format. Defaults to `5`.
+        depth (int, optional) : Number of innermost frames of each stack to format. Defaults to `4`.
+    """
+    total = sum(stacks.values())
+    lines = []
+    for stack, count in stacks.most_common(limit):
+        frames = stack.split(';')
+        thread, frames = frames[0], frames[1:]
+        if len(frames) > depth:
+            frames = ['...'] + frames[-depth:]
+        lines.append('{:.0%} {}: {}'.format(count / float(total), thread, ' > '.join(frames)))
+    return '\n'.join(lines)
+
+
+def compress_stacks(stacks):
+    """Compress collapsed stacks in the format of FlameGraph into a base64 string."""
+    text = '\n'.join('{} {}'.format(stack, count) for stack, count in sorted(stacks.items()))
+    return base64.b64encode(zlib.compress(text.encode('utf-8'), 9)).decode('ascii')
+
+
+def decompress_stacks(data):
+    """Restore collapsed stacks compressed by `compress_stacks`."""
+    stacks = collections.Counter()
+    for line in zlib.decompress(base64.b64decode(data)).decode('utf-8').splitlines():
+        stack, _, count = line.rpartition(' ')
+        stacks[stack] = int(count)
+    return stacks
+
+
+class HangDiagnostics(Action):
+    """Watchdog action to take another action with the stacks of a stalled training process.
+
+    `Watchdog` starts an agent thread in the training process. When the action is
+    taken, it makes `faulthandler` dump the tracebacks of all the threads into
+    `watchdog_traceback_<pid>.txt` in the output directory of the trainer, which
+    works even if a thread holds the GIL, and asks the agent to sample the stacks
+    of all the threads. Then it takes `action` with a copy of the message whose
+    `diagnostics` hold the most frequent stacks, the compressed profile and the
+    traceback file, which templates of `MessageAction` can refer to as
+    `diagnostics`, `diagnostics_profile` and `traceback_file`.
+
+    Args:
+        action (Action) : Action to take with the diagnostics.
+        pid (int) : PID of the training process. Defaults to `os.getpid()`.
+        duration (float, optional) : Time (seconds) to sample the stacks. Defaults to `2.0`.
+        rate (float, optional) : Samples per second. Defaults to `20.0`.
+        limit (int, optional) : Number of stacks in the summary. Defaults to `5`.
+        signal (signals.signal, optional) : Signal to dump the tracebacks with. Defaults to `signal.SIGUSR1`.
+    """
+
+    def __init__(self, action, pid=os.getpid(), duration=2.0, rate=20.0, limit=5, signal=signal.SIGUSR1):
+        self._action = action
+        self._pid = pid
+        self._duration = duration
+        self._rate = rate
+        self._limit = limit
+        self._signal = signal
+        self._traceback_file = None
+        self._requested = None
+        self._results = None
+        self.priority = getattr(action, 'priority', False)
+        self.timeout = duration + (getattr(action, 'timeout', None) or 30.0)
+
+    def initialize(self, trainer):
+        if hasattr(self._action, 'initialize'):
+            self._action.initialize(trainer)
+        if faulthandler is not None:
+            if not os.path.exists(trainer.out):
+                os.makedirs(trainer.out)
+            path = os.path.join(trainer.out, 'watchdog_traceback_{}.txt'.format(self._pid))
+            faulthandler.register(self._signal, file=open(path, 'w'), all_threads=True)
+            self._traceback_file = path
+        self._requested = multiprocessing.Event()
+        self._results = multiprocessing.Queue()
+        thread = threading.Thread(target=self._run_agent)
+        thread.daemon = True
+        thread.start()
+
+    def __call__(self, tick_time, estimated_trigger_time, message):
+        if self._traceback_file is not None:
+            os.kill(self._pid, self._signal)
+        stacks = None
+        if self._requested is not None:
+            # Discard stacks which came after an earlier request timed out.
+            while not self._results.empty():
+                self._results.get()
+            self._requested.set()
+            try:
+                stacks = collections.Counter(self._results.get(timeout=self._duration + 5.0))
+            except Empty:
+                logger.error('The training process did not respond to the request for its stacks.')
+        message = copy.copy(message)
+        message.diagnostics = {
+            'summary': summarize_stacks(stacks, limit=self._limit) if stacks else None,
+            'profile': compress_stacks(stacks) if stacks else None,
+            'traceback_file': self._traceback_file,
+        }
+        self._action(tick_time, estimated_trigger_time, message)
+
+    def _run_agent(self):
+        while True:
+            self._requested.wait()
+            self._requested.clear()
+            try:
+                stacks = sample_stacks(self._duration, self._rate, exclude=(threading.current_thread().ident,))
+            except Exception:  # noqa: B902
+                logger.exception('Failed to sample the stacks.')
+                stacks = collections.Counter()
+            self._results.put(dict(stacks))
@@ -1,4 +1,4 @@
-from datetime import timedelta
+import bisect
 
 
 class Estimator(object):
@@ -9,10 +9,25 @@ class Estimator(object):
 
         Args:
             message: (Message) : Message received from a training process.
+
+        Returns:
+            int : Time (nanoseconds) of the next trigger on the monotonic clock, or `None` if it is not
+                estimated yet. A datetime returned instead is converted.
         """
 
         raise NotImplementedError()
 
+    def attach(self, history):
+        """Read heartbeats from a ring shared with other estimators.
+
+        The owner of the ring appends every message to it before calling the estimator.
+
+        Args:
+            history (HeartbeatRing) : Ring of the last heartbeats.
+        """
+
+        pass
+
 
 class SimpleEstimator(Estimator):
     """Estimator which estimate next trigger time based on the speed of training.
@@ -27,15 +42,13 @@ class SimpleEstimator(Estimator):
         self._count = 0
 
     def __call__(self, message):
-        if self._count == 0:
+        if self._start_message is None:
             self._start_message = message
-            estimated_time = None
-        else:
-            diff = message.elapsed_time - self._start_message.elapsed_time
-            estimated_time = message.trigger_time + timedelta(seconds=self._factor * diff / self._count)
+            return None
 
-        self._count = self._count + 1
-        return estimated_time
+        self._count = self._count + message.count
+        diff = message.elapsed_time - self._start_message.elapsed_time
+        return message.trigger_ns + int(self._factor * diff / self._count * 10 ** 9)
 
 
 class StaticEstimator(Estimator):
@@ -46,7 +59,215 @@ class StaticEstimator(Estimator):
     """
 
     def __init__(self, duration):
-        self._duration = duration
+        self._duration = int(duration * 10 ** 9)
+
+    def __call__(self, message):
+        return message.trigger_ns + self._duration
+
+
+class IntervalEstimator(Estimator):
+    """Base class of estimators based on the intervals between triggers.
+
+    Subclasses update their state with each interval in `_update` and return the
+    estimated duration (seconds) until the next trigger in `_estimate`. Intervals
+    are read from a `HeartbeatRing` once the estimator is attached to one.
+
+    Args:
+        factor (float, optional) : Factor to multiply the estimated interval. Defaults to `1.5`.
+    """
+
+    def __init__(self, factor=1.5):
+        self._factor = factor
+        self._last_message = None
+        self._history = None
+
+    def attach(self, history):
+        self._history = history
 
     def __call__(self, message):
-        return message.trigger_time + timedelta(seconds=self._duration)
+        if self._history is None:
+            last_message, self._last_message = self._last_message, message
+            if last_message is None:
+                return None
+            interval = (message.elapsed_time - last_message.elapsed_time) / message.count
+        else:
+            if len(self._history) < 2:
+                return None
+            interval = self._history.get('interval')
+        self._update(interval)
+        return message.trigger_ns + int(self._estimate() * 10 ** 9)
+
+    def _update(self, interval):
+        raise NotImplementedError()
+
+    def _estimate(self):
+        raise NotImplementedError()
+
+
+class EWMAEstimator(IntervalEstimator):
+    """Estimator which estimate next trigger time with the exponentially weighted moving average of intervals.
+
+    Args:
+        alpha (float, optional) : Weight of the latest interval. Defaults to `0.1`.
+        factor (float, optional) : Factor to multiply the average. Defaults to `1.5`.
+    """
+
+    def __init__(self, alpha=0.1, factor=1.5):
+        super(EWMAEstimator, self).__init__(factor=factor)
+        self._alpha = alpha
+        self._average = None
+
+    def _update(self, interval):
+        if self._average is None:
+            self._average = interval
+        else:
+            self._average += self._alpha * (interval - self._average)
+
+    def _estimate(self):
+        return self._factor * self._average
+
+
+class _Window(object):
+    """Fixed-size ring buffer of intervals kept sorted at the same time.
+
+    Once attached to a `HeartbeatRing`, the window finds the interval leaving it
+    in the ring instead of keeping its own copies.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._ring = [0.0] * size
+        self._position = 0
+        self._history = None
+        self.sorted = []
+
+    def __len__(self):
+        return len(self.sorted)
+
+    def attach(self, history):
+        if history.size <= self._size:
+            raise ValueError('A ring of {} heartbeats is too small for a window of {} intervals'.format(
+                history.size, self._size))
+        self._history = history
+        self._ring = None
+
+    def append(self, value):
+        if self._history is not None:
+            if len(self.sorted) == self._size:
+                # The value was just appended to the ring, so the oldest one is `size` heartbeats before it.
+                del self.sorted[bisect.bisect_left(self.sorted, self._history.get('interval', self._size))]
+            bisect.insort(self.sorted, value)
+            return
+        if len(self.sorted) == self._size:
+            oldest = self._ring[self._position]
+            del self.sorted[bisect.bisect_left(self.sorted, oldest)]
+        self._ring[self._position] = value
+        self._position = (self._position + 1) % self._size
+        bisect.insort(self.sorted, value)
+
+    def quantile(self, q):
+        position = q * (len(self.sorted) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(self.sorted) - 1)
+        return self.sorted[lower] + (self.sorted[upper] - self.sorted[lower]) * (position - lower)
+
+
+class QuantileEstimator(IntervalEstimator):
+    """Estimator which estimate next trigger time with a quantile of recent intervals.
+
+    Args:
+        quantile (float, optional) : Quantile of intervals within the window. Defaults to `0.95`.
+        window (int, optional) : Number of recent intervals. Defaults to `100`.
+        factor (float, optional) : Factor to multiply the quantile. Defaults to `1.5`.
+    """
+
+    def __init__(self, quantile=0.95, window=100, factor=1.5):
+        super(QuantileEstimator, self).__init__(factor=factor)
+        self._quantile = quantile
+        self._window = _Window(window)
+
+    def attach(self, history):
+        super(QuantileEstimator, self).attach(history)
+        self._window.attach(history)
+
+    def _update(self, interval):
+        self._window.append(interval)
+
+    def _estimate(self):
+        return self._factor * self._window.quantile(self._quantile)
+
+
+class _Distances(object):
+    """Sorted view of the distances from a pivot to one side of a sorted list."""
+
+    def __init__(self, values, pivot, start, stop, step):
+        self._values = values
+        self._pivot = pivot
+        self._start = start
+        self._step = step
+        self._length = max(0, (stop - start) * step)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        return abs(self._values[self._start + index * self._step] - self._pivot)
+
+
+def _kth_smallest(a, b, k):
+    # k-th (0-based) smallest value of two sorted sequences in O(log n).
+    n = k + 1
+    low, high = max(0, n - len(b)), min(n, len(a))
+    while low < high:
+        i = (low + high) // 2
+        if a[i] < b[n - i - 1]:
+            low = i + 1
+        else:
+            high = i
+    candidates = []
+    if low > 0:
+        candidates.append(a[low - 1])
+    if n - low > 0:
+        candidates.append(b[n - low - 1])
+    return max(candidates)
+
+
+class MedianEstimator(IntervalEstimator):
+    """Estimator which estimate next trigger time with the median and the MAD of recent intervals.
+
+    The estimated interval is `factor * median + deviations * 1.4826 * MAD`, which is
+    robust to outliers such as evaluation iterations.
+
+    Args:
+        window (int, optional) : Number of recent intervals. Defaults to `100`.
+        factor (float, optional) : Factor to multiply the median. Defaults to `1.5`.
+        deviations (float, optional) : Number of scaled MADs to add. Defaults to `3.0`.
+    """
+
+    def __init__(self, window=100, factor=1.5, deviations=3.0):
+        super(MedianEstimator, self).__init__(factor=factor)
+        self._deviations = deviations
+        self._window = _Window(window)
+
+    def attach(self, history):
+        super(MedianEstimator, self).attach(history)
+        self._window.attach(history)
+
+    def _update(self, interval):
+        self._window.append(interval)
+
+    def _estimate(self):
+        median = self._window.quantile(0.5)
+        return self._factor * median + self._deviations * 1.4826 * self._mad(median)
+
+    def _mad(self, median):
+        # Distances below and above the median are two sorted sequences, so their
+        # median is found without sorting all the distances.
+        values = self._window.sorted
+        split = bisect.bisect_left(values, median)
+        below = _Distances(values, median, split - 1, -1, -1)
+        above = _Distances(values, median, split, len(values), 1)
+        n = len(values)
+        if n % 2 == 1:
+            return _kth_smallest(below, above, n // 2)
+        return (_kth_smallest(below, above, n // 2 - 1) + _kth_smallest(below, above, n // 2)) / 2.0
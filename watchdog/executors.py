@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+
+from six.moves import queue
+
+logger = logging.getLogger(__name__)
+
+
+class ActionExecutor(object):
+    """Executor to run watchdog actions asynchronously.
+
+    Actions are dispatched to worker threads so that a slow action never delays
+    the deadline checks of the watcher. Actions with `priority` set, such as
+    `Abort`, have their own lane and are never queued behind the others.
+
+    Args:
+        workers (int, optional) : Number of workers of the normal lane. Defaults to `2`.
+        max_pending (int, optional) : Maximum number of pending dispatches per lane. Defaults to `100`.
+        timeout (float, optional) : Time (seconds) to wait for an action unless the action has its own
+            `timeout`. Defaults to `30.0`.
+        retries (int, optional) : Number of retries of an action raising an error. Defaults to `2`.
+        backoff (float, optional) : Delay (seconds) before the first retry, doubled on every retry.
+            Defaults to `1.0`.
+    """
+
+    def __init__(self, workers=2, max_pending=100, timeout=30.0, retries=2, backoff=1.0):
+        self._workers = workers
+        self._max_pending = max_pending
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._lock = threading.Lock()
+        self._threads = []
+        self._lanes = None
+        self._metrics = {
+            'dispatched': 0,
+            'completed': 0,
+            'failed': 0,
+            'timed_out': 0,
+            'dropped': 0,
+            'retried': 0,
+            'latency_total': 0.0,
+            'latency_max': 0.0,
+        }
+
+    @property
+    def metrics(self):
+        """dict : Snapshot of the counters and the dispatch latency (seconds) of the executor."""
+        with self._lock:
+            metrics = dict(self._metrics)
+        started = metrics['completed'] + metrics['failed'] + metrics['timed_out']
+        metrics['latency_mean'] = metrics['latency_total'] / started if started else 0.0
+        return metrics
+
+    def start(self):
+        """Start the workers. It must be called in the process running the watcher."""
+        if self._lanes is not None:
+            return
+        self._lanes = {
+            True: queue.Queue(maxsize=self._max_pending),
+            False: queue.Queue(maxsize=self._max_pending),
+        }
+        self._threads = [self._start_worker(self._lanes[True])]
+        for _ in range(self._workers):
+            self._threads.append(self._start_worker(self._lanes[False]))
+
+    def shutdown(self, timeout=1.0):
+        """Stop the workers after the pending dispatches.
+
+        Args:
+            timeout (float, optional) : Time (seconds) to wait for each worker. Defaults to `1.0`.
+        """
+        if self._lanes is None:
+            return
+        for lane, workers in ((self._lanes[True], 1), (self._lanes[False], self._workers)):
+            for _ in range(workers):
+                try:
+                    lane.put_nowait(None)
+                except queue.Full:
+                    pass
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._lanes = None
+
+    def submit(self, action, tick_time, estimated_trigger_time, message):
+        """Dispatch an action without waiting for it.
+
+        Returns:
+            bool : `False` if the dispatch is dropped because the lane is full.
+        """
+        self.start()
+        lane = self._lanes[bool(getattr(action, 'priority', False))]
+        try:
+            lane.put_nowait((action, (tick_time, estimated_trigger_time, message), time.time()))
+        except queue.Full:
+            logger.error('Dropped the action %r because too many actions are pending.', action)
+            self._count('dropped')
+            return False
+        self._count('dispatched')
+        return True
+
+    def _start_worker(self, lane):
+        thread = threading.Thread(target=self._worker, args=(lane,))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _worker(self, lane):
+        while True:
+            dispatch = lane.get()
+            if dispatch is None:
+                return
+            action, args, submit_time = dispatch
+            latency = time.time() - submit_time
+            with self._lock:
+                self._metrics['latency_total'] += latency
+                self._metrics['latency_max'] = max(self._metrics['latency_max'], latency)
+            self._count(self._run(action, args))
+
+    def _run(self, action, args):
+        timeout = getattr(action, 'timeout', None) or self._timeout
+        delay = self._backoff
+        for attempt in range(self._retries + 1):
+            if attempt > 0:
+                self._count('retried')
+                time.sleep(delay)
+                delay *= 2
+            errors = []
+            thread = threading.Thread(target=self._call, args=(action, args, errors))
+            thread.daemon = True
+            thread.start()
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.error('The action %r timed out after %s seconds.', action, timeout)
+                return 'timed_out'
+            if not errors:
+                return 'completed'
+        logger.error('The action %r failed: %r', action, errors[0])
+        return 'failed'
+
+    def _call(self, action, args, errors):
+        try:
+            action(*args)
+        except Exception as e:  # noqa: B902
+            errors.append(e)
+
+    def _count(self, key):
+        with self._lock:
+            self._metrics[key] += 1
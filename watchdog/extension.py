@@ -1,14 +1,30 @@
-import time
-from datetime import datetime
-from multiprocessing import Event, Process, Queue
+import functools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import threading
 
 from chainer.training import extension, trigger as trigger_module
 
-from dateutil import tz
+from six.moves import queue
 
-from six.moves.queue import Empty
+from .channels import Channel, DaemonChannel, QueueChannel, RingChannel, SharedMemoryChannel
+from .history import HeartbeatRing
+from .instrumentation import PhaseTimer
+from .misc import DeadlineHeap, WatchItem, monotonic_ns
 
-from .misc import Message, WatchItem
+logger = logging.getLogger(__name__)
+
+_backends = {
+    'process': (multiprocessing.Queue, multiprocessing.Event, multiprocessing.Process),
+    'thread': (queue.Queue, threading.Event, threading.Thread),
+}
+
+_channels = {
+    'queue': QueueChannel,
+    'shared_memory': SharedMemoryChannel,
+    'ring': RingChannel,
+}
 
 
 class Watchdog(extension.Extension):
@@ -16,54 +32,233 @@ class Watchdog(extension.Extension):
 
     This extension monitors training progress and execute watching items.
 
+    The watcher blocks until either a heartbeat arrives or the earliest estimated
+    trigger time of the watch items passes, so a stall is detected as soon as its
+    deadline is missed.
+
+    The watcher runs in a forked process by default. The `thread` backend runs it
+    in a thread of the training process instead, which avoids forking a process
+    holding the model and pickling every heartbeat, at the cost of sharing the GIL
+    with the training loop.
+
+    Heartbeats are sent through a queue by default. The `shared_memory` channel
+    keeps only the latest heartbeat in a shared memory slot instead, which makes
+    sending a heartbeat as cheap as writing four numbers. The `ring` channel keeps
+    the latest heartbeats in a bounded ring of shared memory, and a `RingChannel`
+    instance chooses its size and what to drop when it is full.
+
+    A background thread of the training process waits for the watcher to exit,
+    so checking that the watcher is alive costs no system call per iteration.
+    A dead watcher raises `RuntimeError` at the next iteration, or is restarted
+    up to `max_restarts` times.
+
+    The watcher appends every heartbeat to a `HeartbeatRing` of `history`
+    heartbeats, which the windowed estimators of the watch items share.
+
+    A `ProgressProbe` sends progress within iterations from a thread of the
+    training process, and the watch items extend their deadlines while a long
+    iteration keeps making progress.
+
+    With a `daemon` address, the extension runs no watcher at all. It registers
+    the watch items with a `WatchdogDaemon` shared by the trainers of the host
+    and only sends heartbeats to it.
+
     Args:
         watch_items (list[tuple(Action, Estimator)]) : Items to watch.
-        trigger (tuple, optional) : Defaults to `(100, 'iteration')`.
-        interval (float, optional) : Interval (seconds) to check the state. Defaults to `5.0`.
+        trigger (tuple or trigger, optional) : Trigger to send heartbeats. An `AdaptiveIntervalTrigger` sends
+            them about every given seconds. Defaults to `(100, 'iteration')`.
+        interval (float, optional) : Maximum interval (seconds) to check the state. Defaults to `5.0`.
+        backend (str, optional) : Backend to run the watcher, `process` or `thread`. Defaults to `process`.
+        channel (str or Channel, optional) : Channel to send heartbeats, `queue`, `shared_memory` or `ring`.
+            Defaults to `queue`.
+        executor (ActionExecutor, optional) : Executor to run the actions asynchronously in the watcher.
+            Actions run in the watcher loop if it is `None`.
+        recorder (TraceRecorder, optional) : Recorder of the heartbeats received by the watcher.
+        instrument (bool, optional) : Time the phases of iterations and send the mean durations with
+            heartbeats as `Message.phases`. Defaults to `False`.
+        metrics (MetricsExporter, optional) : Exporter of the watcher state.
+        daemon (str, optional) : Unix domain socket path of a `WatchdogDaemon` to watch the training process
+            instead of a watcher of this extension. The watch items must be picklable.
+        max_restarts (int, optional) : Number of times to restart a dead watcher instead of raising
+            `RuntimeError`. Defaults to `0`.
+        history (int, optional) : Number of heartbeats the watcher keeps for the estimators. Defaults to `1024`.
+        progress (ProgressProbe, optional) : Probe to send progress within iterations to the watcher.
     """
 
-    def __init__(self, watch_items, trigger=(100, 'iteration'), interval=5.0):
+    def __init__(self, watch_items, trigger=(100, 'iteration'), interval=5.0, backend='process', channel='queue',
+                 executor=None, recorder=None, instrument=False, metrics=None, daemon=None, max_restarts=0,
+                 history=1024, progress=None):
+        if daemon is not None and (executor is not None or recorder is not None or metrics is not None):
+            raise ValueError('executor, recorder and metrics run in the watcher, which a daemon replaces')
+        if daemon is not None and progress is not None:
+            raise ValueError('progress is not sent to a daemon')
+        if backend not in _backends:
+            raise ValueError('Unknown backend: {}'.format(backend))
+        if not isinstance(channel, Channel) and channel not in _channels:
+            raise ValueError('Unknown channel: {}'.format(channel))
+        queue_class, event_class, worker_class = _backends[backend]
+
         self._trigger = trigger_module.get_trigger(trigger)
         self._interval = interval
+        self._executor = executor
+        self._recorder = recorder
+        self._metrics = metrics
+        self._phase_timer = PhaseTimer() if instrument else None
+        self._progress = progress
         self._watch_items = []
         for item in watch_items:
             if not isinstance(item, WatchItem):
                 action, estimator = item
                 item = WatchItem(action=action, estimator=estimator)
+            if item._executor is None:
+                item._executor = executor
             self._watch_items.append(item)
 
-        self._heartbeat_queue = Queue()
-        self._stop_event = Event()
-        self._heartbeat_thread = Process(target=self._heartbeat_handler)
+        self._deadlines = DeadlineHeap()
+        self._event_class = event_class
+        self._stop_event = event_class()
+        self._max_restarts = max_restarts
+        self._worker_class = worker_class
+        # The watcher counts as dead until it starts.
+        self._watcher_dead = daemon is None
+        if daemon is not None:
+            self._channel = DaemonChannel(daemon, self._watch_items)
+            self._heartbeat_thread = None
+            self._history = None
+            return
+        self._history = HeartbeatRing(history)
+        for item in self._watch_items:
+            item.attach(self._history)
+        if isinstance(channel, Channel):
+            self._channel_factory = None
+            self._channel = channel
+        else:
+            self._channel_factory = functools.partial(_channels[channel], queue_class=queue_class,
+                                                      event_class=event_class)
+            self._channel = self._channel_factory()
+        self._heartbeat_thread = worker_class(target=self._heartbeat_handler)
         self._heartbeat_thread.daemon = True
 
     def initialize(self, trainer):
+        # Evaluators are told by their types before the phase timer wraps them.
+        if self._progress is not None:
+            self._progress.instrument(trainer)
+        if self._phase_timer is not None:
+            self._phase_timer.instrument(trainer, exclude=(self,))
         self._trigger(trainer)
-        self._heartbeat_thread.start()
+        if self._heartbeat_thread is None:
+            self._channel.connect()
+            return
+        for watch_item in self._watch_items:
+            for action in watch_item.actions:
+                if hasattr(action, 'initialize'):
+                    action.initialize(trainer)
+        self._start_watcher()
+        if self._progress is not None:
+            self._progress.start(self._send_progress)
 
     def __call__(self, trainer):
-        if not self._heartbeat_thread.is_alive():
-            raise RuntimeError('Heartbeat thread is dead')
+        if self._watcher_dead:
+            if self._max_restarts <= 0 or self._heartbeat_thread.ident is None:
+                raise RuntimeError('Heartbeat thread is dead')
+            self._max_restarts -= 1
+            # The dead watcher may have been killed holding locks of the channel and the stop event,
+            # which would block the new one, so give it new ones unless the channel was passed.
+            if self._channel_factory is not None:
+                self._channel.close()
+                self._channel = self._channel_factory()
+            self._stop_event = self._event_class()
+            logger.error('Restarting the dead watcher.')
+            self._heartbeat_thread = self._worker_class(target=self._heartbeat_handler)
+            self._heartbeat_thread.daemon = True
+            self._start_watcher()
 
         if self._trigger(trainer):
-            message = Message(datetime.now(tz.tzutc()), trainer.elapsed_time,
-                              trainer.updater.epoch_detail, trainer.updater.iteration)
-            self._heartbeat_queue.put_nowait(message)
+            phases = None if self._phase_timer is None else self._phase_timer.summary()
+            self._channel.send(monotonic_ns(), trainer.elapsed_time,
+                               trainer.updater.epoch_detail, trainer.updater.iteration, phases=phases)
 
     def finalize(self):
+        if self._progress is not None:
+            self._progress.stop()
         self._stop_event.set()
-        if self._heartbeat_thread.is_alive():
+        # Wake the watcher up so that it does not wait for the next deadline.
+        self._channel.close()
+        if self._heartbeat_thread is not None and self._heartbeat_thread.is_alive():
             self._heartbeat_thread.join()
 
+    def _send_progress(self, trigger_ns, progress):
+        # The channel is replaced when a dead watcher is restarted.
+        self._channel.send_progress(trigger_ns, progress)
+
+    def _start_watcher(self):
+        self._heartbeat_thread.start()
+        self._watcher_dead = False
+        monitor = threading.Thread(target=self._monitor_watcher, args=(self._heartbeat_thread,))
+        monitor.daemon = True
+        monitor.start()
+
+    def _monitor_watcher(self, watcher):
+        sentinel = getattr(watcher, 'sentinel', None)
+        if sentinel is None:
+            watcher.join()
+        else:
+            # Waiting for the sentinel doesn't reap the process, which `finalize` joins.
+            multiprocessing.connection.wait([sentinel])
+        if watcher is self._heartbeat_thread and not self._stop_event.is_set():
+            self._watcher_dead = True
+
     def _heartbeat_handler(self):
-        while not self._stop_event.is_set():
-            message = None
-            tick_time = datetime.now(tz.tzutc())
-            try:
-                message = self._heartbeat_queue.get_nowait()
-            except Empty:
-                pass
+        if self._executor is not None:
+            self._executor.start()
+        if self._metrics is not None:
+            self._metrics.start(self._watch_items, channel=self._channel, executor=self._executor)
+        try:
+            while not self._stop_event.is_set():
+                timeout = self._next_timeout(monotonic_ns())
+                messages = self._channel.receive(timeout)
+                if self._stop_event.is_set():
+                    break
+                self._tick(monotonic_ns(), messages)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+            for watch_item in self._watch_items:
+                watch_item.close()
+            if self._recorder is not None:
+                self._recorder.close()
+            if self._metrics is not None:
+                self._metrics.stop()
+
+    def _next_timeout(self, now):
+        deadline = self._deadlines.peek()
+        if deadline is None:
+            return self._interval
+        return max(0.0, min(self._interval, (deadline - now) / 1e9))
+
+    def _tick(self, tick_time, messages):
+        # Fold every pending message into the watch items in order, then check
+        # the deadlines within the same tick so a backlog never delays detection.
+        heartbeats = []
+        for message in messages:
+            if message.progress is not None:
+                for watch_item in self._watch_items:
+                    watch_item.extend(message)
+                continue
+            heartbeats.append(message)
+            if self._recorder is not None:
+                self._recorder.write(message)
+            self._history.append(message)
             for watch_item in self._watch_items:
                 watch_item(tick_time, message)
-            if not self._stop_event.is_set():
-                time.sleep(self._interval)
+        for watch_item in self._watch_items:
+            deadline = watch_item._estimated_trigger_time
+            watch_item(tick_time, None)
+            # Items like escalation policies move on to a later deadline.
+            if watch_item._estimated_trigger_time != deadline:
+                self._deadlines.push(watch_item)
+        if messages:
+            for watch_item in self._watch_items:
+                self._deadlines.push(watch_item)
+        if self._metrics is not None:
+            self._metrics.update(tick_time, heartbeats)
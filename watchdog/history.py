@@ -0,0 +1,82 @@
+from array import array
+
+
+class HeartbeatRing(object):
+    """Preallocated ring of the last heartbeats shared by estimators.
+
+    Heartbeats are stored in fixed-size columns of `array`, so appending one
+    allocates nothing and windows of a column are contiguous memory. The owner
+    of the ring appends each message before calling the estimators attached to
+    it, and estimators read intervals from the ring instead of keeping their
+    own copies.
+
+    Args:
+        size (int, optional) : Number of heartbeats to keep. Defaults to `1024`.
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.trigger_ns = array('q', [0]) * size
+        self.elapsed_time = array('d', [0.0]) * size
+        self.epoch_detail = array('d', [0.0]) * size
+        # Iterations are doubles, which hold any realistic iteration exactly.
+        self.iteration = array('d', [0.0]) * size
+        self.count = array('q', [0]) * size
+        self.interval = array('d', [0.0]) * size
+        self._position = 0
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def append(self, message):
+        """Append a message.
+
+        The interval of a heartbeat is the elapsed time since the previous
+        heartbeat divided by the number of heartbeats the message stands for.
+
+        Args:
+            message (Message) : Message received from a training process.
+        """
+        position = self._position
+        if self._length:
+            last = position - 1 if position else self.size - 1
+            self.interval[position] = (message.elapsed_time - self.elapsed_time[last]) / message.count
+        else:
+            self.interval[position] = float('nan')
+        self.trigger_ns[position] = message.trigger_ns
+        self.elapsed_time[position] = message.elapsed_time
+        self.epoch_detail[position] = message.epoch_detail
+        self.iteration[position] = message.iteration
+        self.count[position] = message.count
+        self._position = position + 1 if position + 1 < self.size else 0
+        if self._length < self.size:
+            self._length += 1
+
+    def get(self, column, age=0):
+        """Return a value of a heartbeat.
+
+        Args:
+            column (str) : Name of the column, e.g. `interval`.
+            age (int, optional) : Number of heartbeats appended after it. Defaults to `0`, the latest one.
+        """
+        if age >= self._length:
+            raise IndexError('Heartbeat {} is not in the ring'.format(age))
+        return getattr(self, column)[(self._position - 1 - age) % self.size]
+
+    def window(self, column, n):
+        """Return the values of the last heartbeats from the oldest.
+
+        Args:
+            column (str) : Name of the column, e.g. `interval`.
+            n (int) : Number of heartbeats.
+
+        Returns:
+            array : Copy of at most `n` values, which takes at most two slices of the column.
+        """
+        n = min(n, self._length)
+        values = getattr(self, column)
+        start = self._position - n
+        if start >= 0:
+            return values[start:self._position]
+        return values[start + self.size:] + values[:self._position]
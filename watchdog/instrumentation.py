@@ -0,0 +1,158 @@
+import functools
+import time
+
+try:
+    _perf_counter_ns = time.perf_counter_ns
+except AttributeError:
+    def _perf_counter_ns():
+        return int(getattr(time, 'perf_counter', time.time)() * 1e9)
+
+
+class Histogram(object):
+    """Fixed-size histogram of durations with power-of-two nanosecond buckets.
+
+    Args:
+        size (int, optional) : Number of buckets. Defaults to `48`.
+    """
+
+    def __init__(self, size=48):
+        self.buckets = [0] * size
+        self.count = 0
+        self.total = 0
+
+    def add(self, duration):
+        """Add a duration (nanoseconds)."""
+        self.buckets[min(duration.bit_length(), len(self.buckets) - 1)] += 1
+        self.count += 1
+        self.total += duration
+
+    def quantile(self, q):
+        """Return the upper bound (seconds) of the bucket holding a quantile."""
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return (1 << i) / 1e9
+        return 0.0
+
+
+class _TimedExtension(object):
+    """Proxy of a trainer extension which times its calls."""
+
+    def __init__(self, extension, timer, name):
+        self._extension = extension
+        self._timer = timer
+        self._name = name
+
+    def __call__(self, trainer):
+        start = _perf_counter_ns()
+        try:
+            return self._extension(trainer)
+        finally:
+            self._timer.record(self._name, _perf_counter_ns() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._extension, name)
+
+
+class _OptimizerHook(object):
+    """Optimizer hook splitting an update into the forward/backward and update phases."""
+
+    name = 'watchdog_phase_timer'
+    timing = 'pre'
+    call_for_each_param = False
+
+    def __init__(self, timer):
+        self._timer = timer
+
+    def __call__(self, optimizer):
+        self._timer._mark_backward_done()
+
+
+class PhaseTimer(object):
+    """Timer of the phases of training iterations.
+
+    It times the data loading (`data`), the forward and backward computation
+    (`forward_backward`), the parameter update (`update`), the whole updater
+    (`updater`) and every other extension (`extension:<name>`). Durations are
+    kept in fixed-size histograms, and `summary` returns the mean duration of
+    each phase since the last summary.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self._windows = {}
+        self._backward_done_at = None
+
+    def record(self, name, duration):
+        """Record a duration (nanoseconds) of a phase."""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+            self._windows[name] = [0, 0]
+        histogram.add(duration)
+        window = self._windows[name]
+        window[0] += 1
+        window[1] += duration
+
+    def timed(self, name, function):
+        """Wrap a function to record its durations as a phase."""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = _perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, _perf_counter_ns() - start)
+        return wrapper
+
+    def summary(self):
+        """Return the mean duration (seconds) of each phase since the last summary.
+
+        Returns:
+            dict : Mean durations keyed by phase names.
+        """
+        phases = {}
+        for name, window in self._windows.items():
+            if window[0]:
+                phases[name] = window[1] / 1e9 / window[0]
+                window[0] = window[1] = 0
+        return phases
+
+    def instrument(self, trainer, exclude=()):
+        """Wrap the updater and the extensions of a trainer with timers.
+
+        Args:
+            trainer (Trainer) : Trainer to instrument.
+            exclude (tuple, optional) : Extensions not to wrap.
+        """
+        updater = trainer.updater
+        for iterator in getattr(updater, '_iterators', {}).values():
+            iterator.next = self.timed('data', iterator.next)
+        for optimizer in updater.get_all_optimizers().values():
+            optimizer.update = self._timed_optimizer_update(optimizer.update)
+            optimizer.add_hook(_OptimizerHook(self), name=_OptimizerHook.name, timing='pre')
+        updater.update = self.timed('updater', updater.update)
+
+        for name, entry in trainer._extensions.items():
+            if entry.extension in exclude:
+                continue
+            entry.extension = _TimedExtension(entry.extension, self, 'extension:{}'.format(name))
+
+    def _timed_optimizer_update(self, update):
+        @functools.wraps(update)
+        def wrapper(*args, **kwargs):
+            start = _perf_counter_ns()
+            self._backward_done_at = None
+            try:
+                return update(*args, **kwargs)
+            finally:
+                end = _perf_counter_ns()
+                backward_done_at = self._backward_done_at or start
+                self.record('forward_backward', backward_done_at - start)
+                self.record('update', end - backward_done_at)
+        return wrapper
+
+    def _mark_backward_done(self):
+        self._backward_done_at = _perf_counter_ns()
@@ -0,0 +1,162 @@
+import threading
+
+from six.moves import BaseHTTPServer
+
+from .misc import monotonic_ns, to_epoch_ns
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.exporter.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    value = float(value)
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+class MetricsExporter(object):
+    """Exporter of the watchdog state in the Prometheus text format.
+
+    The exporter serves `/metrics` from a thread of the watcher. The watcher
+    stores values into slots allocated when it starts, and scrapes only read
+    them, so neither the watcher nor the training process waits for a scrape.
+
+    Args:
+        port (int, optional) : Port to listen on. A free port is picked if it is `0`. Defaults to `9090`.
+        host (str, optional) : Host to listen on. Defaults to all the interfaces.
+    """
+
+    def __init__(self, port=9090, host=''):
+        self._address = (host, port)
+        self._server = None
+        self._thread = None
+        self._channel = None
+        self._executor = None
+        self._watch_items = []
+        self._deadlines = []
+        self._intervals = []
+        self._last_heartbeat_time = None
+        self._last_message = None
+        self._heartbeats = 0
+        self._iterations_per_second = float('nan')
+
+    @property
+    def port(self):
+        """int : Port the exporter listens on."""
+        return self._server.server_address[1]
+
+    def start(self, watch_items, channel=None, executor=None):
+        """Start serving in the process running the watcher.
+
+        Args:
+            watch_items (list[WatchItem]) : Items to export the states of.
+            channel (Channel, optional) : Channel to export the depth of.
+            executor (ActionExecutor, optional) : Executor to export the counters of.
+        """
+        self._watch_items = list(watch_items)
+        self._deadlines = [float('nan')] * len(self._watch_items)
+        self._intervals = [float('nan')] * len(self._watch_items)
+        self._channel = channel
+        self._executor = executor
+        self._server = BaseHTTPServer.HTTPServer(self._address, _Handler)
+        self._server.exporter = self
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+
+    def update(self, tick_time, messages):
+        """Update the values after a tick of the watcher.
+
+        Args:
+            tick_time (int) : Time (nanoseconds) of the tick on the monotonic clock.
+            messages (list[Message]) : Messages received in the tick.
+        """
+        for message in messages:
+            last_message, self._last_message = self._last_message, message
+            self._heartbeats += message.count
+            if last_message is not None and message.elapsed_time > last_message.elapsed_time:
+                self._iterations_per_second = ((message.iteration - last_message.iteration) /
+                                               float(message.elapsed_time - last_message.elapsed_time))
+        if messages:
+            self._last_heartbeat_time = messages[-1].trigger_ns
+        for i, watch_item in enumerate(self._watch_items):
+            deadline = watch_item._estimated_trigger_time
+            message = watch_item._last_message
+            if deadline is None or message is None:
+                self._deadlines[i] = self._intervals[i] = float('nan')
+            else:
+                self._deadlines[i] = to_epoch_ns(deadline) / 1e9
+                self._intervals[i] = (deadline - message.trigger_ns) / 1e9
+
+    def render(self):
+        """Return the metrics in the Prometheus text format."""
+        lines = []
+
+        def add(name, kind, description, samples):
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for labels, value in samples:
+                label = ','.join('{}="{}"'.format(k, _escape(v)) for k, v in labels)
+                lines.append('{}{} {}'.format(name, '{' + label + '}' if label else '', _format_value(value)))
+
+        last_heartbeat_time = self._last_heartbeat_time
+        age = float('nan') if last_heartbeat_time is None else (monotonic_ns() - last_heartbeat_time) / 1e9
+        add('watchdog_last_heartbeat_age_seconds', 'gauge', 'Seconds since the last heartbeat.', [((), age)])
+        add('watchdog_heartbeats_total', 'counter', 'Heartbeats received by the watcher.',
+            [((), self._heartbeats)])
+        add('watchdog_iterations_per_second', 'gauge', 'Iterations per second between the last heartbeats.',
+            [((), self._iterations_per_second)])
+
+        labels = [(('item', i), ('action', type(item if item._action is None else item._action).__name__))
+                  for i, item in enumerate(self._watch_items)]
+        add('watchdog_estimated_trigger_timestamp_seconds', 'gauge',
+            'Estimated time of the next trigger of each watch item.', zip(labels, self._deadlines))
+        add('watchdog_estimated_interval_seconds', 'gauge',
+            'Estimated interval from the last trigger to the next trigger of each watch item.',
+            zip(labels, self._intervals))
+        add('watchdog_action_fires_total', 'counter', 'Actions fired by each watch item.',
+            [(label, item._fire_count) for label, item in zip(labels, self._watch_items)])
+
+        if self._channel is not None:
+            add('watchdog_queue_depth', 'gauge', 'Heartbeats waiting for the watcher.',
+                [((), self._channel.depth())])
+            if hasattr(self._channel, 'drops'):
+                drops = self._channel.drops
+                add('watchdog_channel_dropped_total', 'counter', 'Heartbeats dropped by the channel by reason.',
+                    [((('reason', key),), drops[key]) for key in sorted(drops)])
+        if self._executor is not None:
+            metrics = self._executor.metrics
+            add('watchdog_executor_actions_total', 'counter', 'Actions dispatched to the executor by result.',
+                [((('result', key),), metrics[key])
+                 for key in ('dispatched', 'completed', 'failed', 'timed_out', 'dropped', 'retried')])
+            add('watchdog_executor_dispatch_latency_seconds', 'gauge', 'Mean and max latency of dispatches.',
+                [((('stat', 'mean'),), metrics['latency_mean']), ((('stat', 'max'),), metrics['latency_max'])])
+        return '\n'.join(lines) + '\n'
@@ -1,9 +1,64 @@
-from datetime import datetime
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime, timedelta
 
 from dateutil import tz
 
 from six import string_types
 
+logger = logging.getLogger(__name__)
+
+_epoch = datetime(1970, 1, 1, tzinfo=tz.tzutc())
+
+
+# Time (nanoseconds) of the monotonic clock.
+if hasattr(time, 'monotonic_ns'):
+    monotonic_ns = time.monotonic_ns
+elif hasattr(time, 'monotonic'):  # Python 3.3 to 3.6
+    def monotonic_ns():
+        return int(time.monotonic() * 10 ** 9)
+else:  # Python 2
+    def monotonic_ns():
+        return int(time.time() * 10 ** 9)
+
+# Offset from the monotonic clock to nanoseconds since the epoch. It is taken
+# once, so that converting a time back and forth gives the same time.
+_epoch_offset = int(time.time() * 10 ** 9) - monotonic_ns()
+
+
+def to_timestamp(value):
+    """Convert an aware datetime into a POSIX timestamp."""
+    return (value - _epoch).total_seconds()
+
+
+def to_epoch_ns(value):
+    """Convert a time (nanoseconds) of the monotonic clock into nanoseconds since the epoch."""
+    return value + _epoch_offset
+
+
+def to_datetime(value):
+    """Convert a time (nanoseconds) of the monotonic clock into an aware datetime."""
+    return _epoch + timedelta(microseconds=(to_epoch_ns(value) + 500) // 1000)
+
+
+def from_timestamp(value):
+    """Convert a POSIX timestamp into a time (nanoseconds) of the monotonic clock."""
+    return int(round(value * 10 ** 9)) - _epoch_offset
+
+
+def to_monotonic_ns(value):
+    """Convert an aware datetime into a time (nanoseconds) of the monotonic clock.
+
+    Times of the monotonic clock and `None` are returned as they are, so that
+    estimators which return datetimes keep working.
+    """
+    if not isinstance(value, datetime):
+        return value
+    delta = value - _epoch
+    return (delta.days * 86400 + delta.seconds) * 10 ** 9 + delta.microseconds * 1000 - _epoch_offset
+
 
 class SimpleFormatter(object):
     def __init__(self, tzinfo=tz.tzlocal()):
@@ -21,33 +76,181 @@ class SimpleFormatter(object):
 
 
 class Message(object):
-    def __init__(self, trigger_time, elapsed_time, epoch_detail, iteration):
-        assert trigger_time is not None
-        assert elapsed_time is not None
-        assert epoch_detail is not None
-        assert iteration is not None
+    """Heartbeat of a training process.
 
-        self.trigger_time = trigger_time
+    The time of the trigger is kept as nanoseconds of the monotonic clock, which
+    doesn't jump with the wall clock. `trigger_time` converts it into a datetime
+    only when it is referred to. A message is created for every heartbeat, so it
+    has slots instead of a `__dict__`.
+
+    Args:
+        trigger_ns (int or datetime) : Time (nanoseconds) of the trigger on the monotonic clock.
+            A datetime is converted.
+        elapsed_time (float) : Elapsed time of the trainer.
+        epoch_detail (float) : Epoch detail of the updater.
+        iteration (int) : Iteration of the updater.
+        count (int, optional) : Number of heartbeats this message stands for. Defaults to `1`.
+        phases (dict, optional) : Mean duration (seconds) of each phase of iterations since the last message.
+        rank (int, optional) : Rank of the training process in a multi-node job.
+        lag (int, optional) : Iterations the rank is behind the fastest rank of the job.
+        diagnostics (dict, optional) : Diagnostics of the training process taken by `HangDiagnostics`.
+        resources (dict, optional) : Resource usage of the training process taken by `ResourceWatchItem`.
+        min_interval (float, optional) : Minimum interval (seconds) between the heartbeats this message stands for.
+        max_interval (float, optional) : Maximum interval (seconds) between the heartbeats this message stands for.
+        progress (int, optional) : Number of steps within iterations made by the training process, which makes
+            the message a progress message sent by a `ProgressProbe` instead of a heartbeat.
+    """
+
+    __slots__ = ('trigger_ns', 'elapsed_time', 'epoch_detail', 'iteration', 'count', 'phases', 'rank', 'lag',
+                 'diagnostics', 'resources', 'min_interval', 'max_interval', 'progress')
+
+    def __init__(self, trigger_ns, elapsed_time, epoch_detail, iteration, count=1, phases=None, rank=None,
+                 lag=None, diagnostics=None, resources=None, min_interval=None, max_interval=None, progress=None):
+        self.trigger_ns = to_monotonic_ns(trigger_ns)
         self.elapsed_time = elapsed_time
         self.epoch_detail = epoch_detail
         self.iteration = iteration
+        self.count = count
+        self.phases = phases
+        self.rank = rank
+        self.lag = lag
+        self.diagnostics = diagnostics
+        self.resources = resources
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.progress = progress
+
+    @property
+    def trigger_time(self):
+        """datetime : Time of the trigger."""
+        return to_datetime(self.trigger_ns)
+
+    @trigger_time.setter
+    def trigger_time(self, value):
+        self.trigger_ns = to_monotonic_ns(value)
 
 
 class WatchItem(object):
-    def __init__(self, action, estimator):
+    """Pair of an action and an estimator to watch.
+
+    Times of ticks and estimated trigger times are nanoseconds of the monotonic
+    clock. They are converted into datetimes only when the action is taken.
+
+    Args:
+        action (Action) : Action to take when a trigger doesn't come before the estimated time.
+        estimator (Estimator) : Estimator of the next trigger time.
+        executor (ActionExecutor, optional) : Executor to run the action asynchronously. The action runs
+            in the watcher loop if it is `None`.
+    """
+
+    __slots__ = ('_action', '_estimator', '_executor', '_last_message', '_estimated_trigger_time',
+                 '_estimated_interval', '_fire_count')
+
+    def __init__(self, action, estimator, executor=None):
         self._action = action
         self._estimator = estimator
+        self._executor = executor
         self._last_message = None
         self._estimated_trigger_time = None
+        self._estimated_interval = None
+        self._fire_count = 0
+
+    @property
+    def actions(self):
+        """Actions the item may take."""
+        return [self._action]
+
+    def attach(self, history):
+        """Let the estimator read heartbeats from a ring shared with other watch items.
+
+        Args:
+            history (HeartbeatRing) : Ring of the last heartbeats.
+        """
+        if hasattr(self._estimator, 'attach'):
+            self._estimator.attach(history)
+
+    def close(self):
+        """Close the actions when the watcher stops, e.g. to send the notifications they hold."""
+        for action in self.actions:
+            if not hasattr(action, 'close'):
+                continue
+            try:
+                action.close()
+            except Exception:  # noqa: B902
+                logger.exception('Failed to close an action.')
 
     def __call__(self, tick_time, message):
         if message is not None:
             self._last_message = message
-            self._estimated_trigger_time = self._estimator(message)
+            self._estimated_trigger_time = to_monotonic_ns(self._estimator(message))
+            self._estimated_interval = None
         else:
             if self._estimated_trigger_time is None or self._last_message is None:
                 return
             if self._estimated_trigger_time < tick_time:
-                self._action(tick_time, self._estimated_trigger_time, self._last_message)
+                self._fire(tick_time, self._estimated_trigger_time, self._last_message)
                 self._last_message = None
                 self._estimated_trigger_time = None
+
+    def extend(self, message):
+        """Extend the deadline for progress within an iteration without feeding the estimator.
+
+        The deadline moves to the estimated interval after the progress, unless it is later already.
+
+        Args:
+            message (Message) : Progress message sent by a `ProgressProbe`.
+        """
+        if self._estimated_trigger_time is None or self._last_message is None:
+            return
+        if self._estimated_interval is None:
+            # Taken before the first extension, which moves the deadline away from the last trigger.
+            self._estimated_interval = self._estimated_trigger_time - self._last_message.trigger_ns
+        self._estimated_trigger_time = max(self._estimated_trigger_time,
+                                           message.trigger_ns + self._estimated_interval)
+
+    def _fire(self, tick_time, estimated_trigger_time, message, action=None):
+        action = self._action if action is None else action
+        self._fire_count += 1
+        tick_time, estimated_trigger_time = to_datetime(tick_time), to_datetime(estimated_trigger_time)
+        if self._executor is None:
+            action(tick_time, estimated_trigger_time, message)
+        else:
+            self._executor.submit(action, tick_time, estimated_trigger_time, message)
+
+
+class DeadlineHeap(object):
+    """Min-heap of the estimated trigger times of watch items.
+
+    Entries are invalidated lazily: an entry is dropped when it reaches the top
+    of the heap and no longer matches the estimated trigger time of its item.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, watch_item):
+        deadline = watch_item._estimated_trigger_time
+        if deadline is not None:
+            heapq.heappush(self._heap, (deadline, next(self._counter), watch_item))
+
+    def peek(self):
+        """Return the earliest valid deadline or `None` if there is nothing to wait for."""
+        while self._heap:
+            deadline, _, watch_item = self._heap[0]
+            if watch_item._estimated_trigger_time == deadline:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now):
+        """Remove and return the watch items whose valid deadline is before `now`."""
+        items = []
+        while self._heap and self._heap[0][0] < now:
+            deadline, _, watch_item = heapq.heappop(self._heap)
+            if watch_item._estimated_trigger_time == deadline:
+                items.append(watch_item)
+        return items
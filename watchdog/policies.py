@@ -0,0 +1,97 @@
+from .misc import WatchItem, to_monotonic_ns
+
+
+class Stage(object):
+    """Stage of an `EscalationPolicy`.
+
+    The stage is due at `scale` times the estimated interval plus `delay` seconds
+    after the last trigger.
+
+    Args:
+        action (Action) : Action to take at the stage.
+        scale (float, optional) : Factor to multiply the estimated interval. Defaults to `1.0`.
+        delay (float, optional) : Seconds to add to the scaled interval. Defaults to `0.0`.
+        cooldown (float, optional) : Minimum seconds between two actions of the stage, which
+            suppresses repeated actions for a flapping run. Defaults to `0.0`.
+    """
+
+    def __init__(self, action, scale=1.0, delay=0.0, cooldown=0.0):
+        self.action = action
+        self.scale = scale
+        self.delay = delay
+        self.cooldown = cooldown
+
+
+class EscalationPolicy(WatchItem):
+    """Watch item which escalates a missed trigger through ordered stages.
+
+    All the stages share one estimator, so the escalation like warning at 2x,
+    notifying at 3x and aborting a minute later keeps a single state. Only the
+    next stage is checked at each tick. Each stage is taken at most once per
+    stall and an action shared by stages is taken once, and a new heartbeat
+    resets the escalation to the first stage. So does progress within an
+    iteration, from which the stages are due instead of the last trigger.
+
+    Args:
+        estimator (Estimator) : Estimator of the next trigger time.
+        stages (list[Stage or tuple]) : Stages in the order to take. Tuples are passed to `Stage`.
+        executor (ActionExecutor, optional) : Executor to run the actions asynchronously.
+    """
+
+    __slots__ = ('_stages', '_interval', '_progress_ns', '_next_stage', '_fired_actions', '_last_fire_times')
+
+    def __init__(self, estimator, stages, executor=None):
+        super(EscalationPolicy, self).__init__(None, estimator, executor=executor)
+        self._stages = [stage if isinstance(stage, Stage) else Stage(*stage) for stage in stages]
+        self._interval = None
+        self._progress_ns = None
+        self._next_stage = 0
+        self._fired_actions = []
+        self._last_fire_times = [None] * len(self._stages)
+
+    @property
+    def actions(self):
+        return [stage.action for stage in self._stages]
+
+    def __call__(self, tick_time, message):
+        if message is not None:
+            self._last_message = message
+            estimated_trigger_time = to_monotonic_ns(self._estimator(message))
+            if estimated_trigger_time is None:
+                self._interval = None
+            else:
+                self._interval = (estimated_trigger_time - message.trigger_ns) / 1e9
+            self._progress_ns = None
+            self._next_stage = 0
+            self._fired_actions = []
+            self._estimated_trigger_time = self._deadline()
+            return
+
+        while self._estimated_trigger_time is not None and self._estimated_trigger_time < tick_time:
+            stage = self._stages[self._next_stage]
+            last_fire_time = self._last_fire_times[self._next_stage]
+            cooling = last_fire_time is not None and tick_time - last_fire_time < stage.cooldown * 1e9
+            if not cooling and not any(action is stage.action for action in self._fired_actions):
+                self._last_fire_times[self._next_stage] = tick_time
+                self._fired_actions.append(stage.action)
+                self._fire(tick_time, self._estimated_trigger_time, self._last_message, action=stage.action)
+            self._next_stage += 1
+            self._estimated_trigger_time = self._deadline()
+
+    def extend(self, message):
+        if self._interval is None:
+            return
+        if self._progress_ns is None or self._progress_ns < message.trigger_ns:
+            self._progress_ns = message.trigger_ns
+        self._next_stage = 0
+        self._fired_actions = []
+        self._estimated_trigger_time = self._deadline()
+
+    def _deadline(self):
+        if self._interval is None or self._next_stage >= len(self._stages):
+            return None
+        stage = self._stages[self._next_stage]
+        start = self._last_message.trigger_ns
+        if self._progress_ns is not None:
+            start = max(start, self._progress_ns)
+        return start + int((self._interval * stage.scale + stage.delay) * 10 ** 9)
@@ -0,0 +1,105 @@
+import functools
+import threading
+
+from chainer.training.extensions import Evaluator
+
+from .misc import monotonic_ns
+
+
+class _OptimizerHook(object):
+    """Optimizer hook counting the backward passes done before updates."""
+
+    name = 'watchdog_progress_probe'
+    timing = 'pre'
+    call_for_each_param = False
+
+    def __init__(self, probe):
+        self._probe = probe
+
+    def __call__(self, optimizer):
+        self._probe.counts['backward'] += 1
+
+
+class ProgressProbe(object):
+    """Thread of a training process which sends progress within iterations to the watcher.
+
+    It counts the batches fetched by the iterators of the updater (`data`), the
+    backward passes (`backward`), the parameter updates (`update`) and the
+    batches evaluated by `Evaluator` extensions (`evaluation`). Counting is an
+    increment in the training loop. Every `interval` seconds, the thread sends
+    the total number of steps if it has changed, and the watch items extend
+    their deadlines without feeding their estimators. So a single long
+    iteration, like a huge evaluation, is told from a frozen one without more
+    heartbeats.
+
+    A training process holding the GIL blocks the thread too, so it never sends
+    progress for a run stuck in it.
+
+    Args:
+        interval (float, optional) : Interval (seconds) to check the counters. Defaults to `1.0`.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.counts = {'data': 0, 'backward': 0, 'update': 0, 'evaluation': 0}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def progress(self):
+        """Total number of steps counted."""
+        return sum(self.counts.values())
+
+    def counted(self, name, function):
+        """Wrap a function to count its calls as steps of a kind."""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.counts[name] += 1
+        return wrapper
+
+    def instrument(self, trainer):
+        """Wrap the updater and the evaluators of a trainer with counters.
+
+        Args:
+            trainer (Trainer) : Trainer to instrument.
+        """
+        updater = trainer.updater
+        for iterator in getattr(updater, '_iterators', {}).values():
+            iterator.next = self.counted('data', iterator.next)
+        for optimizer in updater.get_all_optimizers().values():
+            optimizer.update = self.counted('update', optimizer.update)
+            optimizer.add_hook(_OptimizerHook(self), name=_OptimizerHook.name, timing='pre')
+        for entry in trainer._extensions.values():
+            if isinstance(entry.extension, Evaluator):
+                # The converter is called once for every batch, unlike the evaluation function
+                # which an evaluator may override.
+                entry.extension.converter = self.counted('evaluation', entry.extension.converter)
+
+    def start(self, send):
+        """Start the thread.
+
+        Args:
+            send (callable) : Function to send the time (nanoseconds) of the monotonic clock and the progress.
+        """
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(send,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, send):
+        sent = self.progress
+        while not self._stop_event.wait(self.interval):
+            progress = self.progress
+            if progress != sent:
+                send(monotonic_ns(), progress)
+                sent = progress
@@ -0,0 +1,107 @@
+import os
+import struct
+import time
+
+import numpy as np
+
+from .misc import to_epoch_ns
+
+dtype = np.dtype([
+    ('timestamp', '<i8'),
+    ('elapsed_time', '<f8'),
+    ('epoch_detail', '<f8'),
+    ('iteration', '<i8'),
+])
+"""numpy.dtype : Fixed-width record of a heartbeat. `timestamp` is nanoseconds since the epoch."""
+
+_record = struct.Struct('<qddq')
+
+
+class TraceRecorder(object):
+    """Recorder of heartbeats into a compact binary log.
+
+    The watcher appends every message it receives as a fixed-width record, so
+    recording adds nothing to the training process. The log is opened lazily in
+    the process which writes it, flushed when the buffer fills up, synced to
+    the disk periodically and rotated by size.
+
+    Args:
+        path (str) : Path of the log. Rotated logs get suffixes `.1`, `.2`, and so on.
+        buffer_size (int, optional) : Bytes to buffer before writing. Defaults to `65536`.
+        fsync_interval (float, optional) : Interval (seconds) to sync the log to the disk. Defaults to `10.0`.
+        max_bytes (int, optional) : Size (bytes) to rotate the log at. The log is not rotated if it is `0`.
+            Defaults to `0`.
+        backup_count (int, optional) : Number of rotated logs to keep. Defaults to `5`.
+    """
+
+    def __init__(self, path, buffer_size=65536, fsync_interval=10.0, max_bytes=0, backup_count=5):
+        self._path = path
+        self._buffer_size = buffer_size
+        self._fsync_interval = fsync_interval
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+        self._file = None
+        self._size = 0
+        self._synced_at = None
+
+    def write(self, message):
+        """Append a message to the log.
+
+        Args:
+            message (Message) : Message received from a training process.
+        """
+        if self._file is None:
+            self._open()
+        elif self._max_bytes and self._size + _record.size > self._max_bytes:
+            self._rotate()
+        self._file.write(_record.pack(to_epoch_ns(message.trigger_ns), message.elapsed_time,
+                                      message.epoch_detail, message.iteration))
+        self._size += _record.size
+        if time.time() - self._synced_at >= self._fsync_interval:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered records and sync them to the disk."""
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced_at = time.time()
+
+    def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+
+    def _open(self):
+        self._file = open(self._path, 'ab', self._buffer_size)
+        self._size = self._file.tell()
+        self._synced_at = time.time()
+
+    def _rotate(self):
+        self.close()
+        for i in range(self._backup_count - 1, 0, -1):
+            source = '{}.{}'.format(self._path, i)
+            if os.path.exists(source):
+                os.rename(source, '{}.{}'.format(self._path, i + 1))
+        if self._backup_count > 0:
+            os.rename(self._path, '{}.1'.format(self._path))
+        else:
+            os.remove(self._path)
+        self._open()
+
+
+def load(path):
+    """Map a log of heartbeats without copying it.
+
+    Args:
+        path (str) : Path of a log written by `TraceRecorder`.
+
+    Returns:
+        numpy.ndarray : Structured array of `dtype` backed by the file.
+    """
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
@@ -0,0 +1,242 @@
+"""Replay recorded heartbeat traces to evaluate estimators.
+
+Every estimator is evaluated over a whole trace at once with NumPy instead of
+calling it per message, so millions of heartbeats are replayed in seconds::
+
+    $ python -m watchdog.replay --hung --estimator ewma:alpha=0.2 --estimator median:window=50 trace.csv
+"""
+import argparse
+import csv
+import json
+import os
+
+import numpy as np
+
+from . import recorder
+
+
+def load_trace(path):
+    """Load the elapsed times of heartbeats from a file.
+
+    CSV files must have an `elapsed_time` column, NPZ files an `elapsed_time` array,
+    BIN files are logs of `TraceRecorder` and JSON files, or files without an
+    extension, are read as the `log` of Chainer's `LogReport`.
+
+    Args:
+        path (str) : Path of a CSV, NPZ, BIN or JSON file.
+
+    Returns:
+        numpy.ndarray : Elapsed times (seconds) of heartbeats.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        with open(path) as f:
+            times = [float(row['elapsed_time']) for row in csv.DictReader(f)]
+    elif ext == '.npz':
+        with np.load(path) as data:
+            times = data['elapsed_time']
+    elif ext == '.bin':
+        times = recorder.load(path)['elapsed_time']
+    elif ext in ('.json', ''):
+        with open(path) as f:
+            times = [entry['elapsed_time'] for entry in json.load(f)]
+    else:
+        raise ValueError('Unknown trace format: {}'.format(path))
+    return np.asarray(times, dtype=np.float64)
+
+
+def _ewma(intervals, alpha, block=256):
+    # Blocks of the recurrence are evaluated as a matrix product with the
+    # carried average, which keeps the powers of the decay small.
+    decay = 1.0 - alpha
+    index = np.arange(block)
+    lags = index[:, None] - index[None, :]
+    weights = np.where(lags >= 0, alpha * decay ** np.maximum(lags, 0), 0.0)
+    carry = decay ** (index + 1)
+
+    averages = np.empty_like(intervals)
+    average = intervals[0] if len(intervals) else 0.0
+    for start in range(0, len(intervals), block):
+        chunk = intervals[start:start + block]
+        size = len(chunk)
+        averages[start:start + size] = weights[:size, :size].dot(chunk) + carry[:size] * average
+        average = averages[start + size - 1]
+    return averages
+
+
+def _windows(intervals, window, reduce_windows, reduce_partial, chunk=65536):
+    # Partial windows at the beginning are reduced one by one; full windows are
+    # reduced in chunks to bound the memory of the strided views.
+    results = np.empty_like(intervals)
+    head = min(window - 1, len(intervals))
+    for i in range(head):
+        results[i] = reduce_partial(intervals[:i + 1])
+    if len(intervals) >= window:
+        views = np.lib.stride_tricks.sliding_window_view(intervals, window)
+        for start in range(0, len(views), chunk):
+            results[head + start:head + start + chunk] = reduce_windows(views[start:start + chunk])
+    return results
+
+
+def _simple(intervals, factor=1.5):
+    return factor * np.cumsum(intervals) / np.arange(1, len(intervals) + 1)
+
+
+def _static(intervals, duration):
+    return np.full(len(intervals), float(duration))
+
+
+def _ewma_estimator(intervals, alpha=0.1, factor=1.5):
+    return factor * _ewma(intervals, alpha)
+
+
+def _quantile(intervals, quantile=0.95, window=100, factor=1.5):
+    window = int(window)
+    return factor * _windows(intervals, window,
+                             lambda views: np.quantile(views, quantile, axis=1),
+                             lambda values: np.quantile(values, quantile))
+
+
+def _median(intervals, window=100, factor=1.5, deviations=3.0):
+    window = int(window)
+
+    def reduce_windows(views):
+        medians = np.median(views, axis=1)
+        mads = np.median(np.abs(views - medians[:, None]), axis=1)
+        return factor * medians + deviations * 1.4826 * mads
+
+    def reduce_partial(values):
+        median = np.median(values)
+        return factor * median + deviations * 1.4826 * np.median(np.abs(values - median))
+
+    return _windows(intervals, window, reduce_windows, reduce_partial)
+
+
+estimators = {
+    'simple': _simple,
+    'static': _static,
+    'ewma': _ewma_estimator,
+    'quantile': _quantile,
+    'median': _median,
+}
+
+default_estimators = ['simple', 'ewma', 'quantile', 'median']
+
+
+def parse_estimator(spec):
+    """Parse an estimator spec such as `ewma:alpha=0.2,factor=2`.
+
+    Returns:
+        tuple(str, dict) : Name and parameters of the estimator.
+    """
+    name, _, params = spec.partition(':')
+    if name not in estimators:
+        raise ValueError('Unknown estimator: {}'.format(name))
+    kwargs = {}
+    for param in filter(None, params.split(',')):
+        key, _, value = param.partition('=')
+        kwargs[key.strip()] = float(value)
+    return name, kwargs
+
+
+def estimate(times, name, **params):
+    """Estimate the durations until the next heartbeat like the estimator would.
+
+    Args:
+        times (numpy.ndarray) : Elapsed times (seconds) of heartbeats.
+        name (str) : Name of the estimator.
+
+    Returns:
+        numpy.ndarray : Estimated duration after each heartbeat but the first.
+    """
+    return estimators[name](np.diff(times), **params)
+
+
+def evaluate(times, name, hung=False, **params):
+    """Evaluate an estimator over a trace.
+
+    A deadline missed by a heartbeat that came afterwards is a false positive.
+    `time_to_abort` is the elapsed time when the first false positive would have
+    fired. If the run hung after its last heartbeat, `detection_latency` is the
+    time from the last heartbeat to its deadline.
+
+    Args:
+        times (numpy.ndarray) : Elapsed times (seconds) of heartbeats.
+        name (str) : Name of the estimator.
+        hung (bool, optional) : Whether the run hung after the last heartbeat.
+
+    Returns:
+        dict : Metrics of the estimator.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    durations = estimate(times, name, **params)
+    intervals = np.diff(times)
+    # Estimates after every heartbeat but the last are checked by the next interval.
+    missed = intervals[1:] > durations[:-1]
+    false_positives = np.flatnonzero(missed)
+    checked = len(missed)
+
+    time_to_abort = None
+    if len(false_positives):
+        first = false_positives[0]
+        time_to_abort = float(times[first + 1] + durations[first] - times[0])
+    detection_latency = None
+    if hung and len(durations):
+        detection_latency = float(durations[-1])
+    return {
+        'heartbeats': len(times),
+        'false_positives': int(len(false_positives)),
+        'false_positive_rate': float(len(false_positives)) / checked if checked else 0.0,
+        'time_to_abort': time_to_abort,
+        'detection_latency': detection_latency,
+    }
+
+
+def summarize(results):
+    """Aggregate the metrics of an estimator over runs."""
+    heartbeats = sum(result['heartbeats'] for result in results)
+    false_positives = sum(result['false_positives'] for result in results)
+    checked = sum(max(result['heartbeats'] - 2, 0) for result in results)
+    latencies = [result['detection_latency'] for result in results if result['detection_latency'] is not None]
+    aborts = [result['time_to_abort'] for result in results if result['time_to_abort'] is not None]
+    return {
+        'runs': len(results),
+        'heartbeats': heartbeats,
+        'false_positives': false_positives,
+        'false_positive_rate': float(false_positives) / checked if checked else 0.0,
+        'aborted_runs': len(aborts),
+        'median_time_to_abort': float(np.median(aborts)) if aborts else None,
+        'median_detection_latency': float(np.median(latencies)) if latencies else None,
+        'max_detection_latency': float(np.max(latencies)) if latencies else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay heartbeat traces to evaluate estimators.')
+    parser.add_argument('traces', nargs='+', help='CSV, NPZ, recorder or LogReport JSON files of heartbeats')
+    parser.add_argument('--estimator', '-e', action='append', dest='estimators',
+                        help='Estimator spec like `ewma:alpha=0.2,factor=2` (repeatable)')
+    parser.add_argument('--hung', action='store_true', help='Treat each trace as a run hung after its last heartbeat')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args(argv)
+
+    traces = [load_trace(path) for path in args.traces]
+    summaries = []
+    for spec in args.estimators or default_estimators:
+        name, params = parse_estimator(spec)
+        summary = summarize([evaluate(times, name, hung=args.hung, **params) for times in traces])
+        summary['estimator'] = spec
+        summaries.append(summary)
+
+    if args.json:
+        print(json.dumps(summaries, indent=2, sort_keys=True))
+        return
+    columns = ['estimator', 'runs', 'false_positive_rate', 'aborted_runs',
+               'median_time_to_abort', 'median_detection_latency', 'max_detection_latency']
+    print('\t'.join(columns))
+    for summary in summaries:
+        print('\t'.join(str(summary[column]) for column in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+import collections
+import copy
+import os
+
+from .misc import WatchItem, monotonic_ns
+
+ResourceSample = collections.namedtuple('ResourceSample', ['time', 'state', 'cpu_time', 'rss', 'io_bytes'])
+
+_clock_ticks = float(os.sysconf('SC_CLK_TCK')) if hasattr(os, 'sysconf') else 100.0
+
+
+def _pread(fd, size):
+    if hasattr(os, 'pread'):
+        return os.pread(fd, size, 0)
+    os.lseek(fd, 0, os.SEEK_SET)
+    return os.read(fd, size)
+
+
+def memory_limit():
+    """Return the memory (bytes) available to this host or container."""
+    limits = []
+    with open('/proc/meminfo') as f:
+        for line in f:
+            if line.startswith('MemTotal:'):
+                limits.append(int(line.split()[1]) * 1024)
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                limits.append(int(f.read()))
+        except (IOError, OSError, ValueError):
+            pass
+    return min(limits)
+
+
+class ProcProbe(object):
+    """Probe of the resource usage of a process read from `/proc`.
+
+    The files of the process are opened once and read from the beginning at
+    each sample, which costs a few system calls.
+
+    Args:
+        pid (int, optional) : PID of the process. Defaults to `os.getpid()`.
+    """
+
+    def __init__(self, pid=os.getpid()):
+        self._pid = pid
+        self._fds = None
+
+    def sample(self):
+        """Read the resource usage of the process.
+
+        Returns:
+            ResourceSample : Time (seconds) of the monotonic clock, state of the process, CPU time (seconds),
+                RSS (bytes) and bytes read and written.
+                `io_bytes` is `None` if the I/O counters of the process are not readable.
+        """
+        if self._fds is None:
+            self._open()
+        stat = _pread(self._fds['stat'], 4096).decode('ascii', 'replace')
+        # The command name may contain spaces and parentheses.
+        fields = stat[stat.rindex(')') + 2:].split()
+        cpu_time = (int(fields[11]) + int(fields[12])) / _clock_ticks
+        rss = 0
+        for line in _pread(self._fds['status'], 8192).decode('ascii', 'replace').splitlines():
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1]) * 1024
+                break
+        io_bytes = None
+        if self._fds['io'] is not None:
+            counters = dict(line.split(': ') for line in _pread(self._fds['io'], 4096).decode('ascii').splitlines())
+            io_bytes = int(counters['rchar']) + int(counters['wchar'])
+        return ResourceSample(monotonic_ns() / 1e9, fields[0], cpu_time, rss, io_bytes)
+
+    def close(self):
+        if self._fds is not None:
+            for fd in self._fds.values():
+                if fd is not None:
+                    os.close(fd)
+            self._fds = None
+
+    def _open(self):
+        base = '/proc/{}'.format(self._pid)
+        self._fds = {
+            'stat': os.open(os.path.join(base, 'stat'), os.O_RDONLY),
+            'status': os.open(os.path.join(base, 'status'), os.O_RDONLY),
+        }
+        try:
+            self._fds['io'] = os.open(os.path.join(base, 'io'), os.O_RDONLY)
+        except OSError:
+            # The I/O counters of processes of other users are not readable.
+            self._fds['io'] = None
+
+
+def _rate(first, last, field):
+    duration = last.time - first.time
+    if duration <= 0 or getattr(first, field) is None or getattr(last, field) is None:
+        return None
+    return (getattr(last, field) - getattr(first, field)) / duration
+
+
+class ResourceWatchItem(WatchItem):
+    """Watch item which tells a deadlocked training process from a slow one.
+
+    When the estimated trigger time passes, it takes `deadlock_action` if the
+    process has used less than `cpu_threshold` of a core and done less than
+    `io_threshold` bytes per second of I/O since the last trigger, and
+    `slow_action` otherwise. It also fits the trend of the RSS over the last
+    `window` ticks, and takes `oom_action` with the predicted time as the
+    estimated trigger time once the RSS is predicted to reach `memory_limit`
+    within `horizon` seconds.
+
+    Actions get a copy of the message whose `resources` hold `cpu_usage`,
+    `io_rate` (bytes per second), `rss` (bytes) and `state` of the process,
+    which templates of `MessageAction` can refer to. An exited process counts
+    as deadlocked.
+
+    Args:
+        estimator (Estimator) : Estimator of the next trigger time.
+        deadlock_action (Action, optional) : Action to take when the process is idle after a missed trigger.
+        slow_action (Action, optional) : Action to take when the process is busy after a missed trigger.
+        oom_action (Action, optional) : Action to take when the process is running out of memory.
+        pid (int, optional) : PID of the training process. Defaults to `os.getpid()`.
+        cpu_threshold (float, optional) : CPU usage (cores) under which the process is idle. Defaults to `0.05`.
+        io_threshold (float, optional) : I/O (bytes per second) under which the process is idle.
+            Defaults to `4096`.
+        memory_limit (int, optional) : Memory (bytes) available to the process. Defaults to the smaller of
+            the memory of the host and the limit of the cgroup.
+        horizon (float, optional) : Time (seconds) ahead to predict running out of memory. Defaults to `600`.
+        window (int, optional) : Number of ticks to fit the trend of the RSS. Defaults to `30`.
+        executor (ActionExecutor, optional) : Executor to run the actions asynchronously.
+    """
+
+    __slots__ = ('_deadlock_action', '_slow_action', '_oom_action', '_probe', '_cpu_threshold', '_io_threshold',
+                 '_memory_limit', '_horizon', '_samples', '_trigger_sample', '_oom_predicted')
+
+    def __init__(self, estimator, deadlock_action=None, slow_action=None, oom_action=None, pid=os.getpid(),
+                 cpu_threshold=0.05, io_threshold=4096, memory_limit=None, horizon=600.0, window=30, executor=None):
+        super(ResourceWatchItem, self).__init__(None, estimator, executor=executor)
+        self._deadlock_action = deadlock_action
+        self._slow_action = slow_action
+        self._oom_action = oom_action
+        self._probe = ProcProbe(pid)
+        self._cpu_threshold = cpu_threshold
+        self._io_threshold = io_threshold
+        self._memory_limit = memory_limit
+        self._horizon = horizon
+        self._samples = collections.deque(maxlen=window)
+        self._trigger_sample = None
+        self._oom_predicted = False
+
+    @property
+    def actions(self):
+        return [action for action in (self._deadlock_action, self._slow_action, self._oom_action)
+                if action is not None]
+
+    def __call__(self, tick_time, message):
+        if message is not None:
+            super(ResourceWatchItem, self).__call__(tick_time, message)
+            self._trigger_sample = None
+            return
+
+        try:
+            sample = self._probe.sample()
+        except (IOError, OSError):
+            # The process has exited.
+            sample = None
+        if sample is not None:
+            self._samples.append(sample)
+            if self._trigger_sample is None:
+                self._trigger_sample = sample
+        if self._last_message is None:
+            return
+
+        if self._estimated_trigger_time is not None and self._estimated_trigger_time < tick_time:
+            if sample is None:
+                resources = {'cpu_usage': None, 'io_rate': None, 'rss': None, 'state': None}
+                idle = True
+            else:
+                resources = self._resources(self._trigger_sample, sample)
+                idle = (resources['cpu_usage'] is not None and resources['cpu_usage'] < self._cpu_threshold and
+                        (resources['io_rate'] is None or resources['io_rate'] < self._io_threshold))
+            action = self._deadlock_action if idle else self._slow_action
+            if action is not None:
+                self._fire(tick_time, self._estimated_trigger_time, self._with_resources(resources), action=action)
+            self._estimated_trigger_time = None
+
+        if sample is not None:
+            self._predict_oom(tick_time, sample)
+
+    def _predict_oom(self, tick_time, sample):
+        if self._oom_action is None or len(self._samples) < self._samples.maxlen:
+            return
+        slope = self._rss_slope()
+        if self._memory_limit is None:
+            self._memory_limit = memory_limit()
+        remaining = None if slope <= 0 else (self._memory_limit - sample.rss) / slope
+        predicted = remaining is not None and remaining < self._horizon
+        if predicted and not self._oom_predicted:
+            resources = self._resources(self._samples[0], sample)
+            self._fire(tick_time, tick_time + int(max(0.0, remaining) * 10 ** 9), self._with_resources(resources),
+                       action=self._oom_action)
+        self._oom_predicted = predicted
+
+    def _rss_slope(self):
+        # Least squares fit of the RSS over time.
+        n = float(len(self._samples))
+        mean_time = sum(s.time for s in self._samples) / n
+        mean_rss = sum(s.rss for s in self._samples) / n
+        variance = sum((s.time - mean_time) ** 2 for s in self._samples)
+        if variance == 0:
+            return 0.0
+        return sum((s.time - mean_time) * (s.rss - mean_rss) for s in self._samples) / variance
+
+    def _resources(self, first, last):
+        return {
+            'cpu_usage': _rate(first, last, 'cpu_time'),
+            'io_rate': _rate(first, last, 'io_bytes'),
+            'rss': last.rss,
+            'state': last.state,
+        }
+
+    def _with_resources(self, resources):
+        message = copy.copy(self._last_message)
+        message.resources = resources
+        return message
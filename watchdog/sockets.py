@@ -0,0 +1,71 @@
+import os
+import socket
+import struct
+
+from six.moves import cPickle as pickle
+
+
+def listen(address, backlog=1024, mode=None):
+    """Listen on a Unix domain socket path or a `(host, port)` tuple.
+
+    Args:
+        address (str or tuple) : Unix domain socket path or `(host, port)`.
+        backlog (int, optional) : Number of pending connections. Defaults to `1024`.
+        mode (int, optional) : Permissions of the Unix domain socket, which are set before it accepts connections.
+    """
+    if isinstance(address, tuple):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    else:
+        if os.path.exists(address):
+            os.remove(address)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(address)
+    if mode is not None and not isinstance(address, tuple):
+        os.chmod(address, mode)
+    server.listen(backlog)
+    return server
+
+
+def connect(address, timeout=10.0):
+    """Connect to a Unix domain socket path or a `(host, port)` tuple."""
+    if isinstance(address, tuple):
+        client = socket.create_connection(address, timeout=timeout)
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    else:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # A Unix domain socket in the timeout mode fails instead of waiting while the backlog is full.
+        client.connect(address)
+        client.settimeout(timeout)
+    return client
+
+
+_length = struct.Struct('<I')
+
+
+def send_frame(sock, obj):
+    """Send a pickled object with its length."""
+    data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    sock.sendall(_length.pack(len(data)) + data)
+
+
+class FrameReader(object):
+    """Reader of the frames sent by `send_frame` from a stream in pieces."""
+
+    def __init__(self):
+        self._buffer = b''
+
+    def feed(self, data):
+        """Feed received bytes and return the objects of the complete frames."""
+        buffer = self._buffer + data
+        objs = []
+        offset = 0
+        while len(buffer) - offset >= _length.size:
+            length, = _length.unpack_from(buffer, offset)
+            end = offset + _length.size + length
+            if len(buffer) < end:
+                break
+            objs.append(pickle.loads(buffer[offset + _length.size:end]))
+            offset = end
+        self._buffer = buffer[offset:]
+        return objs
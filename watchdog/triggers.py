@@ -0,0 +1,77 @@
+from .misc import monotonic_ns
+
+
+class AdaptiveIntervalTrigger(object):
+    """Trigger which fires about every `period` seconds of training.
+
+    It fires every `stride` iterations like `(stride, 'iteration')`, but measures
+    the time per iteration at each fire and sets the next stride to the number of
+    iterations which take `period` seconds. A fast model then sends few
+    heartbeats and a slow one sends them often enough to be watched closely,
+    and the clock is read only when the trigger fires.
+
+    The time per iteration is smoothed over fires so that a single slow
+    iteration doesn't reset the stride, and the stride grows at most `growth`
+    times at a fire, while it shrinks at once when training slows down.
+
+    Args:
+        period (float, optional) : Target time (seconds) between two fires. Defaults to `2.0`.
+        min_stride (int, optional) : Minimum and first number of iterations between two fires. Defaults to `1`.
+        max_stride (int, optional) : Maximum number of iterations between two fires. Defaults to no limit.
+        smoothing (float, optional) : Weight of the latest time per iteration. Defaults to `0.5`.
+        growth (float, optional) : Maximum factor to grow the stride at a fire. Defaults to `2.0`.
+    """
+
+    def __init__(self, period=2.0, min_stride=1, max_stride=None, smoothing=0.5, growth=2.0):
+        if period <= 0:
+            raise ValueError('period must be positive')
+        if min_stride < 1 or (max_stride is not None and max_stride < min_stride):
+            raise ValueError('min_stride must be at least 1 and at most max_stride')
+        self.period = period
+        self.stride = min_stride
+        self._min_stride = min_stride
+        self._max_stride = max_stride
+        self._smoothing = smoothing
+        self._growth = growth
+        self._iteration_time = None
+        self._previous_iteration = None
+        self._previous_ns = None
+
+    @property
+    def iteration_time(self):
+        """Smoothed time (seconds) per iteration, or `None` before the first fire."""
+        return self._iteration_time
+
+    def __call__(self, trainer):
+        iteration = trainer.updater.iteration
+        if self._previous_iteration is None:
+            # The first call only starts measuring.
+            self._previous_iteration = iteration
+            self._previous_ns = monotonic_ns()
+            return False
+        if iteration - self._previous_iteration < self.stride:
+            return False
+
+        now = monotonic_ns()
+        iteration_time = (now - self._previous_ns) / 1e9 / (iteration - self._previous_iteration)
+        if self._iteration_time is None:
+            self._iteration_time = iteration_time
+        else:
+            self._iteration_time += self._smoothing * (iteration_time - self._iteration_time)
+        self.stride = self._next_stride()
+        self._previous_iteration = iteration
+        self._previous_ns = now
+        return True
+
+    def serialize(self, serializer):
+        self.stride = int(serializer('stride', self.stride))
+        # The clock of a resumed process doesn't continue, so measuring starts again at the next call.
+        self._previous_iteration = None
+
+    def _next_stride(self):
+        limit = self.stride * self._growth
+        if self._max_stride is not None:
+            limit = min(limit, self._max_stride)
+        if self._iteration_time > 0:
+            limit = min(limit, self.period / self._iteration_time)
+        return max(self._min_stride, int(limit))